@@ -1,6 +1,7 @@
-from GTS.ISC_data.isc import ISCData, swiss_to_gts
+from GTS.ISC_data.isc import ISCData, get_isc_data, swiss_to_gts
 
 __all__ = [
     "ISCData",
+    "get_isc_data",
     "swiss_to_gts",
 ]
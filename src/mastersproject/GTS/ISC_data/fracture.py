@@ -5,7 +5,7 @@ Methods for assembling fractures from isc data and construct a discrete fracture
 Public methods:
 convex_plane(shearzone_names, coord_system='gts', path=None) -> pd.DataFrame:
     - Wrapper to construct convex hulls for the different shear-zones in isc.
-        Gets data by calling gts.ISCData() directly.
+        Gets data from the shared gts.get_isc_data().
 fracture_network(shearzone_names, export: bool = False, path=None, **network_kwargs) -> pp.FractureNetwork3d:
     - Construct a 3D fracture network from the isc data.
 
@@ -14,12 +14,13 @@ fracture_network(shearzone_names, export: bool = False, path=None, **network_kwa
 import logging
 import os
 from pathlib import Path
+from typing import Optional
 
+import numpy as np
 import pandas as pd
 
 import porepy as pp
-from GTS.fit_plane import convex_hull, plane_from_points
-from GTS.ISC_data import ISCData
+from GTS.ISC_data import get_isc_data
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +30,7 @@ def convex_plane(shearzone_names, coord_system="gts", path=None) -> pd.DataFrame
     """ Compute vertices for the convex polygon of the projected point cloud
     to the plane of best fit for each shear-zone is shearzone_names.
 
-    Data imported from gts.ISCData()
+    Data imported from gts.get_isc_data()
 
     Parameters:
     shearzone_names : str or list
@@ -46,7 +47,7 @@ def convex_plane(shearzone_names, coord_system="gts", path=None) -> pd.DataFrame
         Convex polygon of projected points to best fit plane
 
     """
-    isc = ISCData(path=path)
+    isc = get_isc_data(path=path)
 
     if isinstance(shearzone_names, str):
         shearzone_names = [shearzone_names]
@@ -54,25 +55,22 @@ def convex_plane(shearzone_names, coord_system="gts", path=None) -> pd.DataFrame
         shearzone_names = isc.shearzones
     assert isinstance(shearzone_names, list)
 
-    results = []
-    for sz in shearzone_names:
-        logger.info(f"Interpolating shearzone {sz} ...")
-        point_cloud = isc.get_shearzone(sz=sz, coords=coord_system)
-        proj = plane_from_points(point_cloud)  # projection
+    logger.info(f"Interpolating shearzones {shearzone_names} ...")
+    hulls = isc.shearzone_hulls(coords=coord_system)
 
-        convex_vertices = convex_hull(proj)
-
-        frame = pd.DataFrame(
-            data=convex_vertices.T, columns=("x_proj", "y_proj", "z_proj")
-        )
-        frame["shearzone"] = sz
-        results.append(frame)
-    df = pd.concat(results, ignore_index=True)
-    return df
+    # Select the shear-zones, in the given order
+    df = hulls[hulls.shearzone.isin(shearzone_names)]
+    order = df.shearzone.map({sz: i for i, sz in enumerate(shearzone_names)})
+    df = df.iloc[np.argsort(order.to_numpy(), kind="stable")]
+    return df.reset_index(drop=True)
 
 
 def fracture_network(
-    shearzone_names, export_vtk: bool = False, path=None, **network_kwargs
+    shearzone_names,
+    export_vtk: bool = False,
+    path=None,
+    convex: Optional[pd.DataFrame] = None,
+    **network_kwargs,
 ) -> pp.FractureNetwork3d:
     """ Make a fracture network from a selection of shear-zones.
 
@@ -84,6 +82,10 @@ def fracture_network(
             Export network to vtk.
         path : pathlib.Path or str
             Path/to/01BasicInputData/
+        convex : pd.DataFrame, Optional
+            Vertices of the shear-zones, in the format of convex_plane.
+            If None, the vertices are computed by convex_plane.
+            Used for perturbed shear-zone geometries, see geometry_sampling.
         network_kwargs : kwargs
             domain : dict
                 keys 'xmin', 'xmax', etc. of domain boundaries.
@@ -108,7 +110,10 @@ def fracture_network(
         # This will mesh only a 3d domain.
         fractures = None
     else:
-        convex = convex_plane(shearzone_names, coord_system="gts", path=data_path)
+        if convex is None:
+            convex = convex_plane(shearzone_names, coord_system="gts", path=data_path)
+        else:
+            convex = convex.copy()
 
         # Domain scaling
         length_scale = network_kwargs.get("length_scale", 1)
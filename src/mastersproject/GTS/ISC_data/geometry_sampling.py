@@ -0,0 +1,128 @@
+"""
+Monte Carlo sampling of the shear-zone geometry.
+
+The shear-zone planes are fitted to the intersections of the shear-zones with
+boreholes and tunnels. The depths of the borehole intersections are uncertain.
+A sample of the geometry perturbs each borehole intersection along its borehole
+by a normally distributed depth error, and refits the planes and convex hulls.
+Tunnel intersections are not perturbed.
+
+Each sample is identified by a seed, such that a sample can be recreated
+anywhere (e.g. in a worker process) without storing the geometry.
+
+Public methods:
+member_seed(seed, member) -> int:
+    - Seed of ensemble member number 'member' of an ensemble with seed 'seed'.
+sample_shearzone_planes(shearzone_names, depth_uncertainty, seeds, path=None):
+    - Planes and convex hulls of many geometry samples, fitted in batch.
+sample_convex_plane(shearzone_names, depth_uncertainty, seed, path=None):
+    - Convex hulls of one geometry sample, in the format of convex_plane.
+"""
+import logging
+from typing import List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from GTS.ISC_data.isc import get_isc_data
+from GTS.fit_plane import convex_hulls, planes_from_points
+
+logger = logging.getLogger(__name__)
+
+
+def member_seed(seed: int, member: int) -> int:
+    """ Seed of a member of an ensemble, independent of the ensemble size"""
+    return int(np.random.SeedSequence([seed, member]).generate_state(1)[0])
+
+
+def sample_shearzone_planes(
+    shearzone_names: List[str],
+    depth_uncertainty: float,
+    seeds: Union[int, List[int], np.ndarray],
+    path=None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """ Fit planes and convex hulls of perturbed shear-zone geometries
+
+    The planes of all samples of a shear-zone are fitted in one batch.
+
+    Parameters:
+    shearzone_names : List[str]
+        Shear-zones to sample
+    depth_uncertainty : float
+        Standard deviation of the depth of the borehole intersections [m]
+    seeds : int or List[int]
+        Seed of each sample. The same seed always gives the same sample.
+    path : pathlib.Path
+        Path/to/01BasicInputData/
+
+    Returns:
+    centroids, normals : np.ndarray (k, m, 3)
+        Centroid and normal of shear-zone j of sample i in [i, j]
+    vertices : np.ndarray (3, M)
+        Vertices of the convex hulls of all samples and shear-zones (gts coordinates)
+    offsets : np.ndarray (k * m + 1,)
+        The hull of shear-zone j of sample i is vertices[:, offsets[l]:offsets[l + 1]],
+        where l = i * m + j.
+    """
+    isc = get_isc_data(path=path)
+    seeds = np.atleast_1d(seeds)
+    n_samples, n_sz = seeds.size, len(shearzone_names)
+
+    point_clouds = [_perturbable_point_cloud(isc, sz) for sz in shearzone_names]
+    sizes = [points.shape[1] for points, _ in point_clouds]
+    # Draw all depth errors of a sample at once, such that each sample only
+    # depends on its own seed.
+    depth_errors = np.vstack(
+        [
+            np.random.default_rng(s).normal(0, depth_uncertainty, sum(sizes))
+            for s in seeds
+        ]
+    )
+
+    centroids = np.empty((n_samples, n_sz, 3))
+    normals = np.empty((n_samples, n_sz, 3))
+    hulls = np.empty((n_samples, n_sz), dtype=object)
+    errors_by_sz = np.split(depth_errors, np.cumsum(sizes)[:-1], axis=1)
+    for j, ((points, directions), errors) in enumerate(zip(point_clouds, errors_by_sz)):
+        samples = points[np.newaxis] + errors[:, np.newaxis, :] * directions
+        centroids[:, j], normals[:, j], proj, proj_offsets = planes_from_points(samples)
+        vertices, hull_offsets = convex_hulls(proj, proj_offsets)
+        for i in range(n_samples):
+            hulls[i, j] = vertices[:, hull_offsets[i] : hull_offsets[i + 1]]
+
+    hulls = hulls.ravel()
+    offsets = np.cumsum([0] + [h.shape[1] for h in hulls])
+    return centroids, normals, np.hstack(hulls), offsets
+
+
+def sample_convex_plane(
+    shearzone_names: List[str], depth_uncertainty: float, seed: int, path=None
+) -> pd.DataFrame:
+    """ Convex hulls of one perturbed shear-zone geometry
+
+    Parameters:
+    See sample_shearzone_planes
+
+    Returns:
+    convex_shearzones : pd.DataFrame
+        Vertices of the convex hull of each shear-zone, see convex_plane
+    """
+    _, _, vertices, offsets = sample_shearzone_planes(
+        shearzone_names, depth_uncertainty, seed, path=path
+    )
+    df = pd.DataFrame(data=vertices.T, columns=("x_proj", "y_proj", "z_proj"))
+    df["shearzone"] = np.repeat(shearzone_names, np.diff(offsets))
+    return df
+
+
+def _perturbable_point_cloud(isc, sz: str) -> Tuple[np.ndarray, np.ndarray]:
+    """ Points of a shear-zone, and the direction a depth error moves each point
+
+    The direction is zero for tunnel intersections.
+    """
+    df = isc.structures
+    rows = df[df.shearzone == sz]
+    points = rows[["x_gts", "y_gts", "z_gts"]].to_numpy(dtype=float).T
+    in_borehole = rows.borehole.isin(isc.boreholes).to_numpy()
+    directions = rows[["_trig_x", "_trig_y", "_trig_z"]].to_numpy(dtype=float).T
+    return points, directions * in_borehole
@@ -9,6 +9,8 @@ DOI: 10.3929/ethz-b-000243199
 link: https://doi.org/10.3929/ethz-b-000243199
 
 """
+import functools
+import hashlib
 import logging
 import os
 from pathlib import Path
@@ -16,13 +18,13 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 
-from GTS.fit_plane import fit_normal_to_points
+from GTS.fit_plane import convex_hulls, fit_planes, planes_from_points
 
 logger = logging.getLogger(__name__)
 
 
 class ISCData:
-    def __init__(self, path=None):
+    def __init__(self, path=None, cache=True):
         """ Initialize the class managing data from the ISC project
 
         Parameters:
@@ -30,16 +32,21 @@ class ISCData:
                 Path/to/01BasicInputData/
                 By default, finds the data path,
                  which is known relative to this class.
+            cache : bool : Optional (Default: True)
+                Store the loaded and characterized data in a binary cache file,
+                 which is reused as long as the source files are unchanged.
+                 See _load_cached_data().
 
         """
         # Verify path to data set.
         if path is None:
-            path = Path(os.path.abspath(__file__))
-            _root = path.parents[2]
-            self.data_path = _root / "GTS/01BasicInputData"
+            self.data_path = default_data_path()
         else:
             self.data_path = Path(path)
 
+        # Memoized results of geometry queries. See _memoize().
+        self._memo = {}
+
         logger.info(f"GTS-ISC data located at: {self.data_path}.")
         assert self.data_path.is_dir()
 
@@ -73,6 +80,9 @@ class ISCData:
 
         # ============ LOAD DATA =======================================================================================
 
+        if cache and self._load_cached_data():
+            return
+
         # 1. Step: Load all available data. ============================================================================
         # Load borehole data
         self.borehole_geometry = self._borehole_data()
@@ -90,6 +100,9 @@ class ISCData:
         # 2. Step: All characterized structures ========================================================================
         self.structures = self._full_structure_geometry()
 
+        if cache:
+            self._write_cached_data()
+
     # ========= PUBLIC CLASS METHODS ===================================================================================
 
     def get_shearzone(self, sz: str, coords: str = "gts"):
@@ -189,6 +202,8 @@ class ISCData:
     def borehole_plane_intersection(self):
         """ Compute new intersections of boreholes and shear-zones.
 
+        The result is memoized.
+
         There will be new intersections due to regression over old
         intersections to produce shear-zone planes.
 
@@ -205,6 +220,13 @@ class ISCData:
 
         """
 
+        return self._memoize(
+            ("borehole_plane_intersection",), self._borehole_plane_intersection
+        )
+
+    def _borehole_plane_intersection(self):
+        """ Compute new intersections of boreholes and shear-zones. See borehole_plane_intersection """
+
         # 1. Step: Compute direction vectors to each borehole ==========================================================
         borehole_data = self.borehole_geometry.copy()
         borehole_data["depth"] = 0
@@ -266,29 +288,178 @@ class ISCData:
     def planes(self):
         """ Compute plane of best fit from point cloud of each shear-zone.
 
+        The result is memoized.
+
         Returns
         df : pd.DataFrame
             Normal vector and centroid of each shear-zone.
         """
+        return self._memoize(("planes",), self._planes)
+
+    def convex_hull(self, sz: str, coords: str = "gts"):
+        """ Convex hull of a shear-zone point cloud, projected to its plane of best fit.
+
+        The result is memoized.
+
+        Parameters:
+        sz (str): Name of shear-zone (S1_1, S1_2, S1_3, S3_1, S3_2)
+        coords (str, Default: 'gts'):
+            Get coordinates in 'gts' or 'swiss'.
+
+        Returns
+        np.ndarray (3, n): Vertices of the convex hull, ordered counter-clockwise.
+        """
+        assert sz in self.shearzones, f"unknown shear-zone {sz}."
+        hulls = self.shearzone_hulls(coords=coords)
+        vertices = hulls.loc[hulls.shearzone == sz, ["x_proj", "y_proj", "z_proj"]]
+        return vertices.to_numpy().T
+
+    def shearzone_hulls(self, coords: str = "gts"):
+        """ Convex hulls of all shear-zones, projected to their planes of best fit.
+
+        The planes of all shear-zones are fitted at once. The result is memoized.
+
+        Parameters:
+        coords (str, Default: 'gts'):
+            Get coordinates in 'gts' or 'swiss'.
+
+        Returns
+        df : pd.DataFrame
+            Vertices (x_proj, y_proj, z_proj) of the convex hull of each shear-zone,
+            ordered counter-clockwise.
+        """
 
-        results = []
-        for sz in self.shearzones:
-            point_cloud = self.get_shearzone(sz=sz, coords="gts")
-            n_pts = point_cloud.shape[1]
-            centroid = np.sum(point_cloud, axis=1) / n_pts
-            normal = fit_normal_to_points(point_cloud)
+        def _shearzone_hulls():
+            point_clouds = [
+                self.get_shearzone(sz=sz, coords=coords) for sz in self.shearzones
+            ]
+            _, _, proj, offsets = planes_from_points(point_clouds)
+            vertices, hull_offsets = convex_hulls(proj, offsets)
 
-            data = np.atleast_2d(np.hstack((centroid, normal)))
-            columns = ("x_c", "y_c", "z_c", "n_x", "n_y", "n_z")
-            frame = pd.DataFrame(data=data, columns=columns)
-            frame["shearzone"] = sz
-            results.append(frame)
+            df = pd.DataFrame(data=vertices.T, columns=("x_proj", "y_proj", "z_proj"))
+            df["shearzone"] = np.repeat(self.shearzones, np.diff(hull_offsets))
+            return df
 
-        df = pd.concat(results, ignore_index=True)
+        return self._memoize(("shearzone_hulls", coords), _shearzone_hulls)
+
+    def data_version(self):
+        """ Hash of the content of all source files of the data set.
+
+        Returns
+        str: Hex digest, which changes if any of the data files are changed.
+        """
+        if "data_version" not in self._memo:
+            h = hashlib.sha1()
+            for f in self._source_files():
+                h.update(f.read_bytes())
+            self._memo["data_version"] = h.hexdigest()
+        return self._memo["data_version"]
+
+    def _planes(self):
+        """ Compute plane of best fit of each shear-zone. See planes """
+
+        point_clouds = [
+            self.get_shearzone(sz=sz, coords="gts") for sz in self.shearzones
+        ]
+        centroids, normals = fit_planes(point_clouds)
+
+        data = np.hstack((centroids, normals))
+        columns = ("x_c", "y_c", "z_c", "n_x", "n_y", "n_z")
+        df = pd.DataFrame(data=data, columns=columns)
+        df["shearzone"] = self.shearzones
         return df
 
     # ======= PRIVATE CLASS UTILITY METHODS ============================================================================
 
+    def _memoize(self, key, compute):
+        """ Compute a value once, and return copies of it on later calls.
+
+        Copies are returned since the instance is shared, see get_isc_data().
+        """
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key].copy()
+
+    # The data frames that are stored in the binary cache
+    _cached_frames = (
+        "borehole_geometry",
+        "borehole_structures",
+        "tunnel_structures",
+        "shearzone_borehole_geometry",
+        "structures",
+    )
+
+    def _source_files(self):
+        """ All data files read by this class """
+        files = [self.data_path / "02_Boreholes" / (p + ".txt") for p in self.borehole_types]
+        files += [
+            self.data_path
+            / "03_GeologicalMapping"
+            / "02_BoreholeIntersections"
+            / (bh + "_structures.txt")
+            for bh in self.boreholes
+        ]
+        files += [
+            self.data_path
+            / "03_GeologicalMapping"
+            / "01_TunnelIntersections"
+            / "Tunnel_intersections.txt"
+        ]
+        files += [
+            self.data_path / "06_ShearzoneInterpolation" / (sz + ".txt")
+            for sz in self.shearzones
+        ]
+        return files
+
+    def _cache_file(self):
+        """ Path to the binary cache file.
+
+        The file name is keyed on the path, size and modification time of
+        all source files, such that any change to the data invalidates the cache.
+        """
+        h = hashlib.sha1()
+        for f in self._source_files():
+            stat = f.stat()
+            h.update(f"{f.resolve()}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return self.data_path / "__isc_cache__" / f"isc_data_{h.hexdigest()[:16]}.pkl"
+
+    def _load_cached_data(self):
+        """ Load all data frames from the binary cache, if it exists.
+
+        Returns
+        bool: Whether the data was loaded from the cache.
+        """
+        try:
+            cache_file = self._cache_file()
+        except OSError:
+            return False
+        if not cache_file.is_file():
+            return False
+        try:
+            frames = pd.read_pickle(cache_file)
+        except Exception as e:  # Corrupt or incompatible cache file. Rebuild it.
+            logger.warning(f"Could not read ISC data cache {cache_file}: {e}")
+            return False
+
+        for name in self._cached_frames:
+            setattr(self, name, frames[name])
+        logger.info(f"Loaded ISC data from cache: {cache_file}")
+        return True
+
+    def _write_cached_data(self):
+        """ Write all data frames to the binary cache. """
+        try:
+            cache_file = self._cache_file()
+            cache_file.parent.mkdir(exist_ok=True)
+            frames = {name: getattr(self, name) for name in self._cached_frames}
+
+            # Write to a temporary file first, so that the cache is never incomplete.
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            pd.to_pickle(frames, tmp_file)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logger.warning(f"Could not write ISC data cache: {e}")
+
     def _borehole_data(self):
         """ Fetch data with borehole coordinates
 
@@ -306,7 +477,7 @@ class ISCData:
         data = []
         for parent in self.borehole_types:
             path = file_loc / (parent + ".txt")
-            frame = pd.read_csv(path, sep=None, names=columns, engine="python")
+            frame = _read_table(path, names=columns)
             borehole_name = np.array(
                 [parent + str(id) for id in self.borehole_types[parent]]
             )
@@ -329,9 +500,7 @@ class ISCData:
         data = []
         for borehole in self.boreholes:
             path = file_loc / (borehole + "_structures.txt")
-            frame = pd.read_csv(
-                path, sep=None, names=columns, skiprows=2, engine="python"
-            )
+            frame = _read_table(path, names=columns, skiprows=2)
             frame["borehole"] = borehole
             data.append(frame)
         df = pd.concat(data, ignore_index=True)
@@ -345,7 +514,7 @@ class ISCData:
         columns = ["x", "y", "z", "true_dip_direction", "dip", "tunnel", "shearzone"]
 
         path = file_loc / "Tunnel_intersections.txt"
-        df = pd.read_csv(path, sep=None, names=columns, engine="python")
+        df = _read_table(path, names=columns)
         df["shearzone"] = df["shearzone"].apply(rename_sz)
         df = df.rename(
             columns={"true_dip_direction": "azimuth_struc", "tunnel": "borehole",}
@@ -373,9 +542,7 @@ class ISCData:
             for sz_num in self.shearzone_types[parent]:
                 sz_name = parent + "_" + str(sz_num)  # e.g. 'S1_1'
                 path = file_loc / (sz_name + ".txt")
-                frame = pd.read_csv(
-                    path, sep=None, names=columns, skiprows=1, engine="python"
-                )
+                frame = _read_table(path, names=columns, skiprows=1)
                 frame["shearzone"] = sz_name
                 data.append(frame)
         df = pd.concat(data, ignore_index=True)
@@ -489,6 +656,39 @@ class ISCData:
 # UTILITY METHODS ======================================================================================================
 
 
+def default_data_path():
+    """ Path to the ISC data set, which is known relative to this file. """
+    path = Path(os.path.abspath(__file__))
+    _root = path.parents[2]
+    return _root / "GTS/01BasicInputData"
+
+
+def get_isc_data(path=None):
+    """ Get a shared ISCData instance for a data path.
+
+    The data set is loaded once per process and data path. The geometry queries
+    (planes, borehole_plane_intersection, convex_hull) are memoized on the instance.
+    Use get_isc_data.cache_clear() to force a reload.
+
+    Parameters:
+        path : str, pathlib.Path : Optional
+            Path/to/01BasicInputData/. By default, the data set of this repository.
+
+    Returns
+    ISCData: Shared instance. Do not modify its data frames in place.
+    """
+    path = default_data_path() if path is None else Path(path)
+    return _isc_data(path.resolve())
+
+
+@functools.lru_cache(maxsize=None)
+def _isc_data(path):
+    return ISCData(path=path)
+
+
+get_isc_data.cache_clear = _isc_data.cache_clear
+
+
 def borehole_to_global_coords(
     data: pd.DataFrame,
     *,
@@ -512,27 +712,34 @@ def borehole_to_global_coords(
 
     # Compute angle scalers
     rad = np.pi / 180
-    data.loc[:, "_trig_x"] = (data[upward_gradient] * rad).apply(np.cos) * (
-        data[azimuth] * rad
-    ).apply(np.sin)
-
-    data.loc[:, "_trig_y"] = (data[upward_gradient] * rad).apply(np.cos) * (
-        data[azimuth] * rad
-    ).apply(np.cos)
-
-    data.loc[:, "_trig_z"] = (data[upward_gradient] * rad).apply(np.sin)
+    gradient = data[upward_gradient].to_numpy(dtype=float) * rad
+    azim = data[azimuth].to_numpy(dtype=float) * rad
+    trig = np.column_stack(
+        (
+            np.cos(gradient) * np.sin(azim),
+            np.cos(gradient) * np.cos(azim),
+            np.sin(gradient),
+        )
+    )
 
     # Swiss coordinates
-    data.loc[:, "x_swiss"] = data[x] + (data[depth] * data["_trig_x"])
-    data.loc[:, "y_swiss"] = data[y] + (data[depth] * data["_trig_y"])
-    data.loc[:, "z_swiss"] = data[z] + (data[depth] * data["_trig_z"])
+    root = data[[x, y, z]].to_numpy(dtype=float)
+    swiss = root + data[depth].to_numpy(dtype=float)[:, np.newaxis] * trig
 
     # TODO: Use attribute self.gts_coordinates instead.
     #   Also, remove _swiss coordinates, as they are not used.
     # GTS coordinates
-    data[["x_gts", "y_gts", "z_gts"]] = data[["x_swiss", "y_swiss", "z_swiss"]].apply(
-        swiss_to_gts, axis=1, raw=True, result_type="expand"
-    )
+    gts = swiss_to_gts(swiss)
+
+    data.loc[:, "_trig_x"] = trig[:, 0]
+    data.loc[:, "_trig_y"] = trig[:, 1]
+    data.loc[:, "_trig_z"] = trig[:, 2]
+    data.loc[:, "x_swiss"] = swiss[:, 0]
+    data.loc[:, "y_swiss"] = swiss[:, 1]
+    data.loc[:, "z_swiss"] = swiss[:, 2]
+    data.loc[:, "x_gts"] = gts[:, 0]
+    data.loc[:, "y_gts"] = gts[:, 1]
+    data.loc[:, "z_gts"] = gts[:, 2]
 
 
 def swiss_to_gts(v):
@@ -541,12 +748,38 @@ def swiss_to_gts(v):
     GTS coordinates are: (x,y,z) = (667400, 158800, 1700)
 
     Parameters:
-    v (np.array (3,)): Coordinate array
+    v (np.array (3,) or (n, 3)): Coordinate array, or n coordinates row-wise.
 
     """
     return v - np.array([667400, 158800, 1700])
 
 
+def _read_table(path, names, skiprows=0):
+    """ Read a delimited data file of the ISC data set.
+
+    The data files are either tab- or comma-separated. The delimiter is determined
+    from the first data line, which allows the fast C-parser of pandas
+    (rather than the sniffing python parser).
+    Some entries are padded with spaces, which are stripped.
+
+    Parameters:
+    path (Path): Path to file
+    names (list): Column names
+    skiprows (int): Number of header lines to skip
+    """
+    with open(path, "r") as f:
+        for _ in range(skiprows):
+            f.readline()
+        first_line = f.readline()
+    sep = "\t" if "\t" in first_line else ","
+
+    df = pd.read_csv(path, sep=sep, names=names, skiprows=skiprows, engine="c")
+    # Strip whitespace padding of text columns
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        df[col] = df[col].str.strip()
+    return df
+
+
 def rename_sz(sz):
     """ Rename shearzone on form '12' to 'S1_2'. """
     sz = str(sz)
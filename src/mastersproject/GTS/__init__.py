@@ -1,6 +1,7 @@
 # Import new model data
 from GTS.ISC_data.isc import (
     ISCData,  # Data set
+    get_isc_data,  # Shared data set
     swiss_to_gts,  # Transformation
     borehole_to_global_coords,  # Transformation
 )
@@ -15,6 +16,15 @@ from GTS.ISC_data.fracture import (
 from GTS.fit_plane import (
     plane_from_points,
     convex_hull,
+    fit_planes,
+    planes_from_points,
+    convex_hulls,
+)
+
+# Monte Carlo sampling of the shear-zone geometry
+from GTS.ISC_data.geometry_sampling import (
+    sample_shearzone_planes,
+    sample_convex_plane,
 )
 
 # -------------------------
@@ -58,12 +68,18 @@ from GTS.isc_modelling.parameter import (
 
 __all__ = [
     "ISCData",
+    "get_isc_data",
     "swiss_to_gts",
     "borehole_to_global_coords",
     "convex_plane",
     "fracture_network",
     "plane_from_points",
     "convex_hull",
+    "fit_planes",
+    "planes_from_points",
+    "convex_hulls",
+    "sample_shearzone_planes",
+    "sample_convex_plane",
     "stress_tensor",
     "run_mechanics_model",
     "run_biot_model",
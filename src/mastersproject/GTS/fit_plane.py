@@ -12,6 +12,16 @@ convex_hull(p: np.ndarray) -> np.ndarray:
         of the point cloud. The computed points naturally forms a
         subset of the original point set, ordered counter-clockwise.
 
+Batched methods, for many point clouds at once (e.g. bootstrap samples):
+fit_planes(point_clouds) -> (centroids, normals):
+    - Centroid and normal of each point cloud, computed as fit_normal_to_points.
+planes_from_points(point_clouds) -> (centroids, normals, proj, offsets):
+    - As plane_from_points, for each point cloud. The projected points of all
+        clouds are returned as one contiguous (3, N) array, where cloud i is
+        proj[:, offsets[i]:offsets[i + 1]].
+convex_hulls(proj, offsets) -> (vertices, hull_offsets):
+    - Convex hull of each projected point cloud, as one contiguous array.
+
 Private methods:
 fit_normal_to_points(points: np.ndarray) -> np.array:
     - Compute the plane of best fit to an arbitrary point cloud in
@@ -20,6 +30,7 @@ fit_normal_to_points(points: np.ndarray) -> np.array:
 """
 
 import logging
+from typing import List, Tuple, Union
 
 import numpy as np
 from scipy.spatial import ConvexHull
@@ -155,3 +166,134 @@ def plane_from_points(points: np.ndarray) -> np.ndarray:
     logging.info(f"Sum of pointwise relative errors: {rel_error.sum():.4f}")
 
     return proj.T
+
+
+def fit_planes(
+    point_clouds: Union[np.ndarray, List[np.ndarray]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Fit planes to several point clouds at once
+
+    The normals are computed as in fit_normal_to_points, using the best conditioned
+    of the three determinants of the covariance matrix of each point cloud.
+
+    Parameters:
+    point_clouds : np.ndarray (k, 3, n) or List[np.ndarray (3, n_i)]
+        k point clouds, each of at least 3 points
+
+    Returns:
+    centroids : np.ndarray (k, 3)
+        Centroid of each point cloud
+    normals : np.ndarray (k, 3)
+        Normalized normal of each plane. nan for point clouds that do not
+        span a plane.
+    """
+    points, offsets = _stack_point_clouds(point_clouds)
+    centroids, normals, _ = _fit_stacked(points, offsets)
+    return centroids, normals
+
+
+def planes_from_points(
+    point_clouds: Union[np.ndarray, List[np.ndarray]]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """ Project several point clouds to their planes of best fit
+
+    Parameters:
+    point_clouds : np.ndarray (k, 3, n) or List[np.ndarray (3, n_i)]
+        k point clouds, each of at least 3 points
+
+    Returns:
+    centroids, normals : np.ndarray (k, 3)
+        See fit_planes
+    proj : np.ndarray (3, N)
+        Projected points of all point clouds
+    offsets : np.ndarray (k + 1,)
+        Point cloud i is proj[:, offsets[i]:offsets[i + 1]]
+    """
+    points, offsets = _stack_point_clouds(point_clouds)
+    centroids, normals, cloud = _fit_stacked(points, offsets)
+    if np.isnan(normals).any():
+        raise ValueError("Some point clouds do not span a plane")
+
+    points_r = points - centroids.T[:, cloud]
+    normal_pts = normals.T[:, cloud]
+    distance = np.sum(points_r * normal_pts, axis=0)
+    proj = centroids.T[:, cloud] + points_r - distance * normal_pts
+    return centroids, normals, proj, offsets
+
+
+def convex_hulls(
+    proj: np.ndarray, offsets: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Convex hulls of several planar point clouds
+
+    Parameters:
+    proj : np.ndarray (3, N)
+        Planar point clouds, e.g. from planes_from_points
+    offsets : np.ndarray (k + 1,)
+        Point cloud i is proj[:, offsets[i]:offsets[i + 1]]
+
+    Returns:
+    vertices : np.ndarray (3, M)
+        Vertices of all convex hulls, each sorted ccw. See convex_hull.
+    hull_offsets : np.ndarray (k + 1,)
+        The hull of point cloud i is vertices[:, hull_offsets[i]:hull_offsets[i + 1]]
+    """
+    hulls = [convex_hull(proj[:, a:b]) for a, b in zip(offsets[:-1], offsets[1:])]
+    hull_offsets = np.cumsum([0] + [h.shape[1] for h in hulls])
+    return np.hstack(hulls), hull_offsets
+
+
+def _stack_point_clouds(
+    point_clouds: Union[np.ndarray, List[np.ndarray]]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Contiguous (3, N) array of all points, and offsets of each point cloud"""
+    if isinstance(point_clouds, np.ndarray) and point_clouds.ndim == 3:
+        k, dim, n = point_clouds.shape
+        points = point_clouds.transpose(1, 0, 2).reshape((dim, k * n))
+        offsets = n * np.arange(k + 1)
+    else:
+        points = np.hstack(point_clouds)
+        offsets = np.cumsum([0] + [pc.shape[1] for pc in point_clouds])
+    assert points.shape[0] == 3, "Wrong input shape."
+    assert np.all(np.diff(offsets) >= 3), "Each point cloud needs at least 3 points"
+    return np.ascontiguousarray(points, dtype=float), offsets
+
+
+def _fit_stacked(
+    points: np.ndarray, offsets: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Centroids and normals of stacked point clouds, see fit_planes
+
+    Returns also the index of the point cloud of each point.
+    """
+    starts = offsets[:-1]
+    counts = np.diff(offsets)
+    cloud = np.repeat(np.arange(counts.size), counts)
+
+    centroids = np.add.reduceat(points, starts, axis=1) / counts
+    x, y, z = points - centroids[:, cloud]
+    centroids = centroids.T
+
+    # Entries of the covariance matrices of all point clouds
+    xx, xy, xz, yy, yz, zz = np.add.reduceat(
+        np.vstack((x * x, x * y, x * z, y * y, y * z, z * z)), starts, axis=1
+    )
+
+    det = np.vstack((yy * zz - yz * yz, xx * zz - xz * xz, xx * yy - xy * xy))
+    # Pick path with best conditioning. Ties resolve to the first, as in
+    # fit_normal_to_points.
+    best = np.argmax(det, axis=0)
+    det_x, det_y, det_z = det
+    normals = np.select(
+        [best == 0, best == 1],
+        [
+            np.vstack((det_x, xz * yz - xy * zz, xy * yz - xz * yy)),
+            np.vstack((xz * yz - xy * zz, det_y, xy * xz - yz * xx)),
+        ],
+        np.vstack((xy * yz - xz * yy, xy * xz - yz * xx, det_z)),
+    )
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        normals = (normals / np.sqrt((normals ** 2).sum(axis=0))).T
+    normals[det.max(axis=0) <= 0] = np.nan  # The points do not span a plane
+    return centroids, normals, cloud
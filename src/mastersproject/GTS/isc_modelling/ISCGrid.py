@@ -1,11 +1,17 @@
+import hashlib
+import json
 import logging
+import os
+import pickle
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 
 import porepy as pp
 from GTS.ISC_data.fracture import fracture_network
+from GTS.ISC_data.geometry_sampling import sample_convex_plane
+from GTS.ISC_data.isc import get_isc_data
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +22,9 @@ def create_grid(
     bounding_box: Dict[str, float],
     shearzone_names: List[str],
     folder_name: str,
+    mesh_cache_dir: Optional[Path] = None,
+    depth_uncertainty: float = 0,
+    geometry_seed: Optional[int] = None,
 ):
     """ Create a GridBucket of a 3D domain with fractures defined by the ISC data set.
 
@@ -23,6 +32,12 @@ def create_grid(
     order of names appearing in shearzone_names is preserved as fracture grids
     are constructed.
 
+    If mesh_cache_dir is given, the meshed grid bucket is stored there, and
+    reused by later calls with the same geometry. See mesh_cache_key.
+
+    If geometry_seed is given, the shear-zones are a Monte Carlo sample of the
+    geometry, with borehole intersection depths perturbed by depth_uncertainty.
+    See GTS.ISC_data.geometry_sampling.
 
     Parameters
     ----------
@@ -36,6 +51,12 @@ def create_grid(
         names of ISC shearzones to include or None
     folder_name : str
         Path to store grid files
+    mesh_cache_dir : Path, Optional
+        Directory of the mesh cache. If None, the cache is not used.
+    depth_uncertainty : float
+        Standard deviation of the borehole intersection depths (unscaled)
+    geometry_seed : int, Optional
+        Seed of the geometry sample. If None, the measured geometry is used.
 
     Returns
     -------
@@ -45,6 +66,71 @@ def create_grid(
             fracture network
 
     """
+    geometry_sample = None
+    if geometry_seed is not None and shearzone_names is not None:
+        geometry_sample = {
+            "depth_uncertainty": depth_uncertainty,
+            "geometry_seed": geometry_seed,
+        }
+
+    cache_file = None
+    gb, network = None, None
+    if mesh_cache_dir is not None:
+        key = mesh_cache_key(
+            mesh_args, length_scale, bounding_box, shearzone_names, geometry_sample
+        )
+        cache_file = Path(mesh_cache_dir) / f"gb_{key}.pkl"
+        gb, network = _load_cached_mesh(cache_file)
+
+    if gb is None:
+        gb, network = _mesh(
+            mesh_args,
+            length_scale,
+            bounding_box,
+            shearzone_names,
+            folder_name,
+            geometry_sample,
+        )
+        if cache_file is not None:
+            _write_cached_mesh(cache_file, gb, network)
+
+    pp.contact_conditions.set_projections(gb)
+
+    # --- Set fracture grid names: ---
+    # The 3D grid is tagged by 'None'
+    # 2D fractures are tagged by their shearzone name (S1_1, S1_2, etc.)
+    # 1D (and 0D) fracture intersections are tagged by 'None'.
+    gb.add_node_props(
+        keys=["name"]
+    )  # Add 'name' as node prop to all grids. (value is 'None' by default)
+    fracture_grids = gb.get_grids(lambda _g: _g.dim == gb.dim_max() - 1)
+
+    # Set node property 'name' to each fracture with value being name of the shear zone.
+    if fracture_grids.size > 0:
+        for i, sz_name in enumerate(shearzone_names):
+            gb.set_node_prop(fracture_grids[i], key="name", val=sz_name)
+            # Note: Use self.gb.node_props(g, 'name') to get value.
+
+    return gb, network
+
+
+def _mesh(
+    mesh_args: Dict[str, float],
+    length_scale: float,
+    bounding_box: Dict[str, float],
+    shearzone_names: List[str],
+    folder_name: str,
+    geometry_sample: Optional[Dict] = None,
+) -> Tuple[pp.GridBucket, pp.FractureNetwork3d]:
+    """ Mesh the ISC domain with gmsh. See create_grid for parameters."""
+    convex = None
+    if geometry_sample is not None:
+        convex = sample_convex_plane(
+            shearzone_names,
+            depth_uncertainty=geometry_sample["depth_uncertainty"],
+            seed=geometry_sample["geometry_seed"],
+        )
+
     # Scale mesh args by length_scale:
     mesh_args = {k: v / length_scale for k, v in mesh_args.items()}
     # Scale bounding box by length_scale:
@@ -56,31 +142,79 @@ def create_grid(
         export_vtk=True,
         domain=bounding_box,
         length_scale=length_scale,
+        convex=convex,
         network_path=f"{folder_name}/fracture_network.vtu",
     )
     path = f"{folder_name}/gmsh_frac_file"
     gb = network.mesh(mesh_args=mesh_args, file_name=path)
+    return gb, network
 
-    pp.contact_conditions.set_projections(gb)
 
-    # --- Set fracture grid names: ---
-    # The 3D grid is tagged by 'None'
-    # 2D fractures are tagged by their shearzone name (S1_1, S1_2, etc.)
-    # 1D (and 0D) fracture intersections are tagged by 'None'.
-    gb.add_node_props(
-        keys=["name"]
-    )  # Add 'name' as node prop to all grids. (value is 'None' by default)
-    fracture_grids = gb.get_grids(lambda _g: _g.dim == gb.dim_max() - 1)
+def mesh_cache_key(
+    mesh_args: Dict[str, float],
+    length_scale: float,
+    bounding_box: Dict[str, float],
+    shearzone_names: List[str],
+    geometry_sample: Optional[Dict] = None,
+) -> str:
+    """ Content hash of the input that determines the mesh of the ISC domain
 
-    # Set node property 'name' to each fracture with value being name of the shear zone.
-    if fracture_grids.size > 0:
-        for i, sz_name in enumerate(shearzone_names):
-            gb.set_node_prop(fracture_grids[i], key="name", val=sz_name)
-            # Note: Use self.gb.node_props(g, 'name') to get value.
+    The key also depends on the content of the ISC data set and the porepy version.
+    A geometry sample (see create_grid) is only part of the key if given, such
+    that keys of the measured geometry are unchanged.
 
+    Returns
+    -------
+    key : str
+        Hex digest (first 16 characters of sha256)
+    """
+    geometry = {
+        "mesh_args": mesh_args,
+        "length_scale": length_scale,
+        "bounding_box": bounding_box,
+        "shearzone_names": shearzone_names,
+        "data_version": get_isc_data().data_version(),
+        "porepy_version": getattr(pp, "__version__", None),
+    }
+    if geometry_sample is not None:
+        geometry["geometry_sample"] = geometry_sample
+    encoded = json.dumps(geometry, sort_keys=True, default=float).encode()
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+def _load_cached_mesh(cache_file: Path):
+    """ Load a cached grid bucket and network. Return (None, None) if not found."""
+    if not cache_file.is_file():
+        return None, None
+    try:
+        with open(cache_file, "rb") as f:
+            gb, network = pickle.load(f)
+    except Exception as e:  # Corrupt or incompatible cache file. Mesh again.
+        logger.warning(f"Could not load cached mesh {cache_file}: {e}")
+        return None, None
+    logger.info(f"Loaded cached mesh from {cache_file}")
     return gb, network
 
 
+def _write_cached_mesh(
+    cache_file: Path, gb: pp.GridBucket, network: pp.FractureNetwork3d
+) -> None:
+    """ Write grid bucket and network to the mesh cache.
+
+    The file is written to a temporary file first, such that concurrent
+    processes never read an incomplete cache file.
+    """
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_file, "wb") as f:
+            pickle.dump((gb, network), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file, cache_file)
+        logger.info(f"Saved mesh to cache {cache_file}")
+    except OSError as e:
+        logger.warning(f"Could not write mesh cache: {e}")
+
+
 def create_structured_grid(length_scale: float,):
     """ Create a structured 3d grid
 
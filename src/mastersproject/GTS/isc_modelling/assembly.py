@@ -0,0 +1,216 @@
+""" Assembly into a global matrix with a persistent sparsity pattern.
+
+The porepy assembler builds a new global matrix on each call. The sparsity
+pattern of that matrix may change between Newton iterations, e.g. when contact
+cells change between stick and slip, which forces the direct solver to redo its
+symbolic analysis.
+
+PersistentMatrix keeps one global csr matrix per grid bucket. Its pattern is the
+union of the patterns of all matrices assembled so far, and a map from the
+entries of the assembled matrix to slots in the global data array is kept as long
+as the entries of the assembled matrix do not move. Each assembly then only
+overwrites the data array in place, and the pattern seen by the solvers is fixed.
+"""
+import logging
+from typing import Optional, Tuple, Union
+
+import numpy as np
+import scipy.sparse as sps
+
+logger = logging.getLogger(__name__)
+
+
+class PersistentMatrix:
+    """ Global csr matrix with a fixed sparsity pattern, updated in place
+
+    The matrix is returned by update, and the same object (and the same index
+    arrays) is returned by every later update, until the pattern must grow.
+    The pattern of a square matrix always contains the diagonal, such that
+    constraints can be imposed in place (see eliminate_dofs).
+    """
+
+    def __init__(self):
+        self.matrix: Optional[sps.csr_matrix] = None
+        # Sorted linear indices (row * num_cols + col) of the pattern
+        self._keys: Optional[np.ndarray] = None
+
+        # Entries of the last assembled matrix, and their slots in matrix.data
+        self._rows: Optional[np.ndarray] = None
+        self._cols: Optional[np.ndarray] = None
+        self._slots: Optional[np.ndarray] = None
+
+        # Statistics
+        self.num_pattern_updates: int = 0
+        self.num_slot_maps: int = 0
+        self.num_updates: int = 0
+
+    def update(self, A: sps.spmatrix) -> sps.csr_matrix:
+        """ Copy the values of A into the global matrix
+
+        Duplicate entries of A are summed. Entries of the global pattern that are
+        not in A are set to zero. While the entries of A do not move, the slot map
+        of the previous update is reused: the update is then a comparison of the
+        row and column arrays and one bincount, which is cheaper than converting
+        A to a csr matrix with sorted indices.
+
+        Parameters
+        ----------
+        A : sps.spmatrix
+            Assembled matrix. Preferably in coo format, which avoids sorting the
+            entries of A.
+
+        Returns
+        -------
+        matrix : sps.csr_matrix
+            The global matrix, with sorted indices.
+        """
+        A = A.tocoo()
+        if self.matrix is not None and self.matrix.shape != A.shape:
+            self.reset()
+
+        if not self._same_entries(A):
+            self._map_slots(A)
+
+        nnz = self.matrix.data.size
+        self.matrix.data[:] = np.bincount(self._slots, weights=A.data, minlength=nnz)
+        self.num_updates += 1
+        return self.matrix
+
+    def reset(self) -> None:
+        """ Discard the pattern. The next update starts from scratch."""
+        self.matrix = None
+        self._keys = None
+        self._rows = None
+        self._cols = None
+        self._slots = None
+
+    def _same_entries(self, A: sps.coo_matrix) -> bool:
+        """ Whether the entries of A are at the positions of the last update"""
+        return (
+            self._slots is not None
+            and np.array_equal(A.row, self._rows)
+            and np.array_equal(A.col, self._cols)
+        )
+
+    def _map_slots(self, A: sps.coo_matrix) -> None:
+        """ Map the entries of A to slots in the pattern, growing it if needed"""
+        keys = A.row.astype(np.int64) * A.shape[1] + A.col
+
+        found = False
+        if self._keys is not None:
+            slots = np.searchsorted(self._keys, keys)
+            slots[slots == self._keys.size] = 0
+            found = np.array_equal(self._keys[slots], keys)
+        if not found:
+            self._grow_pattern(keys, A.shape)
+            slots = np.searchsorted(self._keys, keys)
+
+        self._rows = A.row.copy()
+        self._cols = A.col.copy()
+        self._slots = slots
+        self.num_slot_maps += 1
+
+    def _grow_pattern(self, keys: np.ndarray, shape) -> None:
+        """ Set the pattern to the union of the current pattern and keys"""
+        num_rows, num_cols = shape
+        if self._keys is not None:
+            keys = np.concatenate((self._keys, keys))
+        elif num_rows == num_cols:
+            diagonal = np.arange(num_rows, dtype=np.int64) * (num_cols + 1)
+            keys = np.concatenate((diagonal, keys))
+        self._keys = np.unique(keys)
+
+        rows = self._keys // num_cols
+        indptr = np.zeros(num_rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=num_rows), out=indptr[1:])
+        indices = self._keys % num_cols
+        data = np.zeros(self._keys.size)
+        self.matrix = sps.csr_matrix((data, indices, indptr), shape=shape)
+        self.matrix.has_sorted_indices = True
+        self.num_pattern_updates += 1
+        logger.info(
+            f"Global sparsity pattern updated: {self._keys.size} nonzeros "
+            f"({self.num_pattern_updates} pattern updates)"
+        )
+
+
+def eliminate_dofs(
+    A: sps.csr_matrix,
+    b: np.ndarray,
+    dofs: np.ndarray,
+    values: Union[float, np.ndarray],
+    symmetric: bool = False,
+) -> Tuple[sps.csr_matrix, np.ndarray]:
+    """ Constrain degrees of freedom to given values, in place
+
+    The rows of the constrained dofs are replaced by their diagonal entry (or one,
+    if the diagonal is zero), and the right hand side is set to the diagonal entry
+    times the value. This keeps the scaling of the rows. All rows are handled in
+    one vectorized pass, and the sparsity pattern of A is not changed.
+
+    Parameters
+    ----------
+    A : sps.csr_matrix
+        Matrix with sorted indices. The values are modified in place.
+    b : np.ndarray
+        Right hand side. Modified in place.
+    dofs : np.ndarray
+        Indices of the constrained dofs
+    values : float or np.ndarray
+        Values of the constrained dofs
+    symmetric : bool
+        Also eliminate the columns of the constrained dofs, moving their
+        contribution to the right hand side of the other rows.
+
+    Returns
+    -------
+    A, b : sps.csr_matrix, np.ndarray
+        The constrained system, modified in place
+
+    Raises
+    ------
+    ValueError
+        If a constrained row has no diagonal entry in the pattern of A. Adding
+        the entry would reallocate A. The pattern of a PersistentMatrix always
+        contains the diagonal.
+    """
+    dofs = np.asarray(dofs, dtype=int)
+    n = A.shape[0]
+    if dofs.size == 0:
+        return A, b
+
+    # Entries of the constrained rows
+    counts = A.indptr[dofs + 1] - A.indptr[dofs]
+    rows = np.repeat(dofs, counts)
+    entries = np.repeat(A.indptr[dofs] - np.cumsum(counts) + counts, counts)
+    entries += np.arange(rows.size)
+    on_diagonal = A.indices[entries] == rows
+
+    missing = np.setdiff1d(dofs, rows[on_diagonal])
+    if missing.size > 0:
+        raise ValueError(
+            f"{missing.size} constrained rows have no diagonal entry in the pattern"
+        )
+
+    value = np.zeros(n)
+    value[dofs] = values
+    is_dof = np.zeros(n, dtype=bool)
+    is_dof[dofs] = True
+
+    if symmetric:
+        # Entries in the constrained columns, outside the constrained rows
+        col_entries = np.where(is_dof[A.indices])[0]
+        col_rows = np.searchsorted(A.indptr, col_entries, side="right") - 1
+        keep = ~is_dof[col_rows]
+        col_entries, col_rows = col_entries[keep], col_rows[keep]
+        weights = A.data[col_entries] * value[A.indices[col_entries]]
+        b -= np.bincount(col_rows, weights=weights, minlength=n)
+        A.data[col_entries] = 0
+
+    scale = np.ones(n)
+    scale[rows[on_diagonal]] = A.data[entries[on_diagonal]]
+    scale[scale == 0] = 1
+    A.data[entries] = 0
+    A.data[entries[on_diagonal]] = scale[rows[on_diagonal]]
+    b[dofs] = scale[dofs] * value[dofs]
+    return A, b
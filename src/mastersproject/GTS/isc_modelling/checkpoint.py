@@ -0,0 +1,216 @@
+""" Checkpointing and restart of time-dependent simulations.
+
+A checkpoint folder holds
+    grid.pkl : The grid bucket, stored once, without states, parameters and
+        discretizations.
+    step_<n>.npz : The arrays of pp.STATE (including previous_iterate and nested
+        dictionaries) of every grid and edge after time step n.
+    index.json : Time, time step and file name of each stored step.
+
+A model can be restarted from any stored step, e.g. to reuse an expensive
+initialization phase for several stimulation scenarios. To continue a simulation
+in the folder it was restarted from, truncate the steps after the restored one.
+"""
+import json
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+import porepy as pp
+
+logger = logging.getLogger(__name__)
+
+# Data that is recomputed by the model, and not stored with the grid
+_NON_GRID_KEYS = (
+    pp.STATE,
+    pp.PARAMETERS,
+    pp.DISCRETIZATION,
+    pp.DISCRETIZATION_MATRICES,
+    pp.COUPLING_DISCRETIZATION,
+    pp.PRIMARY_VARIABLES,
+    "mortar_to_local_jump",
+)
+
+
+class Checkpoint:
+    """ Read and write checkpoints of a simulation in a folder"""
+
+    def __init__(self, folder: Path):
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=True)
+        self._index_file = self.folder / "index.json"
+        self._grid_file = self.folder / "grid.pkl"
+
+    @property
+    def steps(self) -> List[Dict]:
+        """ Stored steps, as dictionaries with keys 'step', 'time', 'time_step' and
+        'file'. 'time_step' is None if it was not given to save_step."""
+        if not self._index_file.is_file():
+            return []
+        with open(self._index_file) as f:
+            return json.load(f)["steps"]
+
+    def has_grid(self) -> bool:
+        return self._grid_file.is_file()
+
+    def save_grid(self, gb: pp.GridBucket) -> None:
+        """ Store the grid bucket, without states, parameters and discretizations"""
+        gb.assign_node_ordering(overwrite_existing=False)
+        removed = []
+        try:
+            for _, d in _all_data(gb):
+                removed.append({k: d.pop(k) for k in _NON_GRID_KEYS if k in d})
+            _atomic_write(
+                self._grid_file,
+                pickle.dumps(gb, protocol=pickle.HIGHEST_PROTOCOL),
+            )
+        finally:
+            for (_, d), data in zip(_all_data(gb), removed):
+                d.update(data)
+        logger.info(f"Saved grid to checkpoint {self._grid_file}")
+
+    def load_grid(self) -> pp.GridBucket:
+        """ Load the stored grid bucket"""
+        with open(self._grid_file, "rb") as f:
+            return pickle.load(f)
+
+    def save_step(
+        self,
+        gb: pp.GridBucket,
+        time: float,
+        time_step: Optional[float] = None,
+        exclude: Iterable[str] = (),
+    ) -> int:
+        """ Store the states of all grids and edges
+
+        Parameters
+        ----------
+        gb : pp.GridBucket
+            Grid bucket with states to store
+        time : float
+            Simulation time of the states
+        time_step : float, Optional
+            Time step to continue the simulation with
+        exclude : Iterable[str]
+            Top-level keys of pp.STATE not to store, e.g. derived export fields
+
+        Returns
+        -------
+        step : int
+            Number of the stored step
+        """
+        steps = self.steps
+        step = steps[-1]["step"] + 1 if steps else 0
+        file_name = f"step_{step:05d}.npz"
+
+        exclude = set(exclude)
+        arrays = {}
+        for name, d in _all_data(gb):
+            state = {k: v for k, v in d.get(pp.STATE, {}).items() if k not in exclude}
+            for key, value in _flatten(state):
+                arrays[f"{name}/{key}"] = value
+
+        tmp_file = self.folder / f"{file_name}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(tmp_file, **arrays)
+        os.replace(tmp_file, self.folder / file_name)
+
+        steps.append(
+            {"step": step, "time": time, "time_step": time_step, "file": file_name}
+        )
+        self._write_index(steps)
+        logger.info(f"Saved checkpoint step {step} at time {time:.4e}")
+        return step
+
+    def load_step(self, gb: pp.GridBucket, step: Optional[int] = None) -> Dict:
+        """ Restore stored states to the grids and edges of gb
+
+        Stored arrays overwrite the corresponding entries of pp.STATE. Other entries
+        are left as they are.
+
+        Parameters
+        ----------
+        gb : pp.GridBucket
+            Grid bucket with the same grids as the stored one
+        step : int, Optional
+            Step to restore. Default: The last stored step.
+
+        Returns
+        -------
+        entry : Dict
+            The index entry ('step', 'time', 'time_step', 'file') of the restored step
+        """
+        steps = self.steps
+        if not steps:
+            raise ValueError(f"No checkpoint steps stored in {self.folder}")
+        entry = steps[-1] if step is None else {s["step"]: s for s in steps}[step]
+        entry.setdefault("time_step", None)  # Indices written before time_step
+
+        gb.assign_node_ordering(overwrite_existing=False)
+        data = dict(_all_data(gb))
+        with np.load(self.folder / entry["file"]) as arrays:
+            for key in arrays.files:
+                name, *path = key.split("/")
+                state = data[name].setdefault(pp.STATE, {})
+                for k in path[:-1]:
+                    state = state.setdefault(k, {})
+                state[path[-1]] = arrays[key]
+        logger.info(f"Restored checkpoint step {entry['step']} at time {entry['time']}")
+        return entry
+
+    def set_time_step(self, time_step: float, step: Optional[int] = None) -> None:
+        """ Change the stored time step of a step (default: the last stored step)"""
+        steps = self.steps
+        if not steps:
+            raise ValueError(f"No checkpoint steps stored in {self.folder}")
+        entry = steps[-1] if step is None else {s["step"]: s for s in steps}[step]
+        entry["time_step"] = time_step
+        self._write_index(steps)
+
+    def truncate(self, step: int) -> None:
+        """ Delete the steps after step, such that save_step continues from it"""
+        steps = self.steps
+        removed = [s for s in steps if s["step"] > step]
+        if not removed:
+            return
+        self._write_index([s for s in steps if s["step"] <= step])
+        for s in removed:
+            path = self.folder / s["file"]
+            if path.is_file():
+                path.unlink()
+        logger.info(f"Deleted {len(removed)} checkpoint steps after step {step}")
+
+    def _write_index(self, steps: List[Dict]) -> None:
+        _atomic_write(self._index_file, json.dumps({"steps": steps}).encode())
+
+
+def _all_data(gb: pp.GridBucket):
+    """ Yield (name, data) of all grids and edges. The name identifies the grid or
+    edge by node numbers."""
+    for _, d in gb:
+        yield f"n{d['node_number']}", d
+    for e, d in gb.edges():
+        n_0 = gb.node_props(e[0], "node_number")
+        n_1 = gb.node_props(e[1], "node_number")
+        yield f"e{n_0}_{n_1}", d
+
+
+def _flatten(state: Dict, prefix: str = ""):
+    """ Yield (path, array) of all arrays in a nested dictionary"""
+    for key, value in state.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, prefix=f"{path}/")
+        elif isinstance(value, np.ndarray):
+            yield path, value
+
+
+def _atomic_write(path: Path, content: bytes) -> None:
+    """ Write to a temporary file, and move it in place"""
+    tmp_file = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_file, "wb") as f:
+        f.write(content)
+    os.replace(tmp_file, path)
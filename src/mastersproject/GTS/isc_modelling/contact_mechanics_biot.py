@@ -4,10 +4,12 @@ from typing import Dict, Tuple
 import numpy as np
 
 import porepy as pp
+from GTS.isc_modelling.exporter import create_exporter
 from GTS.isc_modelling.mechanics import ContactMechanicsISC
 from GTS.isc_modelling.mechanics import Mechanics
 from GTS.isc_modelling.flow import Flow
 from GTS.isc_modelling.parameter import BaseParameters
+from GTS.isc_modelling.stimulation import StimulationProtocol
 from mastersproject.util.logging_util import timer, trace
 from porepy.models.contact_mechanics_biot_model import ContactMechanicsBiot
 
@@ -287,6 +289,7 @@ class ContactMechanicsBiotBase(Flow, Mechanics):
         super().export_step(write_vtk=False)
 
         if write_vtk:
+            self.compute_derived_fields()
             self.viz.write_vtk(
                 data=self.export_fields, time_step=self.time
             )  # Write visualization
@@ -382,6 +385,10 @@ class ContactMechanicsBiotISC(ContactMechanicsISC, ContactMechanicsBiot):
         self.prepare_initial_run()
 
         # Initialize phase and injection rate
+        self.injection_well = (self.source_scalar_borehole_shearzone or {}).get(
+            "borehole", "INJ1"
+        )
+        self.stimulation_protocol = self._legacy_stimulation_protocol()
         self.current_phase = 0
         self.current_injection_rate = 0
 
@@ -755,8 +762,11 @@ class ContactMechanicsBiotISC(ContactMechanicsISC, ContactMechanicsBiot):
 
     def set_viz(self):
         """ Set exporter for visualization """
-        self.viz = pp.Exporter(
-            self.gb, file_name=self.file_name, folder_name=self.viz_folder_name
+        self.viz = create_exporter(
+            self.gb,
+            file_name=self.file_name,
+            folder_name=self.viz_folder_name,
+            exporter=self.params.get("exporter", "vtk"),
         )
         # list of time steps to export with visualization.
         self.export_times = []
@@ -1014,18 +1024,40 @@ class ContactMechanicsBiotISC(ContactMechanicsISC, ContactMechanicsBiot):
                     current_injection_rate : float
                         fluid injection rate (l/min)
                 """
-        time_intervals = [
+        next_phase = self.stimulation_protocol.phase(self.injection_well, self.time)
+        if next_phase > self.current_phase:
+            rate = self.stimulation_protocol.value(self.injection_well, self.time)
+            logger.info(
+                f"A new phase has started: Phase {next_phase}. "
+                f"Injection set to {rate * pp.MINUTE} l/min"
+            )
+
+        # Current phase number:
+        self.current_phase = next_phase
+
+        # Current injection amount [litres / second]
+        self.current_injection_rate = self.stimulation_protocol.value(
+            self.injection_well, self.time
+        )
+
+    def _legacy_stimulation_protocol(self) -> StimulationProtocol:
+        """ Injection cycle 3, see simulation_protocol
+
+        The phases start at these times. Phase 0 has no injection.
+        """
+        start_times = [
             # Phase 0: 0 l/min
-            1e-10,
+            0,
             # Phase 1: 10 l/min
-            10 * pp.MINUTE,
+            1e-10,
             # Phase 2: 15 l/min
-            20 * pp.MINUTE,
+            10 * pp.MINUTE,
             # Phase 3: 20 l/min
-            30 * pp.MINUTE,
+            20 * pp.MINUTE,
             # Phase 4: 25 l/min
-            40 * pp.MINUTE,
+            30 * pp.MINUTE,
             # Phase 5: 0 l/min
+            40 * pp.MINUTE,
         ]
 
         # TODO: TEMPORARY CONSTANT INJECTION
@@ -1039,18 +1071,9 @@ class ContactMechanicsBiotISC(ContactMechanicsISC, ContactMechanicsBiot):
         #     25,     # Phase 4
         #     0,      # Phase 5
         # ]
-        next_phase = np.searchsorted(time_intervals, self.time, side="right")
-        if next_phase > self.current_phase:
-            logger.info(
-                f"A new phase has started: Phase {next_phase}. "
-                f"Injection set to {injection_amount[next_phase]} l/min"
-            )
-
-        # Current phase number:
-        self.current_phase = next_phase
-
-        # Current injection amount [litres / second]
-        self.current_injection_rate = injection_amount[self.current_phase] / pp.MINUTE
+        # Injection rates [litres / second]
+        rates = np.array(injection_amount) / pp.MINUTE
+        return StimulationProtocol().add_well(self.injection_well, start_times, rates)
 
     @timer(logger)
     def prepare_simulation(self):
@@ -1217,16 +1240,6 @@ class ContactMechanicsBiotISC(ContactMechanicsISC, ContactMechanicsBiot):
         return 480.0 * pp.METER - self.length_scale * coords[2]
 
 
-# TODO: Extract the stimulation protocol from ContactMechanicsBiot by the principle of
-#  separation of data from model.
-class StimulationProtocol:
-    """ This class describes a stimulation protocol for the Biot equations
-    """
-
-    def __init__(self):
-        pass
-
-
 class WaterISC(pp.Water):
     def __init__(self, theta_ref=None):
         super().__init__(theta_ref)
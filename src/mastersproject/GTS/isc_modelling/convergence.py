@@ -0,0 +1,226 @@
+""" Per-block convergence monitoring of the non-linear solver.
+
+A block is a set of degrees of freedom, e.g. the pressures on all grids or the
+contact tractions, with a scale that converts the (scaled) solution to physical
+units. The monitor maps each dof to its block once per assembler, and then
+computes the norms of all blocks in one pass over the solution vector:
+    update : ||s (x - x_prev)||, the last Newton update,
+    increment : ||s (x - x_init)||, the change over the time step,
+    solution : ||s x||,
+    residual : ||r||, the non-linear residual (if given), unscaled,
+where s is the scale of the block. Each evaluation is appended to a history, one
+record per block, which can be inspected with to_dataframe.
+
+Block norms are not squared. The tolerance of the convergence check (see
+ConvergenceMonitor.check) bounds the norms themselves.
+"""
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+NORMS = ("update", "increment", "solution", "residual")
+
+
+class ConvergenceMonitor:
+    """ Norms of blocks of the solution vector, and their history
+
+    Parameters
+    ----------
+    blocks : Sequence[Tuple[str, np.ndarray, float]]
+        (name, dofs, scale) of each block. Blocks must not overlap.
+    num_dofs : int
+        Size of the solution vector
+    """
+
+    def __init__(
+        self, blocks: Sequence[Tuple[str, np.ndarray, float]] = (), num_dofs: int = 0
+    ):
+        self.block_names: List[str] = []
+        # Block index of each dof. Dofs outside all blocks have index num_blocks.
+        self._block_of_dof = np.zeros(0, dtype=int)
+        self._scale_of_dof = np.zeros(0)
+
+        # Norms of the last evaluation, shape (len(NORMS), num_blocks),
+        # and the arrays they were computed from.
+        self._norms: Optional[np.ndarray] = None
+        self._last_arrays: Tuple = ()
+
+        self.history: List[Dict] = []
+        self._time = np.nan
+        self._iteration = 0
+
+        self.set_blocks(blocks, num_dofs)
+
+    def set_blocks(
+        self, blocks: Sequence[Tuple[str, np.ndarray, float]], num_dofs: int
+    ) -> None:
+        """ Set the blocks, e.g. for a new assembler. The history is kept."""
+        self.block_names = [name for name, _, _ in blocks]
+        num_blocks = len(self.block_names)
+        self._block_of_dof = np.full(num_dofs, num_blocks, dtype=int)
+        self._scale_of_dof = np.zeros(num_dofs)
+        for i, (name, dofs, scale) in enumerate(blocks):
+            if np.any(self._block_of_dof[dofs] != num_blocks):
+                raise ValueError(f"Block {name} overlaps another block")
+            self._block_of_dof[dofs] = i
+            self._scale_of_dof[dofs] = scale
+        self._norms = None
+        self._last_arrays = ()
+
+    def evaluate(
+        self,
+        solution: np.ndarray,
+        prev_solution: np.ndarray,
+        init_solution: np.ndarray,
+        residual: Optional[np.ndarray] = None,
+        time: float = np.nan,
+    ) -> pd.DataFrame:
+        """ Norms of each block at an iterate, appended to the history
+
+        The norms are computed once per iterate. Repeated calls with the same
+        arrays (e.g. by the checks of the sub-models of a coupled model) return
+        the stored norms.
+
+        Parameters
+        ----------
+        solution, prev_solution, init_solution : np.ndarray
+            Current iterate, previous iterate and initial guess of the time step
+        residual : np.ndarray, Optional
+            Non-linear residual b - A x at the current iterate
+        time : float
+            Time of the time step. The iteration count restarts for a new time.
+
+        Returns
+        -------
+        norms : pd.DataFrame
+            The norms (columns) of each block (index)
+        """
+        self._evaluate(solution, prev_solution, init_solution, residual, time)
+        return pd.DataFrame(
+            self._norms.T, index=pd.Index(self.block_names, name="block"), columns=NORMS
+        )
+
+    def check(
+        self,
+        block: str,
+        solution: np.ndarray,
+        prev_solution: np.ndarray,
+        init_solution: np.ndarray,
+        tol: float,
+        time: float = np.nan,
+    ) -> Tuple[float, bool, bool]:
+        """ Convergence check of a block
+
+        The block has converged if the norm of the update is below tol
+        (absolute), or below tol times the norm of the increment (relative).
+        It has diverged if the norm of the update is not finite.
+
+        Returns
+        -------
+        error : float
+            Relative error, update / increment. Zero if there is neither an
+            update nor an increment.
+        converged, diverged : bool
+        """
+        self._evaluate(solution, prev_solution, init_solution, None, time)
+        update, increment = self._norms[:2, self.block_names.index(block)]
+        if not np.isfinite(update):
+            return np.nan, False, True
+        error = self._relative(update, increment)
+        converged = update < tol or error < tol
+        return error, converged, False
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """ History of the norms, one row per evaluation and block
+
+        Columns 'time', 'iteration', 'block', the norms, and 'error' (the relative
+        error update / increment).
+        """
+        columns = ["time", "iteration", "block", *NORMS, "error"]
+        return pd.DataFrame(self.history, columns=columns)
+
+    def reset_history(self) -> None:
+        self.history = []
+        self._time = np.nan
+        self._iteration = 0
+
+    def _evaluate(
+        self,
+        solution: np.ndarray,
+        prev_solution: np.ndarray,
+        init_solution: np.ndarray,
+        residual: Optional[np.ndarray],
+        time: float,
+    ) -> None:
+        """ Compute and record the norms, unless done for these arrays"""
+        arrays = (solution, prev_solution, init_solution, residual)
+        if not self._is_last_evaluation(arrays):
+            self._norms = self._block_norms(*arrays)
+            self._last_arrays = arrays
+            self._record(time)
+
+    def _block_norms(
+        self,
+        solution: np.ndarray,
+        prev_solution: np.ndarray,
+        init_solution: np.ndarray,
+        residual: Optional[np.ndarray],
+    ) -> np.ndarray:
+        """ Norms of all blocks, shape (len(NORMS), num_blocks)"""
+        num_blocks = len(self.block_names)
+        scaled = self._scale_of_dof * solution
+        values = np.empty((len(NORMS), solution.size))
+        values[0] = scaled - self._scale_of_dof * prev_solution
+        values[1] = scaled - self._scale_of_dof * init_solution
+        values[2] = scaled
+        values[3] = residual if residual is not None else 0
+        np.square(values, out=values)
+
+        # Sum the squares of all norms and blocks at once, by offsetting the
+        # block index of each norm.
+        offsets = np.arange(len(NORMS))[:, np.newaxis] * (num_blocks + 1)
+        sums = np.bincount(
+            (self._block_of_dof + offsets).ravel(),
+            weights=values.ravel(),
+            minlength=len(NORMS) * (num_blocks + 1),
+        ).reshape(len(NORMS), num_blocks + 1)[:, :num_blocks]
+        norms = np.sqrt(sums)
+        if residual is None:
+            norms[3] = np.nan
+        return norms
+
+    def _record(self, time: float) -> None:
+        """ Append the last norms to the history"""
+        if time != self._time and not (np.isnan(time) and np.isnan(self._time)):
+            self._iteration = 0
+            self._time = time
+        self._iteration += 1
+        for name, norms in zip(self.block_names, self._norms.T):
+            record = {"time": time, "iteration": self._iteration, "block": name}
+            record.update(zip(NORMS, norms))
+            record["error"] = self._relative(norms[0], norms[1])
+            self.history.append(record)
+
+    def _is_last_evaluation(self, arrays: Tuple) -> bool:
+        """ Whether the arrays are those of the last evaluation
+
+        A missing residual matches the residual of the last evaluation.
+        """
+        if self._norms is None:
+            return False
+        *iterates, residual = arrays
+        *last_iterates, last_residual = self._last_arrays
+        return all(a is b for a, b in zip(iterates, last_iterates)) and (
+            residual is None or residual is last_residual
+        )
+
+    @staticmethod
+    def _relative(update: float, increment: float) -> float:
+        """ update / increment, without dividing by zero"""
+        if increment > 0:
+            return update / increment
+        return 0.0 if update == 0 else np.inf
@@ -0,0 +1,176 @@
+""" Diagnostics of assembled linear systems.
+
+The 1-norm condition number cond_1(A) = ||A||_1 ||A^-1||_1 is estimated by the
+Hager-Higham algorithm (as in LAPACK's xLACON). It needs a handful of solves with
+A and A^T, which reuse the factorization of a DirectSolverSession, so the
+estimate costs no additional factorization after a solve.
+
+The cheap scaling measures used previously (ratio of row sums and of diagonal
+entries) are kept for comparison, and per-block statistics show the scaling of
+the displacement, pressure and contact blocks relative to each other.
+"""
+import logging
+from typing import Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sps
+import scipy.sparse.linalg as spla
+
+from GTS.isc_modelling.linear_solver import DirectSolverSession
+
+logger = logging.getLogger(__name__)
+
+
+def condition_number_1norm(
+    A: sps.spmatrix,
+    session: Optional[DirectSolverSession] = None,
+    max_iter: int = 5,
+) -> float:
+    """ Estimate the 1-norm condition number of A
+
+    Parameters
+    ----------
+    A : sps.spmatrix
+        Square sparse matrix
+    session : DirectSolverSession, Optional
+        Solver session with A factorized. If A is not the factorized matrix of the
+        session, it is factorized by the session. If None, A is factorized by SuperLU.
+    max_iter : int
+        Maximum number of iterations of the norm estimator
+
+    Returns
+    -------
+    cond : float
+        Estimate of ||A||_1 ||A^-1||_1. This is a lower bound, and is in practice
+        almost always within a factor 3 of the true value. np.inf if A is singular.
+    """
+    A = sps.csr_matrix(A, dtype=np.float64)
+    try:
+        solve = _factorized_solve(A, session)
+        inv_norm = inverse_norm_1(solve, A.shape[0], max_iter=max_iter)
+    except RuntimeError as e:  # Singular matrix (SuperLU, or PardisoError)
+        logger.warning(f"Condition number estimate failed: {e}")
+        return np.inf
+    return spla.norm(A, 1) * inv_norm
+
+
+def inverse_norm_1(
+    solve: Callable[[np.ndarray, bool], np.ndarray], n: int, max_iter: int = 5
+) -> float:
+    """ Hager-Higham estimate of ||A^-1||_1
+
+    Parameters
+    ----------
+    solve : Callable[[np.ndarray, bool], np.ndarray]
+        solve(b, transpose) returns A^-1 b, or A^-T b if transpose.
+    n : int
+        Size of A
+    max_iter : int
+        Maximum number of iterations
+
+    Returns
+    -------
+    estimate : float
+        Lower bound of ||A^-1||_1
+    """
+    x = np.full(n, 1 / n)
+    estimate = 0.0
+    for k in range(max_iter):
+        y = solve(x, False)
+        y_norm = np.abs(y).sum()
+        if k > 0 and y_norm <= estimate:
+            break
+        estimate = y_norm
+        z = solve(np.where(y >= 0, 1.0, -1.0), True)
+        j = np.argmax(np.abs(z))
+        if k > 0 and np.abs(z[j]) <= z @ x:
+            break
+        x = np.zeros(n)
+        x[j] = 1.0
+
+    # Higham's safeguard for matrices where the iteration stalls
+    b = np.ones(n)
+    if n > 1:
+        b = (-1) ** np.arange(n) * (1 + np.arange(n) / (n - 1))
+    alt_estimate = 2 * np.abs(solve(b, False)).sum() / (3 * n)
+    return max(estimate, alt_estimate)
+
+
+def row_sum_ratio(A: sps.spmatrix) -> float:
+    """ Ratio of the largest to the smallest absolute row sum of A"""
+    row_sum = np.asarray(abs(A).sum(axis=1)).ravel()
+    return _ratio(row_sum.max(), row_sum.min())
+
+
+def diagonal_ratio(A: sps.spmatrix) -> float:
+    """ Ratio of the largest to the smallest absolute diagonal entry of A"""
+    diag = np.abs(A.diagonal())
+    return _ratio(diag.max(), diag.min())
+
+
+def block_statistics(A: sps.spmatrix, blocks: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """ Scaling statistics of the diagonal blocks of A
+
+    Parameters
+    ----------
+    A : sps.spmatrix
+        Square sparse matrix
+    blocks : Dict[str, np.ndarray]
+        Dof indices of each block, e.g. {"mechanics": u_dofs, "flow": p_dofs}
+
+    Returns
+    -------
+    stats : pd.DataFrame
+        One row per block with the number of dofs, the largest absolute entry,
+        the range of absolute diagonal entries and row sums of the diagonal block,
+        and the largest absolute entry of the coupling to the other dofs.
+    """
+    A = sps.csr_matrix(A)
+    rows = []
+    for name, dofs in blocks.items():
+        dofs = np.asarray(dofs, dtype=int)
+        if dofs.size == 0:
+            continue
+        A_rows = A[dofs]
+        in_block = np.zeros(A.shape[1], dtype=bool)
+        in_block[dofs] = True
+        A_kk = A_rows[:, dofs]
+        A_coupling = A_rows[:, np.where(~in_block)[0]]
+
+        diag = np.abs(A_kk.diagonal())
+        row_sum = np.asarray(abs(A_kk).sum(axis=1)).ravel()
+        rows.append(
+            {
+                "block": name,
+                "dofs": dofs.size,
+                "max_abs": _max_abs(A_kk),
+                "min_abs_diag": diag.min(),
+                "max_abs_diag": diag.max(),
+                "min_row_sum": row_sum.min(),
+                "max_row_sum": row_sum.max(),
+                "max_abs_coupling": _max_abs(A_coupling),
+            }
+        )
+    return pd.DataFrame(rows).set_index("block")
+
+
+def _factorized_solve(A: sps.csr_matrix, session: Optional[DirectSolverSession]):
+    """ solve(b, transpose) using the factorization of A"""
+    if session is not None:
+        session.factorize(A)  # No-op if A is already factorized
+        return lambda b, transpose: session.solve_factorized(b, transpose=transpose)
+
+    lu = spla.splu(sps.csc_matrix(A))
+    return lambda b, transpose: lu.solve(b, trans="T" if transpose else "N")
+
+
+def _max_abs(A: sps.spmatrix) -> float:
+    """ Largest absolute entry, 0 for empty matrices"""
+    A = sps.csr_matrix(A)
+    return np.abs(A.data).max() if A.nnz > 0 else 0.0
+
+
+def _ratio(num: float, den: float) -> float:
+    """ num / den, inf if den is zero"""
+    return np.inf if den == 0 else num / den
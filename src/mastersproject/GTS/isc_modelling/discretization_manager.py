@@ -0,0 +1,214 @@
+""" Dependency-tracked re-discretization on a GridBucket.
+
+The assembler re-discretizes every term on every grid it is asked to. In the
+non-linear ISC models, only a few parameters change between Newton iterates (e.g.
+the aperture-dependent fracture permeability). The DiscretizationManager keeps a
+fingerprint of the parameters each term depends on, and only re-discretizes
+the terms on the grids and edges where these parameters actually changed.
+"""
+import hashlib
+import logging
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+import scipy.sparse as sps
+
+import porepy as pp
+
+logger = logging.getLogger(__name__)
+
+
+class DiscretizationManager:
+    """ Re-discretize terms whose parameters have changed
+
+    The dependencies are given per term:
+        node_dependencies: {(variable, term): [parameter names]}
+        edge_dependencies: {coupling term: [parameter names]}
+    The parameters are looked up in d[pp.PARAMETERS][discr.keyword], where discr is
+    the discretization object of the term on the grid or edge.
+
+    Terms not listed in the dependencies are never re-discretized by the manager.
+
+    Arrays are compared by value, so they may be modified in place. Parameter objects
+    (e.g. pp.FourthOrderTensor and pp.BoundaryCondition) must be replaced to take
+    effect. This is what pp.initialize_data does. An object that is unchanged since
+    the last fingerprint is not hashed again, such that the large tensors are
+    hashed once per time step rather than once per Newton iteration.
+    """
+
+    def __init__(
+        self,
+        gb: pp.GridBucket,
+        node_dependencies: Dict[Tuple[str, str], List[str]],
+        edge_dependencies: Dict[str, List[str]],
+    ):
+        self.gb = gb
+        self.node_dependencies = node_dependencies
+        self.edge_dependencies = edge_dependencies
+
+        # Fingerprints of the parameters of the last discretization, keyed by
+        # (grid, variable, term) for nodes and (edge, term) for edges.
+        self._fingerprints: Dict[Tuple, str] = {}
+        # The last parameter object and its fingerprint, keyed by (term key, name)
+        self._object_fingerprints: Dict[Tuple, Tuple[Any, str]] = {}
+
+    def update_fingerprints(self) -> None:
+        """ Record the current parameters as discretized
+
+        Call this after a full discretization of the grid bucket.
+        """
+        for key, fingerprint, _ in self._node_terms():
+            self._fingerprints[key] = fingerprint
+        for key, fingerprint, _ in self._edge_terms():
+            self._fingerprints[key] = fingerprint
+
+    def discretize(self) -> Tuple[List, List]:
+        """ Re-discretize the terms whose parameters changed since last time
+
+        Returns
+        -------
+        changed_nodes, changed_edges : List, List
+            (grid, variable, term) and (edge, term) of the re-discretized terms
+        """
+        changed_nodes = []
+        for key, fingerprint, discretize in self._node_terms():
+            if self._fingerprints.get(key) != fingerprint:
+                discretize()
+                self._fingerprints[key] = fingerprint
+                changed_nodes.append(key)
+
+        changed_edges = []
+        for key, fingerprint, discretize in self._edge_terms():
+            if self._fingerprints.get(key) != fingerprint:
+                discretize()
+                self._fingerprints[key] = fingerprint
+                changed_edges.append(key)
+
+        logger.info(
+            f"Re-discretized {len(changed_nodes)} node terms "
+            f"and {len(changed_edges)} edge terms."
+        )
+        return changed_nodes, changed_edges
+
+    def _node_terms(self):
+        """ Yield (key, fingerprint, discretize) for all tracked node terms"""
+        for g, d in self.gb:
+            discretizations = d.get(pp.DISCRETIZATION, {})
+            for (var, term), parameters in self.node_dependencies.items():
+                discr = discretizations.get(var, {}).get(term)
+                if discr is None:
+                    continue
+                key = (g, var, term)
+                param_dict = d[pp.PARAMETERS][discr.keyword]
+                fingerprint = self.fingerprint(key, param_dict, parameters)
+
+                def discretize(discr=discr, g=g, d=d):
+                    discr.discretize(g, d)
+
+                yield key, fingerprint, discretize
+
+    def _edge_terms(self):
+        """ Yield (key, fingerprint, discretize) for all tracked edge terms"""
+        for e, data_edge in self.gb.edges():
+            couplings = data_edge.get(pp.COUPLING_DISCRETIZATION, {})
+            for term, parameters in self.edge_dependencies.items():
+                if term not in couplings:
+                    continue
+                g_l, g_h = self.gb.nodes_of_edge(e)
+                _, discr = couplings[term][e]
+                key = (e, term)
+                param_dict = data_edge[pp.PARAMETERS][discr.keyword]
+                fingerprint = self.fingerprint(key, param_dict, parameters)
+
+                def discretize(discr=discr, g_h=g_h, g_l=g_l, data_edge=data_edge):
+                    data_h = self.gb.node_props(g_h)
+                    data_l = self.gb.node_props(g_l)
+                    discr.discretize(g_h, g_l, data_h, data_l, data_edge)
+
+                yield key, fingerprint, discretize
+
+    def fingerprint(self, key: Tuple, param_dict: Dict, parameters: List[str]) -> str:
+        """ Fingerprint of the parameters of a term, see parameter_fingerprint
+
+        Parameter objects that are identical to those of the previous call for the
+        same key are not hashed again.
+
+        Parameters
+        ----------
+        key : Tuple
+            Key of the term, (grid, variable, term) or (edge, term)
+        param_dict : Dict
+            Parameter dictionary of the term
+        parameters : List[str]
+            Names of the parameters the term depends on
+
+        Returns
+        -------
+        fingerprint : str
+            Hex digest
+        """
+        h = hashlib.sha1()
+        for name in parameters:
+            value = param_dict.get(name)
+            h.update(name.encode())
+            if not hasattr(value, "__dict__") or sps.issparse(value):
+                _update_hash(h, value, depth=0)
+                continue
+            cached = self._object_fingerprints.get((key, name))
+            if cached is None or cached[0] is not value:
+                cached = (value, parameter_fingerprint({name: value}, [name]))
+                self._object_fingerprints[(key, name)] = cached
+            h.update(cached[1].encode())
+        return h.hexdigest()
+
+
+def parameter_fingerprint(param_dict: Dict, parameters: List[str]) -> str:
+    """ Hash of the given entries of a parameter dictionary
+
+    Arrays are hashed by value. Objects, like pp.SecondOrderTensor and
+    pp.BoundaryCondition, are hashed by their attributes.
+
+    Parameters
+    ----------
+    param_dict : Dict
+        Parameter dictionary, e.g. d[pp.PARAMETERS][keyword]
+    parameters : List[str]
+        Names of the parameters to include
+
+    Returns
+    -------
+    fingerprint : str
+        Hex digest. Missing parameters are hashed as None.
+    """
+    h = hashlib.sha1()
+    for name in parameters:
+        h.update(name.encode())
+        _update_hash(h, param_dict.get(name), depth=0)
+    return h.hexdigest()
+
+
+def _update_hash(h, value: Any, depth: int) -> None:
+    """ Recursively feed value to the hash object h"""
+    # Guard against cycles and references to large objects (e.g. grids)
+    max_depth = 3
+    if isinstance(value, np.ndarray):
+        h.update(str((value.dtype, value.shape)).encode())
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif sps.issparse(value):
+        value = sps.csr_matrix(value)
+        for arr in (value.data, value.indices, value.indptr):
+            _update_hash(h, arr, depth + 1)
+    elif isinstance(value, (str, bytes, int, float, bool, np.number)) or value is None:
+        h.update(repr(value).encode())
+    elif isinstance(value, (list, tuple)):
+        for v in value:
+            _update_hash(h, v, depth + 1)
+    elif isinstance(value, dict):
+        for k in sorted(value, key=str):
+            h.update(str(k).encode())
+            _update_hash(h, value[k], depth + 1)
+    elif hasattr(value, "__dict__") and depth < max_depth:
+        h.update(type(value).__name__.encode())
+        _update_hash(h, vars(value), depth + 1)
+    else:
+        h.update(repr(type(value)).encode())
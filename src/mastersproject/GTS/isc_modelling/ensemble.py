@@ -0,0 +1,231 @@
+""" Monte Carlo ensembles of the ISC model over the shear-zone geometry.
+
+Each ensemble member perturbs the borehole intersection depths of the shear-zones
+(see GTS.ISC_data.geometry_sampling), meshes the perturbed fracture network and
+runs the model. The pressure and slip at the intersections of the monitoring
+boreholes with the shear-zones are appended to a csv file as members complete.
+The members are evaluated in parallel by run_sweep, so an interrupted ensemble
+is resumed by running it again.
+
+The ensemble statistics are accumulated in chunks of the csv file by
+RunningStatistics, such that the results of large ensembles are never held in
+memory at once.
+"""
+import functools
+import logging
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import porepy as pp
+from GTS.ISC_data.geometry_sampling import member_seed
+from GTS.ISC_data.isc import get_isc_data
+from GTS.isc_modelling.isc_model import ISCBiotContactMechanics
+from GTS.isc_modelling.newton import run_time_dependent_model
+from GTS.isc_modelling.parameter import BiotParameters
+from GTS.isc_modelling.sweep import run_sweep
+
+logger = logging.getLogger(__name__)
+
+
+class RunningStatistics:
+    """ Count, mean, variance, min and max of columns, accumulated in chunks
+
+    The chunks are merged by the pairwise update of Chan et al., which is
+    numerically stable also for large counts. NaN values are ignored.
+    """
+
+    def __init__(self, columns: Sequence[str]):
+        self.columns = list(columns)
+        m = len(self.columns)
+        self.count = np.zeros(m)
+        self.mean = np.zeros(m)
+        self.m2 = np.zeros(m)
+        self.min = np.full(m, np.inf)
+        self.max = np.full(m, -np.inf)
+
+    def update(self, values: np.ndarray) -> None:
+        """ Add a chunk of rows, shape (n, len(columns))"""
+        values = np.asarray(values, dtype=float).reshape(-1, len(self.columns))
+        valid = ~np.isnan(values)
+        count = valid.sum(axis=0)
+        if not count.any():
+            return
+        filled = np.where(valid, values, 0)
+        mean = filled.sum(axis=0) / np.maximum(count, 1)
+        m2 = (np.where(valid, values - mean, 0) ** 2).sum(axis=0)
+
+        total = self.count + count
+        delta = mean - self.mean
+        weight = count / np.maximum(total, 1)
+        self.mean = self.mean + delta * weight
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * weight
+        self.count = total
+        self.min = np.fmin(self.min, np.where(valid, values, np.inf).min(axis=0))
+        self.max = np.fmax(self.max, np.where(valid, values, -np.inf).max(axis=0))
+
+    @property
+    def variance(self) -> np.ndarray:
+        """ Sample variance (ddof=1). NaN for columns with fewer than two values"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.count > 1, self.m2 / (self.count - 1), np.nan)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """ Statistics of each column, one row per column"""
+        empty = self.count == 0
+        return pd.DataFrame(
+            {
+                "count": self.count.astype(int),
+                "mean": np.where(empty, np.nan, self.mean),
+                "std": np.sqrt(self.variance),
+                "min": np.where(empty, np.nan, self.min),
+                "max": np.where(empty, np.nan, self.max),
+            },
+            index=pd.Index(self.columns, name="quantity"),
+        )
+
+
+def monitoring_points(
+    shearzone_names: List[str], boreholes: Sequence[str] = ("PRP1", "PRP2", "PRP3"),
+) -> pd.DataFrame:
+    """ Intersections of the monitoring boreholes with the shear-zones
+
+    Returns
+    -------
+    points : pd.DataFrame
+        Columns 'borehole', 'shearzone' and the unscaled gts coordinates
+        'x_sz', 'y_sz', 'z_sz' of each intersection.
+    """
+    df = get_isc_data().borehole_plane_intersection()
+    mask = df.borehole.isin(boreholes) & df.shearzone.isin(shearzone_names)
+    columns = ["borehole", "shearzone", "x_sz", "y_sz", "z_sz"]
+    return df.loc[mask, columns].reset_index(drop=True)
+
+
+def monitoring_columns(points: pd.DataFrame) -> List[str]:
+    """ Names of the monitored quantities at each monitoring point"""
+    names = [f"{bh}_{sz}" for bh, sz in zip(points.borehole, points.shearzone)]
+    return [f"p_{n}" for n in names] + [f"slip_{n}" for n in names]
+
+
+def monitoring_values(
+    setup: ISCBiotContactMechanics, points: pd.DataFrame
+) -> Dict[str, float]:
+    """ Pressure and slip in the shear-zone cells closest to the monitoring points
+
+    The values are taken from the current state of the setup, i.e. at the end of
+    a simulation.
+    """
+    setup.compute_derived_fields([setup.p_exp, setup.tangential_frac_u])
+    gb = setup.gb
+    ls = setup.params.length_scale
+    pressure, slip = {}, {}
+    for row in points.itertuples():
+        name = f"{row.borehole}_{row.shearzone}"
+        g = gb.get_grids(lambda _g: gb.node_props(_g, "name") == row.shearzone)[0]
+        state = gb.node_props(g, pp.STATE)
+        pts = np.array([[row.x_sz], [row.y_sz], [row.z_sz]]) / ls
+        cell = g.closest_cell(pts)[0]
+        pressure[f"p_{name}"] = float(state[setup.p_exp][cell])
+        slip[f"slip_{name}"] = float(state[setup.tangential_frac_u][cell])
+    return {**pressure, **slip}
+
+
+def run_ensemble(
+    params: BiotParameters,
+    n_members: int,
+    depth_uncertainty: float,
+    output_file: Optional[Path] = None,
+    seed: int = 0,
+    boreholes: Sequence[str] = ("PRP1", "PRP2", "PRP3"),
+    max_workers: Optional[int] = None,
+    chunk_size: int = 1000,
+) -> pd.DataFrame:
+    """ Run a Monte Carlo ensemble over the shear-zone geometry
+
+    The members share the mesh cache of params (if set), such that a rerun of an
+    ensemble does not mesh again. Each member writes its results to a subfolder
+    'member_<i>' of params.folder_name.
+
+    Parameters
+    ----------
+    params : BiotParameters
+        Parameters of the model run by each member. Use a coarse mesh and short
+        time span to keep the ensemble affordable.
+    n_members : int
+        Number of ensemble members
+    depth_uncertainty : float
+        Standard deviation of the borehole intersection depths [m]
+    output_file : Path, Optional
+        csv file of the member results. Default: params.folder_name / ensemble.csv
+    seed : int
+        Seed of the ensemble. Member i has seed member_seed(seed, i).
+    boreholes : Sequence[str]
+        Monitoring boreholes
+    max_workers : int, Optional
+        Number of worker processes, see run_sweep.
+    chunk_size : int
+        Number of rows of the output file read at a time to compute statistics.
+
+    Returns
+    -------
+    statistics : pd.DataFrame
+        Statistics of the pressure and slip at each monitoring point,
+        over all successful members in the output file.
+    """
+    if output_file is None:
+        output_file = params.folder_name / "ensemble.csv"
+    points = monitoring_points(params.shearzone_names, boreholes)
+    columns = monitoring_columns(points)
+    members = [{"member": i, "seed": member_seed(seed, i)} for i in range(n_members)]
+    evaluate = functools.partial(
+        _run_member,
+        params=params,
+        depth_uncertainty=depth_uncertainty,
+        points=points,
+    )
+    run_sweep(
+        evaluate,
+        members,
+        output_file=output_file,
+        columns=columns,
+        max_workers=max_workers,
+        load_results=False,
+    )
+    return ensemble_statistics(output_file, columns, chunk_size)
+
+
+def ensemble_statistics(
+    output_file: Path, columns: List[str], chunk_size: int = 1000
+) -> pd.DataFrame:
+    """ Statistics of the successful members in an ensemble output file"""
+    stats = RunningStatistics(columns)
+    for chunk in pd.read_csv(output_file, chunksize=chunk_size):
+        ok = chunk["error"].isna()
+        stats.update(chunk.loc[ok, columns].to_numpy(dtype=float))
+    return stats.to_dataframe()
+
+
+def _run_member(
+    member: Dict[str, int],
+    params: BiotParameters,
+    depth_uncertainty: float,
+    points: pd.DataFrame,
+) -> Dict[str, float]:
+    """ Run the model on one geometry sample"""
+    folder_name = params.folder_name / f"member_{member['member']:05d}"
+    folder_name.mkdir(parents=True, exist_ok=True)
+    update = {
+        "folder_name": folder_name,
+        "depth_uncertainty": depth_uncertainty,
+        "geometry_seed": member["seed"],
+    }
+    if params.checkpoint_folder is not None:
+        update["checkpoint_folder"] = folder_name / "checkpoint"
+    member_params = params.copy(update=update)
+
+    setup = ISCBiotContactMechanics(member_params)
+    run_time_dependent_model(setup, member_params.newton_options)
+    return monitoring_values(setup, points)
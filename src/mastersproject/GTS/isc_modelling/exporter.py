@@ -0,0 +1,491 @@
+""" Time-series export to HDF5, with an XDMF description for ParaView.
+
+pp.Exporter writes one vtu file per grid and time step, which repeats the geometry
+in every step. The HDF5Exporter writes the geometry of each grid once, and appends
+the fields of each step to chunked, compressed datasets:
+
+    /time                       (num_steps,)
+    /grid_<n>/geometry          (num_points, 3)
+    /grid_<n>/topology          (num_cells, nodes per cell)
+    /grid_<n>/fields/<name>     (num_steps, num_cells, ...)
+
+where n is the node number of the grid in the grid bucket. Vector fields are
+stored with cells along the first axis (the transpose of pp.STATE). Fields
+that are not defined on cells (e.g. face stresses) are stored, but not included
+in the XDMF file.
+
+Simplex grids are written with their cells. Other grids are written as point
+clouds of the cell centers.
+
+The XDMF file is written by write_pvd, typically at the end of a simulation.
+The h5 file is complete after each step, but ParaView only sees the steps written
+before the last call to write_pvd.
+
+The exporter has the write_vtk / write_pvd interface of pp.Exporter, so the
+models can use either. Use create_exporter to select the exporter by name.
+
+Either exporter can be wrapped in an AsyncExporter, which writes the files in a
+background thread, so that the next time step can start while the previous one
+is written.
+"""
+import logging
+import queue
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
+from xml.etree import ElementTree
+
+import numpy as np
+import scipy.sparse as sps
+
+import porepy as pp
+
+logger = logging.getLogger(__name__)
+
+_SIMPLEX_TOPOLOGY = {1: "Polyline", 2: "Triangle", 3: "Tetrahedron"}
+
+
+def create_exporter(
+    gb: pp.GridBucket,
+    file_name: Union[str, Path],
+    folder_name: Union[str, Path],
+    exporter: str = "vtk",
+    asynchronous: bool = False,
+    queue_size: int = 2,
+):
+    """ Create an exporter by name
+
+    Parameters
+    ----------
+    gb : pp.GridBucket
+        Grid bucket to export
+    file_name, folder_name : str, Path
+        Base name of the output files, and the folder to store them in
+    exporter : str : {"vtk", "hdf5"}
+        "vtk": pp.Exporter, one vtu file per grid and step, and a pvd file.
+        "hdf5": HDF5Exporter, one h5 file with all steps, and an xdmf file.
+    asynchronous : bool
+        Write the files in a background thread (see AsyncExporter)
+    queue_size : int
+        Maximum number of queued steps of an asynchronous exporter
+    """
+    if asynchronous:
+        return AsyncExporter(
+            gb,
+            lambda shadow: create_exporter(shadow, file_name, folder_name, exporter),
+            queue_size=queue_size,
+        )
+    if exporter == "vtk":
+        return pp.Exporter(gb, file_name=str(file_name), folder_name=str(folder_name))
+    elif exporter == "hdf5":
+        return HDF5Exporter(gb, file_name=file_name, folder_name=folder_name)
+    else:
+        raise ValueError(f"Unknown exporter '{exporter}'. Use 'vtk' or 'hdf5'.")
+
+
+class HDF5Exporter:
+    """ Write time series of fields on a grid bucket to HDF5 and XDMF"""
+
+    def __init__(
+        self,
+        gb: pp.GridBucket,
+        file_name: Union[str, Path],
+        folder_name: Union[str, Path],
+        compression_level: int = 4,
+    ):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError(
+                "The hdf5 exporter requires h5py. Install it with 'pip install h5py'."
+            )
+        self._h5py = h5py
+
+        self.gb = gb
+        self.folder_name = Path(folder_name)
+        self.folder_name.mkdir(parents=True, exist_ok=True)
+        self.file_name = Path(file_name).stem
+        self.h5_file = self.folder_name / f"{self.file_name}.h5"
+        self.xdmf_file = self.folder_name / f"{self.file_name}.xdmf"
+        self.compression_level = compression_level
+
+        self.times: List[float] = []
+        # Topology type and number of cells of each grid, by group name
+        self._topology: Dict[str, Dict] = {}
+        # Shapes of the field datasets of each grid, by group name and field
+        self._fields: Dict[str, Dict[str, tuple]] = {}
+        self._geometry_written = False
+
+    def write_vtk(
+        self,
+        data: Optional[Union[str, List[str]]] = None,
+        time_dependent: bool = False,
+        time_step: Optional[float] = None,
+        grid: Optional[pp.Grid] = None,
+    ) -> None:
+        """ Append the fields in data as a new step
+
+        Parameters
+        ----------
+        data : str, List[str]
+            Keys in pp.STATE of the fields to export. Grids without a field are
+            skipped for that field.
+        time_dependent : bool
+            Unused. Every call appends a step.
+        time_step : float, Optional
+            Time of the step. Default: the number of the step.
+        grid : pp.Grid, Optional
+            Only export the fields of this grid of the grid bucket. The other grids
+            have no values at this step.
+        """
+        if grid is not None and all(g is not grid for g, _ in self.gb):
+            raise ValueError("The hdf5 exporter can only export grids of its gb")
+        if data is None:
+            data = []
+        elif isinstance(data, str):
+            data = [data]
+        step = len(self.times)
+        time = float(step if time_step is None else time_step)
+
+        mode = "a" if self._geometry_written else "w"
+        with self._h5py.File(self.h5_file, mode) as f:
+            if not self._geometry_written:
+                self._write_geometry(f)
+                f.create_dataset("time", shape=(0,), maxshape=(None,), dtype="f8")
+                self._geometry_written = True
+
+            f["time"].resize((step + 1,))
+            f["time"][step] = time
+            for g, d in self.gb:
+                if grid is not None and g is not grid:
+                    continue
+                group_name = _group_name(d)
+                group = f[group_name]
+                state = d.get(pp.STATE, {})
+                for name in data:
+                    if name in state:
+                        shape = self._append_field(group, name, state[name], step)
+                        self._fields[group_name][name] = shape
+
+        self.times.append(time)
+
+    def write_pvd(self, timestep: Optional[np.ndarray] = None, **kwargs) -> None:
+        """ Write the xdmf file of all steps so far
+
+        The times of the steps are stored in the h5 file. The arguments are
+        accepted for compatibility with pp.Exporter.write_pvd.
+        """
+        self._write_xdmf()
+
+    # --- Helper methods ---
+
+    def _write_geometry(self, f) -> None:
+        """ Write points and cells of all grids"""
+        self.gb.assign_node_ordering(overwrite_existing=False)
+        for g, d in self.gb:
+            group = f.create_group(_group_name(d))
+            cell_nodes = sps.csc_matrix(g.cell_nodes())
+            cell_nodes.sort_indices()
+            is_simplex = g.dim > 0 and np.all(np.diff(cell_nodes.indptr) == g.dim + 1)
+
+            if is_simplex:
+                points = g.nodes.T
+                cells = cell_nodes.indices.reshape((g.num_cells, g.dim + 1))
+                topology = _SIMPLEX_TOPOLOGY[g.dim]
+            else:
+                points = g.cell_centers.T
+                cells = np.arange(g.num_cells).reshape((-1, 1))
+                topology = "Polyvertex"
+
+            group.create_dataset("geometry", data=points)
+            group.create_dataset("topology", data=cells.astype(np.int64))
+            group.create_group("fields")
+            self._topology[group.name.strip("/")] = {
+                "type": topology,
+                "num_cells": g.num_cells,
+                "num_points": points.shape[0],
+                "nodes_per_cell": cells.shape[1],
+                "center": "Cell" if is_simplex else "Node",
+            }
+            self._fields[group.name.strip("/")] = {}
+
+    def _append_field(self, group, name: str, values: np.ndarray, step: int) -> tuple:
+        """ Write values of a field at a step. Creates the dataset if needed.
+
+        Returns the new shape of the dataset.
+        """
+        values = np.asarray(values, dtype=float)
+        if values.ndim == 2:  # (components, cells) -> (cells, components)
+            values = values.T
+        fields = group["fields"]
+        if name not in fields:
+            fields.create_dataset(
+                name,
+                shape=(0,) + values.shape,
+                maxshape=(None,) + values.shape,
+                chunks=(1,) + values.shape,
+                dtype="f8",
+                compression="gzip",
+                compression_opts=self.compression_level,
+                shuffle=True,
+                fillvalue=np.nan,
+            )
+        dataset = fields[name]
+        dataset.resize((step + 1,) + dataset.shape[1:])
+        dataset[step] = values
+        return dataset.shape
+
+    def _write_xdmf(self) -> None:
+        """ Describe all steps of the h5 file as a temporal collection"""
+        fields = self._fields
+        h5_name = self.h5_file.name
+        root = ElementTree.Element("Xdmf", Version="3.0")
+        domain = ElementTree.SubElement(root, "Domain")
+        series = ElementTree.SubElement(
+            domain,
+            "Grid",
+            Name="TimeSeries",
+            GridType="Collection",
+            CollectionType="Temporal",
+        )
+        for step, time in enumerate(self.times):
+            collection = ElementTree.SubElement(
+                series,
+                "Grid",
+                Name=f"step_{step}",
+                GridType="Collection",
+                CollectionType="Spatial",
+            )
+            ElementTree.SubElement(collection, "Time", Value=repr(time))
+            for name, topo in self._topology.items():
+                grid = ElementTree.SubElement(
+                    collection, "Grid", Name=name, GridType="Uniform"
+                )
+                topology = ElementTree.SubElement(
+                    grid,
+                    "Topology",
+                    TopologyType=topo["type"],
+                    NumberOfElements=str(topo["num_cells"]),
+                    NodesPerElement=str(topo["nodes_per_cell"]),
+                )
+                _data_item(
+                    topology,
+                    f"{h5_name}:/{name}/topology",
+                    (topo["num_cells"], topo["nodes_per_cell"]),
+                    "Int",
+                )
+                geometry = ElementTree.SubElement(grid, "Geometry", GeometryType="XYZ")
+                _data_item(
+                    geometry,
+                    f"{h5_name}:/{name}/geometry",
+                    (topo["num_points"], 3),
+                    "Float",
+                )
+                for field, shape in fields[name].items():
+                    # Only cell fields that exist at this step
+                    if len(shape) < 2 or shape[1] != topo["num_cells"]:
+                        continue
+                    if step >= shape[0]:
+                        continue
+                    path = f"{h5_name}:/{name}/fields/{field}"
+                    self._xdmf_attribute(grid, field, path, shape, step, topo["center"])
+
+        tree = ElementTree.ElementTree(root)
+        tmp_file = self.xdmf_file.with_suffix(".xdmf.tmp")
+        tree.write(tmp_file, xml_declaration=True, encoding="utf-8")
+        tmp_file.replace(self.xdmf_file)
+
+    @staticmethod
+    def _xdmf_attribute(grid, field: str, path: str, shape, step: int, center: str):
+        """ Attribute of a field at a step, as a hyperslab of the time series"""
+        if len(shape) == 2:
+            attribute_type = "Scalar"
+        elif len(shape) == 3 and shape[2] == 3:
+            attribute_type = "Vector"
+        else:
+            attribute_type = "Matrix"
+        attribute = ElementTree.SubElement(
+            grid, "Attribute", Name=field, AttributeType=attribute_type, Center=center,
+        )
+        rank = len(shape)
+        hyperslab = ElementTree.SubElement(
+            attribute,
+            "DataItem",
+            ItemType="HyperSlab",
+            Dimensions=" ".join(str(s) for s in shape[1:]),
+        )
+        start = [step] + [0] * (rank - 1)
+        stride = [1] * rank
+        count = [1] + list(shape[1:])
+        selection = ElementTree.SubElement(
+            hyperslab, "DataItem", Dimensions=f"3 {rank}", Format="XML"
+        )
+        selection.text = " ".join(str(v) for v in start + stride + count)
+        _data_item(hyperslab, path, shape, "Float")
+
+
+class AsyncExporter:
+    """ Write exports in a background thread
+
+    write_vtk copies the exported fields of pp.STATE to read-only arrays, and puts
+    them in a queue. A writer thread sets the copies as the state of a shadow grid
+    bucket, which shares the grids (but no data) with the model, and calls the
+    wrapped exporter on it. The model can thus change its state while the files
+    are written. The queue is bounded, so write_vtk blocks if the writer falls
+    behind.
+
+    Errors in the writer thread are raised by the next call to the exporter.
+    Call flush before reading the files, and close at the end of the simulation.
+    close stops the writer thread. A later write starts a new one.
+    """
+
+    def __init__(
+        self,
+        gb: pp.GridBucket,
+        make_exporter: Callable[[pp.GridBucket], Any],
+        queue_size: int = 2,
+    ):
+        """
+        Parameters
+        ----------
+        gb : pp.GridBucket
+            Grid bucket of the model
+        make_exporter : Callable[[pp.GridBucket], Any]
+            Creates the exporter that writes the files, given the shadow grid bucket
+        queue_size : int
+            Maximum number of queued steps
+        """
+        self.gb = gb
+        self._shadow = _shadow_grid_bucket(gb)
+        self.exporter = make_exporter(self._shadow)
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._error: Optional[BaseException] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start()
+
+    def write_vtk(
+        self,
+        data: Optional[Union[str, List[str]]] = None,
+        time_dependent: bool = False,
+        time_step: Optional[float] = None,
+        grid: Optional[pp.Grid] = None,
+    ) -> None:
+        """ Queue a snapshot of the fields in data for writing
+
+        If grid is given, only the fields of grid are copied, and grid is passed on
+        to the wrapped exporter. This is supported for the HDF5Exporter only, since
+        pp.Exporter replaces the exported grid bucket by grid.
+        """
+        if grid is not None and not isinstance(self.exporter, HDF5Exporter):
+            raise ValueError(
+                "The asynchronous exporter only exports single grids with hdf5"
+            )
+        self._raise_error()
+        self._start()
+        names = [data] if isinstance(data, str) else list(data or [])
+        snapshot = {}
+        for g, d in self.gb:
+            if grid is not None and g is not grid:
+                continue
+            state = d.get(pp.STATE, {})
+            snapshot[g] = {n: _frozen_copy(state[n]) for n in names if n in state}
+        kwargs = {"time_dependent": time_dependent, "time_step": time_step}
+        if grid is not None:
+            kwargs["grid"] = grid
+        self._queue.put((self._write_snapshot, (snapshot, names), kwargs))
+
+    def write_pvd(self, *args, **kwargs) -> None:
+        """ Queue writing of the pvd (or xdmf) file, after all queued steps"""
+        self._raise_error()
+        self._start()
+        self._queue.put((self.exporter.write_pvd, args, kwargs))
+
+    def flush(self) -> None:
+        """ Wait until all queued writes are done"""
+        self._queue.join()
+        self._raise_error()
+
+    def close(self) -> None:
+        """ Flush, and stop the writer thread"""
+        if self._thread is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    # --- Helper methods ---
+
+    def _start(self) -> None:
+        """ Start the writer thread, unless it is running"""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name="export-writer", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self) -> None:
+        """ Writer thread: Execute queued jobs until None is received"""
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                # Skip the remaining jobs after a failure
+                if self._error is None:
+                    func, args, kwargs = job
+                    func(*args, **kwargs)
+            except BaseException as e:
+                logger.error(f"Export failed in the writer thread: {e}")
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write_snapshot(self, snapshot: Dict, names: List[str], **kwargs) -> None:
+        for g, d in self._shadow:
+            d[pp.STATE] = snapshot.get(g, {})
+        self.exporter.write_vtk(data=names, **kwargs)
+
+    def _raise_error(self) -> None:
+        if self._error is not None:
+            raise RuntimeError("Export failed in the writer thread") from self._error
+
+
+def _shadow_grid_bucket(gb: pp.GridBucket) -> pp.GridBucket:
+    """ Grid bucket with the grids and mortar grids of gb, but separate data"""
+    gb.assign_node_ordering(overwrite_existing=False)
+    shadow = pp.GridBucket()
+    shadow.add_nodes([g for g, _ in gb])
+    for g, d in gb:
+        shadow.set_node_prop(g, "node_number", d["node_number"])
+    for e, d in gb.edges():
+        shadow.add_edge([e[0], e[1]], d["face_cells"])
+        shadow.set_edge_prop(e, "mortar_grid", d["mortar_grid"])
+    return shadow
+
+
+def _frozen_copy(values: np.ndarray) -> np.ndarray:
+    """ Read-only copy of an array"""
+    values = np.array(values, copy=True)
+    values.setflags(write=False)
+    return values
+
+
+def _group_name(d: Dict) -> str:
+    return f"grid_{d['node_number']}"
+
+
+def _data_item(parent, path: str, shape, number_type: str) -> None:
+    """ Reference to a dataset in the h5 file"""
+    item = ElementTree.SubElement(
+        parent,
+        "DataItem",
+        Dimensions=" ".join(str(s) for s in shape),
+        NumberType=number_type,
+        Precision="8",
+        Format="HDF",
+    )
+    item.text = path
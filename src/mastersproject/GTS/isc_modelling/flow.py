@@ -1,12 +1,13 @@
 import logging
 import time
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 
 import porepy as pp
 from GTS.isc_modelling.ISCGrid import create_grid
 from GTS.isc_modelling.general_model import CommonAbstractModel
+from GTS.isc_modelling.injection import WellInjection
 from GTS.isc_modelling.parameter import BaseParameters, FlowParameters
 from porepy.params.data import add_nonpresent_dictionary
 from porepy.utils.derived_discretizations import implicit_euler
@@ -347,6 +348,24 @@ class Flow(CommonAbstractModel):
         """ Wrapper to create grid"""
         self.create_grid()
 
+    def _linear_solver_blocks(self) -> List[Tuple[str, List[str], str]]:
+        """ The pressure variables form one block, preconditioned by fixed-stress
+
+        In a coupled problem, the block is placed after the mechanics blocks.
+        """
+        blocks = super()._linear_solver_blocks()
+        blocks.append(
+            ("flow", [self.scalar_variable, self.mortar_scalar_variable], "fixed_stress")
+        )
+        return blocks
+
+    def _convergence_blocks(self) -> List[Tuple[str, np.ndarray, float]]:
+        """ The pressures on all grids, in [Pa]"""
+        blocks = super()._convergence_blocks()
+        pressure_dof = self._variable_dofs([self.scalar_variable])
+        blocks.append(("pressure", pressure_dof, self.params.scalar_scale))
+        return blocks
+
     def check_convergence(
         self,
         solution: np.ndarray,
@@ -362,49 +381,15 @@ class Flow(CommonAbstractModel):
 
         # -- Calculate the scalar error for non-linear simulations --
         # This code will only be executed if called in a coupled problem.
-
-        var_s = self.scalar_variable
-        ss = self.params.scalar_scale
-
-        # Extract convergence tolerance
         tol_convergence = nl_params.get("nl_convergence_tol")
-
-        converged = False
-        diverged = False
-
-        # Find indices for pressure variables
-        scalar_dof = np.array([], dtype=np.int)
-        for g, _ in self.gb:
-            scalar_dof = np.hstack((scalar_dof, self.assembler.dof_ind(g, var_s)))
-
-        # Unscaled pressure solutions
-        scalar_now = solution[scalar_dof] * ss
-        scalar_prev = prev_solution[scalar_dof] * ss
-        scalar_init = init_solution[scalar_dof] * ss
-
-        # Calculate norms
-        # scalar_norm = np.sum(scalar_now ** 2)
-        difference_in_iterates_scalar = np.sum((scalar_now - scalar_prev) ** 2)
-        difference_from_init_scalar = np.sum((scalar_now - scalar_init) ** 2)
-
-        # -- Scalar solution --
-        # The if is intended to avoid division through zero
-        if (
-            difference_in_iterates_scalar < tol_convergence
-        ):  # and scalar_norm < tol_convergence
-            converged = True
-            error_scalar = difference_in_iterates_scalar
-            logger.info(f"Pressure converged absolutely")
-        else:
-            # Relative convergence criterion:
-            if (
-                difference_in_iterates_scalar
-                < tol_convergence * difference_from_init_scalar
-            ):
-                converged = True
-                logger.info(f"Pressure converged relatively")
-
-            error_scalar = difference_in_iterates_scalar / difference_from_init_scalar
+        error_scalar, converged, diverged = self.convergence_monitor.check(
+            "pressure",
+            solution,
+            prev_solution,
+            init_solution,
+            tol_convergence,
+            self.time,
+        )
 
         logger.info(f"Error in pressure is {error_scalar:.6e}.")
         if not converged:
@@ -412,35 +397,6 @@ class Flow(CommonAbstractModel):
 
         return error_scalar, converged, diverged
 
-    @timer(logger, level="INFO")
-    def initialize_linear_solver(self):
-        """ Initialize linear solver
-
-        Currently, we only consider the direct solver.
-        See also self.assemble_and_solve_linear_system()
-        """
-
-        # # Compute exact condition number:
-        # A, _ = self.assembler.assemble_matrix_rhs()
-        # cond = spla.norm(A, 1) * spla.norm(spla.inv(A), 1)
-        # logger.info(f"Exact condition number: {cond:.2e}")
-
-        if self.params.linear_solver == "direct":
-            """ In theory, it should be possible to instruct SuperLU to reuse the
-            symbolic factorization from one iteration to the next. However, it seems
-            the scipy wrapper around SuperLU has not implemented the necessary
-            functionality, as discussed in
-
-                https://github.com/scipy/scipy/issues/8227
-
-            We will therefore pass here, and pay the price of long computation times.
-
-            """
-            pass
-
-        else:
-            raise ValueError(f"Unknown linear solver {self.params.linear_solver}")
-
     # --- Newton iterations ---
 
     def before_newton_loop(self):
@@ -455,6 +411,7 @@ class Flow(CommonAbstractModel):
         """ Called after a time-dependent problem
         """
         self.export_pvd()
+        self.close_export()
         logger.info(f"Solution exported to folder \n {self.params.folder_name}")
 
     # --- Exporting and visualization ---
@@ -470,13 +427,13 @@ class Flow(CommonAbstractModel):
 
         self.export_fields.extend([self.p_exp, self.aperture_exp])
 
-    def export_step(self, write_vtk=True):
-        """ Export a step with pressures """
-        super().export_step(write_vtk=False)
+        self.register_derived_field(self.p_exp, self.save_pressure)
+        self.register_derived_field(self.aperture_exp, self.save_aperture)
+
+    def save_pressure(self) -> None:
+        """ Save upscaled pressure"""
         for g, d in self.gb:
             state = d[pp.STATE]
-            state[self.aperture_exp] = self.aperture(g, scaled=False)
-            # Export pressure variable
             if self.scalar_variable in state:
                 state[self.p_exp] = (
                     state[self.scalar_variable].copy() * self.params.scalar_scale
@@ -484,7 +441,17 @@ class Flow(CommonAbstractModel):
             else:
                 state[self.p_exp] = np.zeros((self.Nd, g.num_cells))
 
+    def save_aperture(self) -> None:
+        """ Save unscaled aperture"""
+        for g, d in self.gb:
+            d[pp.STATE][self.aperture_exp] = self.aperture(g, scaled=False)
+
+    def export_step(self, write_vtk=True):
+        """ Export a step with pressures """
+        super().export_step(write_vtk=False)
+
         if write_vtk:
+            self.compute_derived_fields()
             self.viz.write_vtk(
                 data=self.export_fields, time_step=self.time
             )  # Write visualization
@@ -495,7 +462,7 @@ class Flow(CommonAbstractModel):
         self.viz.write_pvd(self.export_times)
 
 
-class FlowISC(Flow):
+class FlowISC(WellInjection, Flow):
     """ Flow model for fractured porous media. Specific to GTS-ISC project."""
 
     def __init__(self, params: FlowParameters):
@@ -574,6 +541,9 @@ class FlowISC(Flow):
                     "bounding_box",
                     "shearzone_names",
                     "folder_name",
+                    "mesh_cache_dir",
+                    "depth_uncertainty",
+                    "geometry_seed",
                 }
             )
         )
@@ -704,22 +674,6 @@ class FlowISC(Flow):
     #     v[west] = 1 * (pp.PASCAL / self.params.scalar_scale)
     #     return v
 
-    @property
-    def source_flow_rate(self) -> float:
-        """ Scaled source flow rate """
-        injection_rate = (
-            self.params.injection_rate
-        )  # 10 / 60  # 10 l/min  # injection rate [l / s], unscaled
-        return (
-            injection_rate * pp.MILLI * (pp.METER / self.params.length_scale) ** self.Nd
-        )
-
-    def source_scalar(self, g: pp.Grid) -> np.ndarray:
-        """ Well-bore source (scaled)"""
-        flow_rate = self.source_flow_rate  # scaled
-        values = flow_rate * g.tags["well_cells"] * self.time_step
-        return values
-
     # --- Simulation and solvers ---
 
     def _prepare_grid(self):
@@ -772,7 +726,7 @@ class FlowISC(Flow):
         self.negneg_ind = negneg_ind  # noqa
 
         # Condition number
-        A, _ = self.assembler.assemble_matrix_rhs()  # noqa
+        A, _ = self.assemble_matrix_rhs()  # noqa
         row_sum = np.sum(np.abs(A), axis=1)
         pp_cond = np.max(row_sum) / np.min(row_sum)
         diag = np.abs(A.diagonal())
@@ -1,11 +1,32 @@
 import abc
 import logging
 import time
-from typing import Optional, Dict, List
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 import numpy as np
+import pandas as pd
+import scipy.sparse as sps
 
 import porepy as pp
+from GTS.isc_modelling.assembly import PersistentMatrix
+from GTS.isc_modelling.checkpoint import Checkpoint
+from GTS.isc_modelling.convergence import ConvergenceMonitor
+from GTS.isc_modelling.diagnostics import (
+    block_statistics,
+    condition_number_1norm,
+    diagonal_ratio,
+    row_sum_ratio,
+)
+from GTS.isc_modelling.exporter import (
+    AsyncExporter,
+    HDF5Exporter,
+    create_exporter,
+)
+from GTS.isc_modelling.linear_solver import (
+    BlockPreconditionedSolver,
+    DirectSolverSession,
+)
 from GTS.isc_modelling.parameter import BaseParameters
 from mastersproject.util.logging_util import timer
 from porepy.models.abstract_model import AbstractModel
@@ -21,11 +42,33 @@ class CommonAbstractModel(AbstractModel):
         self.gb: Optional[pp.GridBucket] = None
         self.bounding_box: Optional[Dict[str, int]] = None
         self.assembler: Optional[pp.Assembler] = None
+        # Global matrix of the assembler, updated in place. See assemble_matrix_rhs.
+        self.global_matrix = PersistentMatrix()
+        self._global_matrix_assembler: Optional[pp.Assembler] = None
+
+        # Linear solver
+        self.linear_solver: Optional[
+            Union[DirectSolverSession, BlockPreconditionedSolver]
+        ] = None
+        # Estimated 1-norm condition number of the last solved system
+        self.condition_number: float = np.nan
+
+        # Norms of the Newton iterates by block. See convergence_monitor.
+        self._convergence_monitor = ConvergenceMonitor()
+        self._convergence_monitor_assembler: Optional[pp.Assembler] = None
 
         # Viz
-        self.viz: Optional[pp.Exporter] = None
+        self.viz: Optional[Union[pp.Exporter, HDF5Exporter, AsyncExporter]] = None
         self.export_fields: List = []
 
+        # Functions computing derived fields, by field name. A function may
+        # compute several fields. Only exported or requested fields are computed.
+        self._derived_fields: Dict[str, Callable[[], None]] = {}
+        self.requested_fields: Set[str] = set()
+
+        # Checkpoints of converged time steps. Set on first save.
+        self.checkpoint: Optional[Checkpoint] = None
+
     def get_state_vector(self):
         """ Get a vector of the current state of the variables; with the same ordering
             as in the assembler.
@@ -100,6 +143,38 @@ class CommonAbstractModel(AbstractModel):
         self.assembler.distribute_variable(solution)
         self.export_step()
 
+    def cut_time_step(self, init_solution: np.ndarray, factor: float) -> None:
+        """ Shorten the current time step after a failed Newton loop
+
+        The time step is retried from init_solution, the iterate at the start of
+        the failed Newton loop. See GTS.isc_modelling.newton.
+
+        Parameters:
+            init_solution : np.ndarray
+                Solution vector at the start of the failed Newton loop
+            factor : float
+                The time step is multiplied by factor
+        """
+        self.time -= self.time_step
+        self.time_step *= factor
+        self.time += self.time_step
+        self.update_state(init_solution)
+
+    def restore_time_step(self, time_step: float) -> None:
+        """ Continue with the time step from before the cut-backs of the last step
+
+        Called after a time step converged with a cut time step, see cut_time_step.
+        The checkpoint of the time step, if any, was saved on convergence, before
+        the time step was restored. Its time step is set to the restored one.
+
+        Parameters:
+            time_step : float
+                The time step before the cut-backs
+        """
+        self.time_step = time_step
+        if self.checkpoint is not None:
+            self.checkpoint.set_time_step(time_step)
+
     def after_newton_failure(self, solution, errors, iteration_counter) -> None:
         """ Raise ValueError for failed Newton iteration"""
         non_linear_error = "Newton iterations did not converge"
@@ -137,53 +212,218 @@ class CommonAbstractModel(AbstractModel):
                 "Convergence check for non-linear problems is not yet implemented"
             )
 
+    @timer(logger, level="INFO")
+    def initialize_linear_solver(self) -> None:
+        """ Initialize linear solver
+
+        We consider
+            "direct": pypardiso. The solver session keeps the PARDISO analysis and
+                factorization alive between calls, such that the symbolic
+                factorization is only recomputed if the sparsity pattern of the
+                assembled matrix changes.
+            "iterative": GMRES with a block lower-triangular preconditioner. The
+                blocks are given by self._linear_solver_blocks().
+        See also self.assemble_and_solve_linear_system()
+        """
+
+        if self.params.linear_solver == "direct":
+            self.linear_solver = DirectSolverSession()
+
+        elif self.params.linear_solver == "iterative":
+            blocks = [
+                (name, self._variable_dofs(variables), method)
+                for name, variables, method in self._linear_solver_blocks()
+            ]
+            self.linear_solver = BlockPreconditionedSolver(
+                blocks,
+                tol=self.params.krylov_tol,
+                maxiter=self.params.krylov_maxiter,
+                restart=self.params.krylov_restart,
+            )
+
+        else:
+            raise ValueError(f"Unknown linear solver {self.params.linear_solver}")
+
+    def _linear_solver_blocks(self) -> List[Tuple[str, List[str], str]]:
+        """ Ordered blocks of variables for the block preconditioner
+
+        Each block is given as (name, variables, method), where method is
+        one of {"amg", "lu", "fixed_stress"}. See BlockPreconditionedSolver.
+        Models extend this list with their own variables.
+        """
+        return []
+
+    @property
+    def convergence_monitor(self) -> ConvergenceMonitor:
+        """ Monitor of the convergence blocks. The dofs are cached per assembler"""
+        if self._convergence_monitor_assembler is not self.assembler:
+            self._convergence_monitor.set_blocks(
+                self._convergence_blocks(), self.assembler.num_dof()
+            )
+            self._convergence_monitor_assembler = self.assembler
+        return self._convergence_monitor
+
+    def _convergence_blocks(self) -> List[Tuple[str, np.ndarray, float]]:
+        """ Blocks of the convergence monitor
+
+        Each block is given as (name, dofs, scale), where scale converts the
+        variables of the block to physical units. Models extend this list with
+        their own variables.
+        """
+        return []
+
+    def _variable_dofs(self, variables: List[str]) -> np.ndarray:
+        """ Global dof indices of the given variables on all grids and edges"""
+        dofs = [
+            self.assembler.dof_ind(g, var)
+            for g, var in self.assembler.block_dof.keys()
+            if var in variables
+        ]
+        return np.hstack(dofs).astype(int) if dofs else np.array([], dtype=int)
+
+    def assemble_matrix_rhs(self) -> Tuple[sps.csr_matrix, np.ndarray]:
+        """ Assemble the linear system into the persistent global matrix
+
+        The returned matrix is the same object on each call, with the same sparsity
+        pattern, as long as the pattern does not need to grow. Its values are
+        overwritten in place by the next call; copy the matrix to keep it.
+        A new assembler (e.g. for a new grid bucket) starts a new pattern.
+        Constraints are imposed by apply_constraints.
+        """
+        if self.assembler is not self._global_matrix_assembler:
+            self.global_matrix.reset()
+            self._global_matrix_assembler = self.assembler
+        A, b = self.assembler.assemble_matrix_rhs(matrix_format="coo")
+        return self.apply_constraints(self.global_matrix.update(A), b)
+
+    def apply_constraints(
+        self, A: sps.csr_matrix, b: np.ndarray
+    ) -> Tuple[sps.csr_matrix, np.ndarray]:
+        """ Impose constraints on the assembled system, e.g. fixed well pressures
+
+        Called by assemble_matrix_rhs. A and b may be modified in place.
+        Models override this method, and call super().
+        """
+        return A, b
+
     @timer(logger, level="INFO")
     def assemble_and_solve_linear_system(self, tol: float) -> np.ndarray:
         """ Assemble a solve the linear system"""
-        from pypardiso import spsolve
+        A, b = self.assemble_matrix_rhs()  # noqa
+        return self.solve_linear_system(A, b)
 
-        A, b = self.assembler.assemble_matrix_rhs()  # noqa
-
-        # Estimate condition number
+    def solve_linear_system(self, A: sps.csr_matrix, b: np.ndarray) -> np.ndarray:
+        """ Solve an assembled linear system, see assemble_matrix_rhs"""
+        # Cheap scaling measures. See also self.params.estimate_condition_number
         logger.info(f"Max element in A {np.max(np.abs(A)):.2e}")
-        logger.info(
-            f"Max {np.max(np.sum(np.abs(A), axis=1)):.2e} and "
-            f"min {np.min(np.sum(np.abs(A), axis=1)):.2e} A sum."
+        logger.info(f"Row sum ratio of A: {row_sum_ratio(A):.2e}")
+        logger.info(f"Diagonal ratio of A: {diagonal_ratio(A):.2e}")
+
+        if self.linear_solver is None:
+            self.initialize_linear_solver()
+
+        tic = time.time()
+        logger.info(f"Solve Ax=b using {self.params.linear_solver} solver")
+        sol = self.linear_solver.solve(A, b)
+        logger.info(f"Done. Elapsed time {time.time() - tic}")
+        norm = np.linalg.norm(b - A * sol)
+        logger.info(f"||b-Ax|| = {norm}")
+
+        rhs_norm = np.linalg.norm(b)
+        identical_zero = np.isclose(rhs_norm, 0) and np.isclose(norm, 0)
+        rel_norm = norm / rhs_norm if not identical_zero else norm
+        logger.info(f"||b-Ax|| / ||b|| = {rel_norm}")
+
+        if self.params.estimate_condition_number:
+            self.estimate_condition_number(A)
+        return sol
+
+    def estimate_condition_number(self, A) -> float:
+        """ Estimate the 1-norm condition number of A
+
+        With the direct solver, the factorization of the last solve is reused if A
+        is the last solved matrix. Otherwise, A is factorized once.
+        """
+        session = (
+            self.linear_solver
+            if isinstance(self.linear_solver, DirectSolverSession)
+            else None
         )
+        self.condition_number = condition_number_1norm(A, session=session)
+        logger.info(f"Estimated condition number (1-norm): {self.condition_number:.2e}")
+        return self.condition_number
 
-        # UMFPACK Estimate of condition number
-        sum_diag_abs_A = np.abs(A.diagonal())
-        logger.info(
-            f"UMFPACK Condition number estimate: "
-            f"{np.min(sum_diag_abs_A) / np.max(sum_diag_abs_A) :.2e}"
+    def block_statistics(self, A) -> pd.DataFrame:
+        """ Scaling statistics of the blocks of A. See diagnostics.block_statistics.
+
+        The blocks are given by self._linear_solver_blocks().
+        """
+        blocks = {
+            name: self._variable_dofs(variables)
+            for name, variables, _ in self._linear_solver_blocks()
+        }
+        return block_statistics(A, blocks)
+
+    # --- Checkpointing and restart ---
+
+    def save_checkpoint(self) -> None:
+        """ Store the current state, if params.checkpoint_folder is set
+
+        The grid is stored on the first call. Export fields are not stored,
+        since they are recomputed from the state. The current time step is stored
+        as the time step to continue with.
+        """
+        folder = self.params.checkpoint_folder
+        if folder is None:
+            return
+        if self.checkpoint is None:
+            self.checkpoint = Checkpoint(folder)
+            self.checkpoint.save_grid(self.gb)
+        self.checkpoint.save_step(
+            self.gb, self.time, time_step=self.time_step, exclude=self.export_fields
         )
 
-        if self.params.linear_solver == "direct":
-            tic = time.time()
-            logger.info("Solve Ax=b using scipy")
-            # sol = spla.spsolve(A, b)
-            sol = spsolve(A, b)  # pypardiso
-            logger.info(f"Done. Elapsed time {time.time() - tic}")
-            norm = np.linalg.norm(b - A * sol)
-            logger.info(f"||b-Ax|| = {norm}")
-
-            rhs_norm = np.linalg.norm(b)
-            identical_zero = np.isclose(rhs_norm, 0) and np.isclose(norm, 0)
-            rel_norm = norm / rhs_norm if not identical_zero else norm
-            logger.info(f"||b-Ax|| / ||b|| = {rel_norm}")
-            return sol
+    def load_checkpoint_grid(self) -> pp.GridBucket:
+        """ Load the grid bucket of params.restart_folder"""
+        return Checkpoint(self.params.restart_folder).load_grid()
 
-        else:
-            raise ValueError(f"Unknown linear solver {self.params.linear_solver}")
+    def restore_checkpoint(self) -> None:
+        """ Restore state, time and time step from params.restart_folder
+
+        Call this after the initial conditions are set, and before the first time
+        step. State-dependent parameters are updated at the start of the time step.
+
+        If params.checkpoint_folder is the restart folder, the stored steps after
+        the restored step are deleted, and new steps are stored in their place.
+        """
+        checkpoint = Checkpoint(self.params.restart_folder)
+        entry = checkpoint.load_step(self.gb, self.params.restart_step)
+        self.time = entry["time"]
+        if entry["time_step"] is not None:
+            self.time_step = entry["time_step"]
+
+        folder = self.params.checkpoint_folder
+        if folder is not None and Path(folder).resolve() == checkpoint.folder.resolve():
+            checkpoint.truncate(entry["step"])
+            self.checkpoint = checkpoint
+        logger.info(
+            f"Restarted from step {entry['step']} of {self.params.restart_folder} "
+            f"at time {self.time:.4e}"
+        )
 
     # --- Exporting and visualization ---
 
     @abc.abstractmethod
     def set_viz(self):
-        self.viz = pp.Exporter(
+        if isinstance(self.viz, AsyncExporter):
+            self.viz.close()
+        self.viz = create_exporter(
             self.gb,
             file_name=self.params.viz_file_name,
             folder_name=self.params.folder_name,
+            exporter=self.params.exporter,
+            asynchronous=self.params.async_export,
+            queue_size=self.params.export_queue_size,
         )
 
     @abc.abstractmethod
@@ -191,6 +431,59 @@ class CommonAbstractModel(AbstractModel):
         """ Export a step to visualization"""
         pass
 
+    def register_derived_field(
+        self, names: Union[str, List[str]], compute: Callable[[], None]
+    ) -> None:
+        """ Register a function that stores derived fields in pp.STATE
+
+        Parameters
+        ----------
+        names : str, List[str]
+            Names of the fields (keys in pp.STATE) set by compute
+        compute : Callable[[], None]
+            Computes the fields, and stores them in pp.STATE of all grids
+        """
+        for name in [names] if isinstance(names, str) else names:
+            self._derived_fields[name] = compute
+
+    def request_fields(self, *names: str) -> None:
+        """ Compute the given derived fields at every export, also if not exported
+
+        Use this for monitors that read derived fields from pp.STATE.
+        """
+        self.requested_fields.update(names)
+
+    def compute_derived_fields(self, names: Optional[Iterable[str]] = None) -> None:
+        """ Compute derived fields
+
+        Parameters
+        ----------
+        names : Iterable[str], Optional
+            Fields to compute. Default: The exported and requested fields.
+            Names that are not registered as derived fields are ignored.
+        """
+        if names is None:
+            names = [*self.export_fields, *sorted(self.requested_fields)]
+        computed = []
+        for name in names:
+            compute = self._derived_fields.get(name)
+            if compute is not None and compute not in computed:
+                compute()
+                computed.append(compute)
+
+    def flush_export(self) -> None:
+        """ Wait for an asynchronous exporter to write all steps"""
+        if isinstance(self.viz, AsyncExporter):
+            self.viz.flush()
+
+    def close_export(self) -> None:
+        """ Write all steps, and stop the writer thread of an asynchronous exporter
+
+        Call this at the end of the simulation. A later export starts a new thread.
+        """
+        if isinstance(self.viz, AsyncExporter):
+            self.viz.close()
+
     # --- Helper methods ---
 
     @property
@@ -0,0 +1,107 @@
+""" Rate- and pressure-controlled injection into the well cells.
+
+WellInjection is shared by the ISC flow model (FlowISC) and the ISC Biot model
+(ISCBiotContactMechanics). It must precede the model in the bases of a class,
+e.g. class FlowISC(WellInjection, Flow), and requires that the grids are tagged
+with 'well_cells'.
+
+Rate-controlled injection is a source term in the well cells. Pressure-controlled
+injection fixes the pressure in the well cells, by eliminating their pressure dofs
+from the assembled system (see assembly.eliminate_dofs).
+
+Models with a time-dependent injection override injection_mode, injection_rate and
+unscaled_injection_pressure.
+"""
+import logging
+from typing import Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sps
+
+import porepy as pp
+from GTS.isc_modelling.assembly import eliminate_dofs
+
+logger = logging.getLogger(__name__)
+
+
+class WellInjection:
+    """ Injection into the well cells, at a given rate or pressure"""
+
+    def __init__(self, params):
+        super().__init__(params)
+        # Pressure dofs of the injection cells, and the assembler they belong to
+        self._well_dofs: Optional[np.ndarray] = None
+        self._well_dofs_assembler: Optional[pp.Assembler] = None
+
+    @property
+    def injection_mode(self) -> str:
+        """ Injection mode {"rate", "pressure"}"""
+        return self.params.injection_mode
+
+    @property
+    def injection_rate(self) -> float:
+        """ Injection rate [l/s] (unscaled)"""
+        return self.params.injection_rate
+
+    @property
+    def unscaled_injection_pressure(self) -> float:
+        """ Injection pressure [Pa] (unscaled)"""
+        return self.params.injection_pressure
+
+    @property
+    def injection_pressure(self) -> float:
+        """ Scaled pressure of pressure-controlled injection"""
+        return self.unscaled_injection_pressure * (
+            pp.PASCAL / self.params.scalar_scale
+        )
+
+    @property
+    def source_flow_rate(self) -> float:
+        """ Scaled source flow rate """
+        injection_rate = self.injection_rate  # injection rate [l / s], unscaled
+        return (
+            injection_rate * pp.MILLI * (pp.METER / self.params.length_scale) ** self.Nd
+        )
+
+    def source_scalar(self, g: pp.Grid) -> np.ndarray:
+        """ Well-bore source (scaled)
+
+        With pressure-controlled injection, the well pressure is imposed by
+        apply_constraints, and there is no source.
+        """
+        if self.injection_mode == "pressure":
+            return np.zeros(g.num_cells)
+        flow_rate = self.source_flow_rate  # scaled
+        values = flow_rate * g.tags["well_cells"] * self.time_step
+        return values
+
+    def well_dofs(self) -> np.ndarray:
+        """ Global pressure dofs of the injection cells on all grids
+
+        The dofs are collected once per assembler.
+        """
+        if self._well_dofs_assembler is not self.assembler:
+            dofs = [
+                self.assembler.dof_ind(g, self.scalar_variable)[
+                    g.tags["well_cells"] > 0
+                ]
+                for g, _ in self.gb
+            ]
+            self._well_dofs = np.hstack(dofs).astype(int)
+            self._well_dofs_assembler = self.assembler
+        return self._well_dofs
+
+    def apply_constraints(
+        self, A: sps.csr_matrix, b: np.ndarray
+    ) -> Tuple[sps.csr_matrix, np.ndarray]:
+        """ Fix the pressure in the injection cells for pressure-controlled injection"""
+        A, b = super().apply_constraints(A, b)
+        if self.injection_mode == "pressure":
+            A, b = eliminate_dofs(
+                A,
+                b,
+                self.well_dofs(),
+                self.injection_pressure,
+                symmetric=self.params.pressure_elimination == "symmetric",
+            )
+        return A, b
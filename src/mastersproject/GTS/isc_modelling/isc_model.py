@@ -1,12 +1,15 @@
 import logging
 import time
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
 import numpy as np
 
 import porepy as pp
 from GTS.isc_modelling.ISCGrid import create_grid
 from GTS.isc_modelling.contact_mechanics_biot import ContactMechanicsBiotBase
+from GTS.isc_modelling.diagnostics import diagonal_ratio, row_sum_ratio
+from GTS.isc_modelling.discretization_manager import DiscretizationManager
+from GTS.isc_modelling.injection import WellInjection
 from GTS.isc_modelling.parameter import BiotParameters
 
 from mastersproject.util.logging_util import trace, timer
@@ -14,8 +17,14 @@ from mastersproject.util.logging_util import trace, timer
 logger = logging.getLogger(__name__)
 
 
-class ISCBiotContactMechanics(ContactMechanicsBiotBase):
+class ISCBiotContactMechanics(WellInjection, ContactMechanicsBiotBase):
     def __init__(self, params: BiotParameters):
+        # Cache of apertures for the current iterate. Keyed by
+        # (grid, scaled, from_iterate, iterate id). Set before super().__init__,
+        # since setting the grid bucket invalidates the cache.
+        self._aperture_cache: Dict[Tuple, np.ndarray] = {}
+        self._iterate_id: int = 0
+
         super().__init__(params)
 
         # -- GRAVITY OPTIONS
@@ -27,6 +36,9 @@ class ISCBiotContactMechanics(ContactMechanicsBiotBase):
         # Turn on/off gravitational effects on (Neumann) mechanical boundary conditions
         self._gravity_bc = params.dict().get("_gravity_bc", False)
 
+        # Tracks which terms must be re-discretized between Newton iterations
+        self.discretization_manager: Optional[DiscretizationManager] = None
+
     # --- Grid methods ---
 
     def create_grid(self):
@@ -61,6 +73,9 @@ class ISCBiotContactMechanics(ContactMechanicsBiotBase):
                     "bounding_box",
                     "shearzone_names",
                     "folder_name",
+                    "mesh_cache_dir",
+                    "depth_uncertainty",
+                    "geometry_seed",
                 }
             )
         )
@@ -77,9 +92,11 @@ class ISCBiotContactMechanics(ContactMechanicsBiotBase):
         """ Set a grid bucket to the class
         """
         self._gb = gb
+        self.invalidate_aperture_cache()
         if gb is None:
             return
         pp.contact_conditions.set_projections(self.gb)
+        self.set_displacement_jump_operators()
         self.gb.add_node_props(keys=["name"])  # Add 'name' as node prop to all grids.
 
         # Set the bounding box
@@ -153,6 +170,8 @@ class ISCBiotContactMechanics(ContactMechanicsBiotBase):
     ) -> np.ndarray:
         """ Compute the total aperture of each cell on a grid
 
+        The aperture is cached for the current iterate, see invalidate_aperture_cache.
+
         Parameters
         ----------
         g : pp.Grid
@@ -168,6 +187,15 @@ class ISCBiotContactMechanics(ContactMechanicsBiotBase):
         area/volume (or "specific volume") for intersections of co-dimension 2 and 3.
         See also specific_volume.
         """
+        key = (g, scaled, from_iterate, self._iterate_id)
+        if key not in self._aperture_cache:
+            self._aperture_cache[key] = self._compute_aperture(g, scaled, from_iterate)
+        return self._aperture_cache[key].copy()
+
+    def _compute_aperture(
+        self, g: pp.Grid, scaled: bool, from_iterate: bool
+    ) -> np.ndarray:
+        """ Compute the total aperture. See self.aperture"""
         a_init = self.compute_initial_aperture(g, scaled=scaled)
         a_mech = self.mechanical_aperture(g, from_iterate=from_iterate)
         if not scaled:
@@ -184,6 +212,15 @@ class ISCBiotContactMechanics(ContactMechanicsBiotBase):
         a_total = a_init + a_mech  # * not_injection_cells
         return a_total
 
+    def invalidate_aperture_cache(self) -> None:
+        """ Discard cached apertures
+
+        Must be called whenever the mortar displacements in pp.STATE or
+        'previous_iterate' change, e.g. in update_state.
+        """
+        self._iterate_id += 1
+        self._aperture_cache.clear()
+
     def compute_initial_aperture(self, g: pp.Grid, scaled) -> np.ndarray:
         """ Fetch the initial aperture. See __init__ for details """
         aperture = np.ones(g.num_cells)
@@ -343,68 +380,175 @@ class ISCBiotContactMechanics(ContactMechanicsBiotBase):
         return k
 
     @property
-    def source_flow_rate(self) -> float:
-        """ Scaled source flow rate """
-        injection_rate = (
-            self.params.injection_rate
-        )  # 10 / 60  # 10 l/min  # injection rate [l / s], unscaled
-        return (
-            injection_rate * pp.MILLI * (pp.METER / self.params.length_scale) ** self.Nd
-        )
+    def injection_well(self) -> Optional[str]:
+        """ Name of the injection well (borehole)"""
+        bh_sz = self.params.source_scalar_borehole_shearzone
+        return bh_sz.get("borehole") if bh_sz else None
 
-    def source_scalar(self, g: pp.Grid) -> np.ndarray:
-        """ Well-bore source (scaled)"""
-        flow_rate = self.source_flow_rate  # scaled
-        values = flow_rate * g.tags["well_cells"] * self.time_step
-        return values
+    @property
+    def injection_mode(self) -> str:
+        """ Injection mode {"rate", "pressure"} of the current time step"""
+        protocol = self.params.stimulation_protocol
+        if protocol is None:
+            return self.params.injection_mode
+        return protocol.mode(self.injection_well, self._injection_time)
 
-    def source_scalar_pressure(self, pressure):
-        """ Pressure-controlled injection"""
-        for g, d in self.gb:
-            wells = g.tags["well_cells"]
-            if np.sum(np.abs(wells)) > 0:
-                dof_ind = self.assembler.dof_ind(g, self.scalar_variable)
-                loc = np.where(wells != 0)[0]
-                glob_ind = dof_ind[loc]
-                A, b = self.assembler.assemble_matrix_rhs(matrix_format="csr")
-                self.csr_zero_rows(A, glob_ind)
-                A[glob_ind, glob_ind] = 1
-                b[glob_ind] = pressure
-
-    def csr_zero_rows(self, csr, rows_to_zero):
-        """ Efficient way to set csr sparse matrix row to zero.
-        https://stackoverflow.com/questions/19784868/
-        what-is-most-efficient-way-of-setting-row-to-zeros-for-a-sparse-scipy-matrix/
-        19800305#19800305"""
-        rows, cols = csr.shape
-        mask = np.ones((rows,), dtype=np.bool)
-        mask[rows_to_zero] = False
-        nnz_per_row = np.diff(csr.indptr)
-
-        mask = np.repeat(mask, nnz_per_row)
-        nnz_per_row[rows_to_zero] = 0
-        csr.data = csr.data[mask]
-        csr.indices = csr.indices[mask]
-        csr.indptr[1:] = np.cumsum(nnz_per_row)
+    @property
+    def injection_rate(self) -> float:
+        """ Injection rate [l/s] of the current time step (unscaled)"""
+        protocol = self.params.stimulation_protocol
+        if protocol is None:
+            return self.params.injection_rate
+        if self.injection_mode != "rate":
+            return 0.0
+        return protocol.value(self.injection_well, self._injection_time)
+
+    @property
+    def _injection_time(self) -> float:
+        """ Time the stimulation protocol is evaluated at
+
+        The middle of the current time step, such that a step between two changes
+        of the protocol gets the injection of that phase.
+        """
+        return self.time - self.time_step / 2
+
+    @property
+    def unscaled_injection_pressure(self) -> float:
+        """ Injection pressure [Pa] of the current time step (unscaled)"""
+        protocol = self.params.stimulation_protocol
+        if protocol is None:
+            return self.params.injection_pressure
+        return protocol.value(self.injection_well, self._injection_time)
 
     # --- Simulation and solvers ---
 
+    def initial_biot_condition(self) -> None:
+        """ Set initial guess for the variables, and discard cached apertures
+
+        On restart, the initial conditions are overwritten by the checkpoint.
+        """
+        super().initial_biot_condition()
+        if self.params.restart_folder is not None:
+            self.restore_checkpoint()
+        self.invalidate_aperture_cache()
+
     def _prepare_grid(self):
         """ Tag well cells right after creation.
         Called by self.prepare_simulation()
         """
         if self.gb is None:
-            super()._prepare_grid()
+            if self.params.restart_folder is not None:
+                self.gb = self.load_checkpoint_grid()
+            else:
+                super()._prepare_grid()
         self.well_cells()  # tag well cells
 
+    def discretize(self) -> None:
+        """ Discretize all terms, and record the parameters they were discretized with
+        """
+        super().discretize()
+        self.discretization_manager = DiscretizationManager(
+            self.gb, *self._discretization_dependencies()
+        )
+        self.discretization_manager.update_fingerprints()
+
+    def _discretization_dependencies(
+        self,
+    ) -> Tuple[Dict[Tuple[str, str], List[str]], Dict[str, List[str]]]:
+        """ Parameters each of the re-discretized terms depends on
+
+        Between Newton iterations, the aperture changes. This enters the fracture
+        permeability (second_order_tensor) and mass weight on the lower-dimensional
+        grids, and the normal diffusivity on the adjacent edges. The Biot terms
+        (grad_p, div_u, stabilization) are never re-discretized.
+
+        Returns
+        -------
+        node_dependencies : Dict[Tuple[str, str], List[str]]
+            {(variable, term): [parameter names]}
+        edge_dependencies : Dict[str, List[str]]
+            {coupling term: [parameter names]}
+        """
+        var_s, var_m = self.scalar_variable, self.displacement_variable
+        node_dependencies = {
+            (var_s, "diffusion"): ["second_order_tensor", "bc"],
+            (var_s, "mass"): ["mass_weight", "time_step"],
+            (var_s, "source"): ["source"],
+            (var_m, "mpsa"): ["fourth_order_tensor", "bc"],
+        }
+        edge_dependencies = {
+            self.scalar_coupling_term: ["normal_diffusivity"],
+        }
+        return node_dependencies, edge_dependencies
+
     @timer(logger, level="INFO")
     def before_newton_iteration(self) -> None:
         # Re-discretize the nonlinear term
         super().before_newton_iteration()
-        self.assembler.discretize(term_filter=["!grad_p", "!div_u", "!stabilization"])
-        # for g, _ in self.gb:
-        #     if g.dim < self.Nd:
-        #         self.assembler.discretize(grid=g)
+        # Re-discretize the terms that depend on updated parameters (e.g. aperture).
+        # Typically, this is restricted to the fractures and their mortar grids.
+        self.discretization_manager.discretize()
+
+    def update_state(self, solution_vector: np.ndarray) -> None:
+        """ Update variables for the current Newton iteration, and discard the
+        apertures computed from the previous iterate.
+        """
+        super().update_state(solution_vector)
+        self.invalidate_aperture_cache()
+
+    def after_newton_convergence(self, solution, errors, iteration_counter) -> None:
+        # pp.STATE is updated by super(). Nothing uses the cache in between, so we
+        # can invalidate it here, before the export (which uses the aperture).
+        self.invalidate_aperture_cache()
+        super().after_newton_convergence(solution, errors, iteration_counter)
+        self.adapt_time_step(iteration_counter)
+        # Store the next time step with the checkpoint
+        self.save_checkpoint()
+
+    # --- Time stepping ---
+
+    def prepare_simulation(self) -> None:
+        super().prepare_simulation()
+        controller = self.params.time_step_controller
+        if controller is not None:
+            self.time_step = controller.limit(
+                self.time, self.time_step, self._injection_change_times(), self.end_time
+            )
+
+    def before_newton_loop(self) -> None:
+        # The time step may change between time steps (time step controller,
+        # cut-backs, the last step). The time step of the Biot terms is only set
+        # with the Biot parameters, which include the flow and mechanics parameters.
+        self.set_biot_parameters()
+
+    def adapt_time_step(self, iterations: int) -> None:
+        """ Set the size of the next time step, see TimeStepController"""
+        controller = self.params.time_step_controller
+        if controller is None:
+            return
+        time_step = controller.next_step(
+            self.time,
+            self.time_step,
+            iterations,
+            self._injection_change_times(),
+            self.end_time,
+        )
+        if time_step != self.time_step:
+            logger.info(
+                f"Time step changed from {self.time_step:.2e} to {time_step:.2e} "
+                f"after {iterations} Newton iterations"
+            )
+        self.time_step = time_step
+
+    def restore_time_step(self, time_step: float) -> None:
+        # With a controller, the next step is adapted from the cut step instead
+        if self.params.time_step_controller is None:
+            super().restore_time_step(time_step)
+
+    def _injection_change_times(self) -> np.ndarray:
+        """ Times where the stimulation protocol changes"""
+        protocol = self.params.stimulation_protocol
+        return protocol.change_times if protocol is not None else np.array([])
 
     def after_newton_iteration(self, solution_vector: np.ndarray) -> None:
         super().after_newton_iteration(solution_vector)
@@ -454,11 +598,9 @@ class ISCBiotContactMechanics(ContactMechanicsBiotBase):
         self.negneg_ind = negneg_ind  # noqa
 
         # Condition number
-        A, _ = self.assembler.assemble_matrix_rhs()  # noqa
-        row_sum = np.sum(np.abs(A), axis=1)
-        pp_cond = np.max(row_sum) / np.min(row_sum)
-        diag = np.abs(A.diagonal())
-        umfpack_cond = np.max(diag) / np.min(diag)
+        A, _ = self.assemble_matrix_rhs()  # noqa
+        cond = self.estimate_condition_number(A)
+        block_stats = self.block_statistics(A)
 
         summary_param = (
             f"\nSummary of relevant parameters:\n"
@@ -468,8 +610,11 @@ class ISCBiotContactMechanics(ContactMechanicsBiotBase):
             f"{np.mean(self.permeability(self._nd_grid(), scaled=False)):.2e}\n"
             f"time step: {self.time_step / pp.HOUR:.4f} hours\n"
             f"3d cells: {g.num_cells}\n"
-            f"pp condition number: {pp_cond:.2e}\n"
-            f"umfpack condition number: {umfpack_cond:.2e}\n"
+            f"condition number estimate (1-norm): {cond:.2e}\n"
+            f"row sum ratio: {row_sum_ratio(A):.2e}\n"
+            f"diagonal ratio: {diagonal_ratio(A):.2e}\n"
+            f"\nScaling of the blocks of the linear system:\n"
+            f"{block_stats.to_string(float_format='{:.2e}'.format)}\n"
         )
 
         scalar_parameters = d[pp.PARAMETERS][self.scalar_parameter_key]
@@ -0,0 +1,445 @@
+""" Linear solvers for the ISC models.
+
+The direct solver keeps a persistent PARDISO handle such that the symbolic analysis
+(fill-reducing ordering) and, if possible, the numeric factorization are reused from
+one call to the next.
+
+The iterative solver is GMRES preconditioned by a block lower-triangular
+preconditioner, where the blocks are defined by groups of degrees of freedom
+(e.g. displacements, contact variables and pressures).
+"""
+import inspect
+import logging
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+import scipy.sparse as sps
+import scipy.sparse.linalg as spla
+
+logger = logging.getLogger(__name__)
+
+
+class PardisoError(RuntimeError):
+    """ PARDISO failed, e.g. because the matrix is singular"""
+
+
+class DirectSolverSession:
+    """ Direct solver session reusing the PARDISO factorization across solves
+
+    The PARDISO phases are chosen based on what changed since the previous call:
+        * Sparsity pattern changed (or first call): analysis + factorization (12)
+        * Only the matrix values changed: numeric factorization only (22)
+        * Matrix unchanged: back substitution only (33)
+
+    This is useful in Newton iterations of the contact mechanics problem, where the
+    pattern of the assembled matrix is fixed, and in linear time-dependent problems,
+    where only the right hand side changes between time steps.
+
+    Failures of PARDISO are raised as PardisoError.
+    """
+
+    def __init__(self):
+        self.solver = _PardisoAdapter()
+
+        # Pattern and values of the currently factorized matrix
+        self._indptr: Optional[np.ndarray] = None
+        self._indices: Optional[np.ndarray] = None
+        self._data: Optional[np.ndarray] = None
+
+        # Statistics
+        self.num_analysis: int = 0
+        self.num_factorizations: int = 0
+        self.num_solves: int = 0
+
+    def solve(self, A: sps.spmatrix, b: np.ndarray) -> np.ndarray:
+        """ Solve Ax=b, reusing as much of the previous factorization as possible
+
+        Parameters
+        ----------
+        A : sps.spmatrix
+            Square sparse matrix. Converted to csr if necessary.
+        b : np.ndarray
+            Right hand side
+
+        Returns
+        -------
+        x : np.ndarray
+            Solution of the linear system
+        """
+        A = self._as_csr(A)
+        self.factorize(A)
+        return self._back_substitute(A, b)
+
+    def factorize(self, A: sps.spmatrix) -> None:
+        """ Factorize A, skipping the steps that can be reused from the previous call
+
+        Parameters
+        ----------
+        A : sps.spmatrix
+            Square sparse matrix. Converted to csr if necessary.
+        """
+        A = self._as_csr(A)
+        if self._pattern_changed(A):
+            phase = 12
+            self.num_analysis += 1
+            self.num_factorizations += 1
+            logger.info("Sparsity pattern changed. Analyse and factorize matrix.")
+        elif not np.array_equal(A.data, self._data):
+            phase = 22
+            self.num_factorizations += 1
+            logger.info("Matrix values changed. Reuse analysis, refactorize matrix.")
+        else:
+            logger.info("Matrix unchanged. Reuse factorization.")
+            return
+
+        tic = time.time()
+        self.solver.factorize(A, phase)
+        logger.info(f"Factorization done. Elapsed time {time.time() - tic:.2e}")
+
+        self._indptr = A.indptr.copy()
+        self._indices = A.indices.copy()
+        self._data = A.data.copy()
+
+    def solve_factorized(self, b: np.ndarray, transpose: bool = False) -> np.ndarray:
+        """ Solve with the currently factorized matrix, A x = b or A^T x = b
+
+        No factorization is done. This is used by diagnostics, e.g. condition number
+        estimates, that need several solves with the matrix of the last solve.
+
+        Parameters
+        ----------
+        b : np.ndarray
+            Right hand side
+        transpose : bool
+            Solve the transposed system
+
+        Returns
+        -------
+        x : np.ndarray
+            Solution of the linear system
+        """
+        A = self.matrix
+        if A is None:
+            raise ValueError("No matrix is factorized")
+        return self._back_substitute(A, b, transpose=transpose)
+
+    @property
+    def matrix(self) -> Optional[sps.csr_matrix]:
+        """ The currently factorized matrix, or None"""
+        if self._indptr is None:
+            return None
+        n = self._indptr.size - 1
+        return sps.csr_matrix((self._data, self._indices, self._indptr), shape=(n, n))
+
+    def reset(self) -> None:
+        """ Release the factorization. The next solve will start from scratch."""
+        if self._indptr is not None:
+            self.solver.free_memory()
+        self._indptr = None
+        self._indices = None
+        self._data = None
+
+    def _back_substitute(
+        self, A: sps.csr_matrix, b: np.ndarray, transpose: bool = False
+    ) -> np.ndarray:
+        """ Solve using the stored factorization of A"""
+        x = self.solver.back_substitute(A, b, transpose=transpose)
+        self.num_solves += 1
+        return x
+
+    def _pattern_changed(self, A: sps.csr_matrix) -> bool:
+        """ Whether the sparsity pattern of A differs from the factorized matrix"""
+        if self._indptr is None:
+            return True
+        return not (
+            np.array_equal(A.indptr, self._indptr)
+            and np.array_equal(A.indices, self._indices)
+        )
+
+    @staticmethod
+    def _as_csr(A: sps.spmatrix) -> sps.csr_matrix:
+        """ Convert to csr with sorted indices and float64 data"""
+        A = sps.csr_matrix(A, dtype=np.float64)
+        if not A.has_sorted_indices:
+            A.sort_indices()
+        return A
+
+
+class _PardisoAdapter:
+    """ The PARDISO phases used by DirectSolverSession
+
+    pypardiso has no public interface to run the phases of PARDISO one by one. This
+    adapter is the only place where its private methods (_check_A, _check_b and
+    _call_pardiso of PyPardisoSolver, as of pypardiso 0.4) are used. If they are
+    not available, the adapter falls back to pypardiso.spsolve, which analyses and
+    factorizes the matrix on every solve.
+
+    Errors of pypardiso are raised as PardisoError.
+    """
+
+    _private_methods = ("_check_A", "_check_b", "_call_pardiso")
+
+    def __init__(self):
+        try:
+            import pypardiso
+            from pypardiso.pardiso_wrapper import PyPardisoError
+        except ImportError:
+            raise ImportError(
+                "The direct solver session requires pypardiso. "
+                "Install it with 'pip install pypardiso'."
+            )
+
+        self._pypardiso = pypardiso
+        self._error = PyPardisoError
+        self._solver = pypardiso.PyPardisoSolver()
+        self.reuse_factorization: bool = all(
+            hasattr(self._solver, m) for m in self._private_methods
+        )
+        if not self.reuse_factorization:
+            logger.warning(
+                f"pypardiso {getattr(pypardiso, '__version__', '')} does not provide "
+                "the methods to reuse factorizations. Fall back to pypardiso.spsolve."
+            )
+
+    def factorize(self, A: sps.csr_matrix, phase: int) -> None:
+        """ Run the PARDISO phase 12 (analysis + factorization) or 22 on A"""
+        if np.any(np.diff(A.indptr) == 0):
+            raise PardisoError("Matrix is singular, because it has empty rows")
+        if not self.reuse_factorization:
+            return
+        self._solver._check_A(A)
+        self._solver.set_phase(phase)
+        self._call(A, np.zeros((A.shape[0], 1)))
+
+    def back_substitute(
+        self, A: sps.csr_matrix, b: np.ndarray, transpose: bool = False
+    ) -> np.ndarray:
+        """ Solve A x = b, or A^T x = b, with the factorization of A"""
+        if not self.reuse_factorization:
+            if transpose:
+                A = sps.csr_matrix(A.T)
+            try:
+                return self._pypardiso.spsolve(A, b)
+            except self._error as e:
+                raise PardisoError(f"PARDISO failed with error {e}") from e
+
+        b = self._solver._check_b(A, b)
+        self._solver.set_phase(33)
+        if transpose:
+            # iparm(12) = 2: Solve the transposed system with the same factorization
+            self._solver.set_iparm(12, 2)
+        try:
+            return self._call(A, b)
+        finally:
+            self._solver.set_iparm(12, 0)
+
+    def _call(self, A: sps.csr_matrix, b: np.ndarray) -> np.ndarray:
+        """ Run the current phase of PARDISO"""
+        try:
+            return self._solver._call_pardiso(A, b)
+        except self._error as e:
+            raise PardisoError(f"PARDISO failed with error {e}") from e
+
+    def free_memory(self) -> None:
+        """ Release the memory of the factorization"""
+        self._solver.free_memory(everything=True)
+
+
+class BlockPreconditionedSolver:
+    """ GMRES with a block lower-triangular preconditioner
+
+    The unknowns are split into ordered blocks. The preconditioner solves the
+    blocks one after another (block Gauss-Seidel), moving the coupling to the
+    already computed blocks to the right hand side. Each diagonal block is
+    approximately inverted by one of the methods
+        * "amg": One V-cycle of smoothed aggregation AMG (pyamg).
+        * "lu": Sparse LU factorization (SuperLU). Intended for small blocks, such
+            as the contact variables on the fractures.
+        * "fixed_stress": AMG on the approximate Schur complement
+            A_kk - sum_j A_kj diag(A_jj)^-1 A_jk, where j runs over all preceding
+            blocks. For the flow block of the Biot system, this is an algebraic
+            variant of the fixed-stress splitting.
+
+    Degrees of freedom not covered by any block are gathered in a final block,
+    which is solved by LU.
+    """
+
+    def __init__(
+        self,
+        blocks: List[Tuple[str, np.ndarray, str]],
+        tol: float = 1e-8,
+        maxiter: int = 500,
+        restart: int = 50,
+    ):
+        """ Initialize the solver
+
+        Parameters
+        ----------
+        blocks : List[Tuple[str, np.ndarray, str]]
+            Ordered blocks (name, dofs, method).
+            method is one of {"amg", "lu", "fixed_stress"}.
+        tol : float
+            Relative tolerance of GMRES
+        maxiter : int
+            Maximum number of GMRES iterations
+        restart : int
+            Number of iterations between restarts in GMRES
+        """
+        for name, _, method in blocks:
+            if method not in ("amg", "lu", "fixed_stress"):
+                raise ValueError(f"Unknown method {method} for block {name}")
+
+        self.blocks = [(n, np.asarray(d, dtype=int), m) for n, d, m in blocks]
+        self.tol = tol
+        self.maxiter = maxiter
+        self.restart = restart
+
+        # Preconditioner of the current matrix
+        self._indptr: Optional[np.ndarray] = None
+        self._indices: Optional[np.ndarray] = None
+        self._data: Optional[np.ndarray] = None
+        self._preconditioner: Optional[spla.LinearOperator] = None
+
+        # Statistics
+        self.num_setups: int = 0
+        self.iterations: List[int] = []
+        self.residual_history: List[float] = []
+
+    def solve(self, A: sps.spmatrix, b: np.ndarray) -> np.ndarray:
+        """ Solve Ax=b with preconditioned GMRES
+
+        The preconditioner is rebuilt only if A changed since the previous call.
+        The number of iterations is appended to self.iterations, and the
+        (preconditioned) relative residual norms of this solve are stored in
+        self.residual_history.
+
+        Parameters
+        ----------
+        A : sps.spmatrix
+            Square sparse matrix
+        b : np.ndarray
+            Right hand side
+
+        Returns
+        -------
+        x : np.ndarray
+            Approximate solution of the linear system
+        """
+        A = sps.csr_matrix(A, dtype=np.float64)
+        if self._matrix_changed(A):
+            self.setup(A)
+
+        history: List[float] = []
+        tol_kw = "rtol" if "rtol" in inspect.signature(spla.gmres).parameters else "tol"
+        x, info = spla.gmres(
+            A,
+            b,
+            M=self._preconditioner,
+            restart=self.restart,
+            maxiter=self.maxiter,
+            callback=history.append,
+            callback_type="pr_norm",
+            atol=0.0,
+            **{tol_kw: self.tol},
+        )
+        self.residual_history = history
+        self.iterations.append(len(history))
+
+        if info > 0:
+            logger.warning(
+                f"GMRES did not converge in {len(history)} iterations. "
+                f"Relative residual {history[-1] if history else np.nan:.2e}"
+            )
+        elif info < 0:
+            raise ValueError(f"Illegal input or breakdown in GMRES (info={info})")
+        else:
+            logger.info(f"GMRES converged in {len(history)} iterations.")
+        return x
+
+    def setup(self, A: sps.spmatrix) -> None:
+        """ Build the block preconditioner for the matrix A"""
+        tic = time.time()
+        A = sps.csr_matrix(A, dtype=np.float64)
+        blocks = self._complete_blocks(A.shape[0])
+
+        steps = []
+        prev_dofs = np.array([], dtype=int)
+        inv_diags = []
+        for name, dofs, method in blocks:
+            A_kk = A[dofs][:, dofs]
+            A_kprev = A[dofs][:, prev_dofs]
+
+            if method == "fixed_stress" and prev_dofs.size > 0:
+                A_prevk = A[prev_dofs][:, dofs]
+                inv_diag = sps.diags(np.hstack(inv_diags))
+                A_kk = A_kk - A_kprev * inv_diag * A_prevk
+
+            if method == "lu":
+                inv_kk = spla.splu(sps.csc_matrix(A_kk)).solve
+            else:
+                inv_kk = _amg_preconditioner(A_kk)
+
+            steps.append((dofs, prev_dofs, A_kprev.tocsr(), inv_kk))
+            logger.info(f"Block {name}: {dofs.size} dofs, method {method}")
+
+            prev_dofs = np.hstack((prev_dofs, dofs))
+            inv_diags.append(_safe_inverse(A_kk.diagonal()))
+
+        def apply(r: np.ndarray) -> np.ndarray:
+            r = np.ravel(r)
+            x = np.zeros_like(r)
+            for dofs, prev, A_kprev, inv_kk in steps:
+                rhs = r[dofs]
+                if prev.size > 0:
+                    rhs = rhs - A_kprev * x[prev]
+                x[dofs] = inv_kk(rhs)
+            return x
+
+        self._preconditioner = spla.LinearOperator(A.shape, matvec=apply)
+        self._indptr = A.indptr.copy()
+        self._indices = A.indices.copy()
+        self._data = A.data.copy()
+        self.num_setups += 1
+        logger.info(f"Preconditioner setup. Elapsed time {time.time() - tic:.2e}")
+
+    def _complete_blocks(self, num_dofs: int) -> List[Tuple[str, np.ndarray, str]]:
+        """ Drop empty blocks and gather uncovered dofs in a final LU-block"""
+        blocks = [b for b in self.blocks if b[1].size > 0]
+        covered = np.zeros(num_dofs, dtype=bool)
+        for _, dofs, _ in blocks:
+            covered[dofs] = True
+        if not np.all(covered):
+            blocks.append(("remainder", np.where(~covered)[0], "lu"))
+        return blocks
+
+    def _matrix_changed(self, A: sps.csr_matrix) -> bool:
+        """ Whether A differs from the matrix of the current preconditioner"""
+        if self._preconditioner is None:
+            return True
+        return not (
+            np.array_equal(A.indptr, self._indptr)
+            and np.array_equal(A.indices, self._indices)
+            and np.array_equal(A.data, self._data)
+        )
+
+
+def _amg_preconditioner(A: sps.spmatrix):
+    """ One V-cycle of smoothed aggregation AMG as an approximate inverse of A"""
+    try:
+        import pyamg
+    except ImportError:
+        raise ImportError(
+            "The iterative solver requires pyamg. Install it with 'pip install pyamg'."
+        )
+    ml = pyamg.smoothed_aggregation_solver(sps.csr_matrix(A))
+    M = ml.aspreconditioner(cycle="V")
+    return M.matvec
+
+
+def _safe_inverse(d: np.ndarray) -> np.ndarray:
+    """ Elementwise inverse, with zero for (near) zero entries"""
+    inv = np.zeros_like(d)
+    nonzero = np.abs(d) > np.finfo(float).tiny
+    inv[nonzero] = 1 / d[nonzero]
+    return inv
@@ -1,12 +1,14 @@
 import logging
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
 import numpy as np
 import pendulum
+import scipy.sparse as sps
 
 import GTS as gts
 import porepy as pp
 from GTS.isc_modelling.ISCGrid import create_grid
+from GTS.isc_modelling.exporter import create_exporter
 from GTS.isc_modelling.general_model import CommonAbstractModel
 from GTS.isc_modelling.parameter import BaseParameters, GrimselGranodiorite
 from mastersproject.util.logging_util import timer, trace
@@ -16,7 +18,60 @@ from porepy.params.data import add_nonpresent_dictionary
 logger = logging.getLogger(__name__)
 
 
-class Mechanics(CommonAbstractModel):
+class LocalDisplacementJump:
+    """ Displacement jumps on the fractures, in local coordinates
+
+    Shared by Mechanics and ContactMechanicsISC. Requires the attributes gb, Nd and
+    mortar_displacement_variable. The operators from mortar displacements to local
+    displacement jumps are cached on the edges, see local_displacement_jump_operator.
+    """
+
+    def reconstruct_local_displacement_jump(
+        self, data_edge: Dict, from_iterate: bool = True
+    ) -> np.ndarray:
+        """ Reconstruct the displacement jump in local coordinates.
+
+        Parameters:
+            data_edge : Dict
+                The dictionary on the gb edge. Should contain
+                    - a mortar grid
+                    - a projection, obtained by calling
+                    pp.contact_conditions.set_projections(self.gb)
+            from_iterate : bool
+                Whether to fetch displacement from state or previous
+                iterate.
+        Returns:
+            u_mortar_local : np.ndarray (ambient_dim x g_l.num_cells)
+                First 1-2 dimensions are in the tangential direction
+                of the fracture, last dimension is normal.
+
+        """
+        var_mortar = self.mortar_displacement_variable
+        nd = self.Nd
+
+        if from_iterate:
+            mortar_u = data_edge[pp.STATE]["previous_iterate"][var_mortar]
+        else:
+            mortar_u = data_edge[pp.STATE][var_mortar]
+
+        # Rotated displacement jumps, in the local coordinates of the fracture.
+        mortar_to_local_jump = local_displacement_jump_operator(data_edge, nd)
+        u_mortar_local = mortar_to_local_jump * mortar_u
+        return u_mortar_local.reshape((nd, -1), order="F")
+
+    def set_displacement_jump_operators(self) -> None:
+        """ Build the displacement jump operators on all fracture edges.
+
+        The operators are otherwise built on first use.
+        See local_displacement_jump_operator.
+        """
+        for _, data_edge in self.gb.edges():
+            mg: pp.MortarGrid = data_edge["mortar_grid"]
+            if mg.dim == self.Nd - 1:
+                local_displacement_jump_operator(data_edge, self.Nd)
+
+
+class Mechanics(LocalDisplacementJump, CommonAbstractModel):
     def __init__(self, params: BaseParameters):
         """ General mechanics model for static contact mechanics
 
@@ -319,73 +374,45 @@ class Mechanics(CommonAbstractModel):
         """ Wrapper to create grid"""
         self.create_grid()
 
-    @timer(logger, level="INFO")
-    def initialize_linear_solver(self) -> None:
-        """ Initialize linear solver
-
-        Currently, we only consider the direct solver.
-        See also self.assemble_and_solve_linear_system()
-        """
-
-        # # Compute exact condition number:
-        # A, _ = self.assembler.assemble_matrix_rhs()
-        # cond = spla.norm(A, 1) * spla.norm(spla.inv(A), 1)
-        # logger.info(f"Exact condition number: {cond:.2e}")
-
-        if self.params.linear_solver == "direct":
-            """ In theory, it should be possible to instruct SuperLU to reuse the
-            symbolic factorization from one iteration to the next. However, it seems
-            the scipy wrapper around SuperLU has not implemented the necessary
-            functionality, as discussed in
-
-                https://github.com/scipy/scipy/issues/8227
-
-            We will therefore pass here, and pay the price of long computation times.
-
-            """
-            pass
+    def _linear_solver_blocks(self) -> List[Tuple[str, List[str], str]]:
+        """ Matrix displacements (AMG), followed by the fracture contact variables (LU)"""
+        blocks = super()._linear_solver_blocks()
+        blocks.append(("mechanics", [self.displacement_variable], "amg"))
+        blocks.append(
+            (
+                "contact",
+                [self.mortar_displacement_variable, self.contact_traction_variable],
+                "lu",
+            )
+        )
+        return blocks
 
-        else:
-            raise ValueError(f"Unknown linear solver {self.params.linear_solver}")
+    def _convergence_blocks(self) -> List[Tuple[str, np.ndarray, float]]:
+        """ Matrix displacements [m], followed by the contact tractions"""
+        blocks = super()._convergence_blocks()
+        ls = self.params.length_scale
+        ss = self.params.scalar_scale
+        # NOTE: In previous simulations, this was erronuously scalar scale.
+        displacement_dof = self._variable_dofs([self.displacement_variable])
+        blocks.append(("displacement", displacement_dof, ls))
+        # The squared contact norms were weighted by ss * ls ** 2.
+        contact_dof = self._variable_dofs([self.contact_traction_variable])
+        blocks.append(("contact", contact_dof, np.sqrt(ss) * ls))
+        return blocks
 
     def _check_convergence_mechanics(
         self, solution, prev_solution, init_solution, nl_params
     ):
         """ Check convergence and compute error of matrix displacement variable"""
-        var_m = self.displacement_variable
-        g_max = self._nd_grid()
-        # NOTE: In previous simulations, this was erronuously scalar scale.
-        ls = self.params.length_scale
-
-        # Get the solution from current and previous iterates,
-        # as well as the initial guess.
-        mech_dof = self.assembler.dof_ind(g_max, var_m)
-        u_mech_now = solution[mech_dof] * ls
-        u_mech_prev = prev_solution[mech_dof] * ls
-        u_mech_init = init_solution[mech_dof] * ls
-
-        # Calculate errors
-        difference_in_iterates_mech = np.sum((u_mech_now - u_mech_prev) ** 2)
-        difference_from_init_mech = np.sum((u_mech_now - u_mech_init) ** 2)
-
         tol_convergence = nl_params.get("nl_convergence_tol")
-
-        converged = False
-        diverged = False
-
-        # Check absolute convergence criterion
-        if difference_in_iterates_mech < tol_convergence:
-            converged = True
-            error_mech = difference_in_iterates_mech
-
-        else:
-            # Check relative convergence criterion
-            if (
-                difference_in_iterates_mech
-                < tol_convergence * difference_from_init_mech
-            ):
-                converged = True
-            error_mech = difference_in_iterates_mech / difference_from_init_mech
+        error_mech, converged, diverged = self.convergence_monitor.check(
+            "displacement",
+            solution,
+            prev_solution,
+            init_solution,
+            tol_convergence,
+            self.time,
+        )
 
         logger.info(f"Error in matrix displacement is {error_mech:.6e}")
         logger.info(
@@ -398,60 +425,20 @@ class Mechanics(CommonAbstractModel):
         self, solution, prev_solution, init_solution, nl_params
     ):
         """ Check convergence and compute error of contact traction variable"""
-
-        contact_dof = np.array([], dtype=np.int)
-        for e, _ in self.gb.edges():
-            _, g_h = self.gb.nodes_of_edge(e)
-            if g_h.dim == self.Nd:
-                contact_dof = np.hstack(
-                    (
-                        contact_dof,
-                        self.assembler.dof_ind(e[1], self.contact_traction_variable),
-                    )
-                )
-
-        # IS POREPY TRACTION WEIGHED ???
-        ls = self.params.length_scale
-        ss = self.params.scalar_scale
-        # Pick out the solution from current, previous iterates, as well as the
-        # initial guess.
-        contact_now = solution[contact_dof]
-        contact_prev = prev_solution[contact_dof]
-        contact_init = init_solution[contact_dof]
-
-        # Calculate errors
-        contact_norm = np.sum(contact_now ** 2) * ss * ls ** 2
-        difference_in_iterates_contact = (
-            np.sum((contact_now - contact_prev) ** 2) * ss * ls ** 2
-        )
-        difference_from_init_contact = (
-            np.sum((contact_now - contact_init) ** 2) * ss * ls ** 2
-        )
-
         tol_convergence = nl_params["nl_convergence_tol"]
-
-        converged = False
-        diverged = False
-
-        # The if is intended to avoid division through zero
-        if (
-            contact_norm < tol_convergence
-            and difference_in_iterates_contact < tol_convergence
-        ):
-            converged = True
-            error_contact = difference_in_iterates_contact
-        else:
-            error_contact = (
-                difference_in_iterates_contact / difference_from_init_contact
-            )
+        error_contact, converged, diverged = self.convergence_monitor.check(
+            "contact",
+            solution,
+            prev_solution,
+            init_solution,
+            tol_convergence,
+            self.time,
+        )
 
         logger.info(f"Error in contact force is {error_contact:.6e}.\n")
         logger.info(
             f"Contact force {'converged' if converged else 'did not converge'}."
         )
-
-        logger.info("DISABLE CONVERGENCE CHECK FOR CONTACT FORCE PENDING DEBUGGING")
-        converged = True
         return error_contact, converged, diverged
 
     def check_convergence(
@@ -601,47 +588,6 @@ class Mechanics(CommonAbstractModel):
 
         d[pp.STATE]["stress"] = stress
 
-    def reconstruct_local_displacement_jump(
-        self, data_edge: Dict, from_iterate: bool = True
-    ):
-        """ Reconstruct the displacement jump in local coordinates.
-
-        Parameters:
-            data_edge : Dict
-                The dictionary on the gb edge. Should contain
-                    - a mortar grid
-                    - a projection, obtained by calling
-                    pp.contact_conditions.set_projections(self.gb)
-            from_iterate : bool
-                Whether to fetch displacement from state or previous
-                iterate.
-        Returns:
-            u_mortar_local : np.ndarray (ambient_dim x g_l.num_cells)
-                First 1-2 dimensions are in the tangential direction
-                of the fracture, last dimension is normal.
-
-        """
-        var_mortar = self.mortar_displacement_variable
-        nd = self.Nd
-
-        mg: pp.MortarGrid = data_edge["mortar_grid"]
-        if from_iterate:
-            mortar_u = data_edge[pp.STATE]["previous_iterate"][var_mortar]
-        else:
-            mortar_u = data_edge[pp.STATE][var_mortar]
-
-        displacement_jump_global_coord = (
-            mg.mortar_to_slave_avg(nd=nd) * mg.sign_of_mortar_sides(nd=nd) * mortar_u
-        )
-        projection: pp.TangentialNormalProjection = data_edge[
-            "tangential_normal_projection"
-        ]
-
-        # Rotated displacement jumps. these are in the local coordinates, on the fracture.
-        project_to_local = projection.project_tangential_normal(int(mg.num_cells / 2))
-        u_mortar_local = project_to_local * displacement_jump_global_coord
-        return u_mortar_local.reshape((nd, -1), order="F")
-
     # --- Exporting and visualization ---
 
     def set_viz(self) -> None:
@@ -664,6 +610,17 @@ class Mechanics(CommonAbstractModel):
                 # self.stress_exp,
             ]
         )
+        # Variables defined on faces can only be saved by the hdf5 exporter
+        if self.params.exporter == "hdf5":
+            self.export_fields.append(self.stress_exp)
+
+        # Computed only if exported or requested
+        self.register_derived_field(self.u_exp, self.save_matrix_displacements)
+        self.register_derived_field(self.traction_exp, self.save_contact_traction)
+        self.register_derived_field(
+            [self.normal_frac_u, self.tangential_frac_u], self.save_frac_jump_data
+        )
+        self.register_derived_field(self.stress_exp, self.save_matrix_stress)
 
     def save_matrix_stress(self, from_iterate: bool = False) -> None:
         """ Save upscaled matrix stress state to a class attribute """
@@ -745,20 +702,18 @@ class Mechanics(CommonAbstractModel):
     def export_step(self, write_vtk: bool = True) -> None:
         """ Export a visualization step"""
         super().export_step(write_vtk=False)
-        self.save_frac_jump_data()
-        self.save_matrix_displacements()
-        self.save_contact_traction()
-        self.save_matrix_stress()
 
         if write_vtk:
+            self.compute_derived_fields()
             self.viz.write_vtk(data=self.export_fields, time_dependent=False)
 
     def after_simulation(self):
         """ Called after a completed simulation """
+        self.close_export()
         logger.info(f"Solution exported to folder \n {self.params.folder_name}")
 
 
-class ContactMechanicsISC(ContactMechanics):
+class ContactMechanicsISC(LocalDisplacementJump, ContactMechanics):
     """ Implementation of ContactMechanics for ISC
 
     Run a Contact Mechanics model from porepy on the geometry
@@ -825,7 +780,7 @@ class ContactMechanicsISC(ContactMechanics):
         self._network = None
 
         # --- GTS-ISC DATA ---
-        self.isc = gts.ISCData()
+        self.isc = gts.get_isc_data()
 
         # params should have 'folder_name' and 'linear_solver' as keys
         super().__init__(params=params)
@@ -895,6 +850,7 @@ class ContactMechanicsISC(ContactMechanics):
         """
         self.gb = gb
         pp.contact_conditions.set_projections(self.gb)
+        self.set_displacement_jump_operators()
         self.n_frac = gb.get_grids(lambda _g: _g.dim == self.Nd - 1).size
         self.gb.add_node_props(keys=["name"])  # Add 'name' as node prop to all grids.
 
@@ -1103,8 +1059,11 @@ class ContactMechanicsISC(ContactMechanics):
 
     def set_viz(self):
         """ Set exporter for visualization """
-        self.viz = pp.Exporter(
-            self.gb, file_name=self.file_name, folder_name=self.viz_folder_name
+        self.viz = create_exporter(
+            self.gb,
+            file_name=self.file_name,
+            folder_name=self.viz_folder_name,
+            exporter=self.params.get("exporter", "vtk"),
         )
         # list of time steps to export with visualization.
 
@@ -1293,3 +1252,48 @@ class ContactMechanicsISC(ContactMechanics):
         (See Krietsch et al, 2018a)
         """
         return 480.0 * pp.METER - self.length_scale * coords[2]
+
+
+def local_displacement_jump_operator(data_edge: Dict, nd: int) -> sps.csr_matrix:
+    """ Operator from mortar displacements to displacement jumps in local coordinates
+
+    The operator is the product
+        projection.project_tangential_normal * mortar_to_slave_avg * sign_of_mortar_sides
+    It is cached in data_edge, and only rebuilt if the mortar grid or the
+    tangential-normal projection of the edge is replaced (or resized).
+
+    Parameters
+    ----------
+    data_edge : Dict
+        The dictionary on the gb edge. Should contain
+            - a mortar grid
+            - a projection, obtained by calling
+            pp.contact_conditions.set_projections(gb)
+    nd : int
+        Ambient dimension
+
+    Returns
+    -------
+    mortar_to_local_jump : sps.csr_matrix
+        Applied to the mortar displacements, gives the displacement jump,
+        ordered cell-wise, with the normal component last.
+    """
+    mg: pp.MortarGrid = data_edge["mortar_grid"]
+    projection: pp.TangentialNormalProjection = data_edge[
+        "tangential_normal_projection"
+    ]
+    cache_key = (mg, projection, nd, mg.num_cells)
+
+    cached = data_edge.get("mortar_to_local_jump")
+    if cached is not None and cached[0] == cache_key:
+        return cached[1]
+
+    displacement_jump_global_coord = mg.mortar_to_slave_avg(
+        nd=nd
+    ) * mg.sign_of_mortar_sides(nd=nd)
+    project_to_local = projection.project_tangential_normal(int(mg.num_cells / 2))
+    mortar_to_local_jump = sps.csr_matrix(
+        project_to_local * displacement_jump_global_coord
+    )
+    data_edge["mortar_to_local_jump"] = (cache_key, mortar_to_local_jump)
+    return mortar_to_local_jump
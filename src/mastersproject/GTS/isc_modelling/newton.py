@@ -0,0 +1,248 @@
+""" Newton solver with line search and time step cut-back.
+
+A replacement for pp.run_time_dependent_model and porepy's NewtonSolver, for the
+models of this package (see general_model.CommonAbstractModel).
+
+Compared to porepy's solver:
+    * Convergence is measured by the norm of the non-linear residual b - A x,
+      evaluated with the system assembled at the iterate x, rather than by the
+      difference of consecutive iterates. The semismooth contact conditions are
+      part of the residual, so contact is checked too. The norms of each block
+      of the model are recorded by its convergence monitor.
+    * Each Newton update is damped by a backtracking line search on the
+      residual norm. The system assembled at the accepted iterate is reused for
+      the next Newton update, such that an undamped step costs one assembly.
+    * A time step where Newton diverges, or does not converge, is retried with a
+      shorter time step (see cut_time_step of the model). Only when the time step
+      has been cut max_cutbacks times, after_newton_failure is called. Once the
+      step converges, the model continues with the time step from before the
+      cut-backs (see restore_time_step of the model).
+    * The last time step is shortened to end at the end time.
+
+Options (given to NewtonSolver or run_time_dependent_model):
+    max_iterations : int (default: 40)
+        Maximum number of Newton updates per time step
+    convergence_criterion : str {"residual", "increment"} (default: "residual")
+        "increment" uses check_convergence of the model, as porepy does.
+    nl_residual_tol : float (default: 1e-8)
+    nl_residual_atol : float (default: 0)
+        Converged if ||b - A x|| <= nl_residual_tol * scale + nl_residual_atol,
+        where scale is the larger of the initial residual and the initial
+        right hand side norm of the time step.
+    nl_divergence_tol : float (default: 1e5)
+        Diverged if ||b - A x|| > nl_divergence_tol * scale, or if not finite.
+    line_search : bool (default: True)
+    max_line_search_steps : int (default: 5)
+        Maximum number of times a Newton update is halved
+    line_search_armijo : float (default: 1e-4)
+        A damped update with step length s is accepted if it reduces the
+        residual norm by a factor (1 - line_search_armijo * s).
+    max_cutbacks : int (default: 4)
+    cutback_factor : float (default: 0.5)
+        The time step is multiplied by cutback_factor on each cut-back.
+"""
+import logging
+from typing import Dict, List, Tuple
+
+import numpy as np
+import scipy.sparse as sps
+
+logger = logging.getLogger(__name__)
+
+
+class NewtonSolver:
+    """ Newton solver with line search, residual based convergence and cut-back"""
+
+    def __init__(self, params: Dict = None):
+        params = {} if params is None else params
+        self.params = params
+        self.max_iterations: int = params.get("max_iterations", 40)
+        self.convergence_criterion: str = params.get(
+            "convergence_criterion", "residual"
+        )
+        self.nl_residual_tol: float = params.get("nl_residual_tol", 1e-8)
+        self.nl_residual_atol: float = params.get("nl_residual_atol", 0)
+        self.nl_divergence_tol: float = params.get("nl_divergence_tol", 1e5)
+        self.line_search: bool = params.get("line_search", True)
+        self.max_line_search_steps: int = params.get("max_line_search_steps", 5)
+        self.line_search_armijo: float = params.get("line_search_armijo", 1e-4)
+        self.max_cutbacks: int = params.get("max_cutbacks", 4)
+        self.cutback_factor: float = params.get("cutback_factor", 0.5)
+
+        if self.convergence_criterion not in ("residual", "increment"):
+            raise ValueError(
+                f"Unknown convergence criterion {self.convergence_criterion}"
+            )
+
+        # Statistics
+        self.num_cutbacks: int = 0
+        self.num_line_search_steps: int = 0
+
+    def solve(self, setup) -> Tuple[np.ndarray, bool, int]:
+        """ Solve one time step, cutting the time step on failure
+
+        Returns
+        -------
+        solution : np.ndarray
+            Solution vector of the last Newton iterate
+        converged : bool
+        iterations : int
+            Number of Newton updates of the last attempt
+        """
+        init_solution = setup.get_state_vector()
+        time_step = setup.time_step
+        for cutback in range(self.max_cutbacks + 1):
+            if cutback > 0:
+                setup.cut_time_step(init_solution, self.cutback_factor)
+                self.num_cutbacks += 1
+                logger.warning(
+                    f"Newton failed. Retry with time step {setup.time_step:.2e} "
+                    f"(cut-back {cutback} of {self.max_cutbacks})"
+                )
+            setup.before_newton_loop()
+            solution, converged, diverged, errors = self.newton_loop(
+                setup, init_solution
+            )
+            iterations = len(errors) - 1
+            if converged:
+                setup.after_newton_convergence(solution, errors, iterations)
+                if cutback > 0:
+                    setup.restore_time_step(time_step)
+                return solution, True, iterations
+
+        setup.after_newton_failure(solution, errors, iterations)
+        return solution, False, iterations
+
+    def newton_loop(
+        self, setup, init_solution: np.ndarray
+    ) -> Tuple[np.ndarray, bool, bool, List[float]]:
+        """ Newton iterations of one time step
+
+        Returns
+        -------
+        solution : np.ndarray
+            Last iterate
+        converged, diverged : bool
+        errors : List[float]
+            Residual norm of the initial iterate and after each update
+        """
+        solution = init_solution
+        A, b = self._assemble(setup)
+        residual = np.linalg.norm(b - A @ solution)
+        scale = max(residual, np.linalg.norm(b))
+        errors = [residual]
+        logger.info(f"Initial non-linear residual {residual:.2e}")
+
+        for iteration in range(1, self.max_iterations + 1):
+            update = setup.solve_linear_system(A, b) - solution
+            trial, A, b, r = self.line_search_step(setup, solution, update, residual)
+            trial_residual = np.linalg.norm(r)
+            errors.append(trial_residual)
+            setup.convergence_monitor.evaluate(
+                trial, solution, init_solution, residual=r, time=setup.time
+            )
+            relative = trial_residual / scale if scale > 0 else trial_residual
+            logger.info(
+                f"Newton iteration {iteration}: "
+                f"residual {trial_residual:.2e} (relative {relative:.2e})"
+            )
+
+            if not np.isfinite(trial_residual) or (
+                trial_residual > self.nl_divergence_tol * scale
+            ):
+                return trial, False, True, errors
+
+            if self.convergence_criterion == "residual":
+                tol = self.nl_residual_tol * scale + self.nl_residual_atol
+                converged = trial_residual <= tol
+            else:
+                _, converged, diverged = setup.check_convergence(
+                    trial, solution, init_solution, self.params
+                )
+                if diverged:
+                    return trial, False, True, errors
+
+            solution, residual = trial, trial_residual
+            if converged:
+                return solution, True, False, errors
+
+        return solution, False, False, errors
+
+    def line_search_step(
+        self, setup, solution: np.ndarray, update: np.ndarray, residual: float
+    ) -> Tuple[np.ndarray, sps.spmatrix, np.ndarray, np.ndarray]:
+        """ Damp the Newton update by backtracking on the residual norm
+
+        The model is left at the returned iterate, with the system assembled there.
+        If no step length reduces the residual sufficiently, the shortest step
+        is taken.
+
+        Returns
+        -------
+        trial : np.ndarray
+            The accepted iterate
+        A, b : sps.spmatrix, np.ndarray
+            System assembled at the accepted iterate
+        trial_residual : np.ndarray
+            Residual b - A x at the accepted iterate
+        """
+        step = 1.0
+        max_steps = self.max_line_search_steps if self.line_search else 0
+        for halvings in range(max_steps + 1):
+            trial = solution + step * update
+            setup.after_newton_iteration(trial)
+            A, b = self._assemble(setup)
+            trial_residual = b - A @ trial
+            norm = np.linalg.norm(trial_residual)
+            if norm <= (1 - self.line_search_armijo * step) * residual:
+                break
+            if halvings < max_steps:
+                step /= 2
+                self.num_line_search_steps += 1
+        if step < 1:
+            logger.info(f"Line search: step length {step:.2e}")
+        return trial, A, b, trial_residual
+
+    @staticmethod
+    def _assemble(setup) -> Tuple[sps.spmatrix, np.ndarray]:
+        """ Update the non-linear terms and assemble at the current iterate"""
+        setup.before_newton_iteration()
+        return setup.assemble_matrix_rhs()
+
+
+def run_time_dependent_model(setup, params: Dict = None) -> NewtonSolver:
+    """ Run a time dependent model with NewtonSolver
+
+    Drop-in replacement of pp.run_time_dependent_model.
+
+    Parameters
+    ----------
+    setup : CommonAbstractModel
+        The model
+    params : Dict
+        Options of the Newton solver, see the module docstring.
+
+    Returns
+    -------
+    solver : NewtonSolver
+        The solver, for its statistics.
+    """
+    setup.prepare_simulation()
+    solver = NewtonSolver(params)
+
+    # Ignore a remaining time span that is only round-off
+    while setup.end_time - setup.time > 1e-10 * setup.time_step:
+        # Do not step past the end time
+        setup.time_step = min(setup.time_step, setup.end_time - setup.time)
+        setup.time += setup.time_step
+        logger.info(
+            f"Solve for time {setup.time:.2e} with time step {setup.time_step:.2e}"
+        )
+        solver.solve(setup)
+
+    setup.after_simulation()
+    logger.info(
+        f"Simulation done. {solver.num_cutbacks} time step cut-backs, "
+        f"{solver.num_line_search_steps} line search step reductions."
+    )
+    return solver
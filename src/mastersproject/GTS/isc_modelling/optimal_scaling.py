@@ -1,5 +1,7 @@
 """ method to find optimal scaling of a problem """
+import logging
 from pathlib import Path
+from typing import Dict, Optional
 
 import numpy as np
 import pandas as pd
@@ -10,64 +12,104 @@ from GTS import (
     stress_tensor,
     GrimselGranodiorite,
 )
+from GTS.isc_modelling.diagnostics import (
+    condition_number_1norm,
+    diagonal_ratio,
+    row_sum_ratio,
+)
+from GTS.isc_modelling.sweep import run_sweep
+
+logger = logging.getLogger(__name__)
 
+_results_path = Path(__file__).parent / "results/test_optimal_scaling"
 
-def best_cond_numb(initial_guess: np.array = None) -> pd.DataFrame:
+
+def best_cond_numb(
+    initial_guess: np.array = None,
+    output_file: Optional[Path] = None,
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
     """ Find best condition numbers
 
     initial_guess = (length_scale, log10(scalar_scale))
-        if not set, then default is length_scale=0.05, scalar_scale=1e+9.
+        if not set, then default is length_scale=0.05, scalar_scale=1e+6.
+
+    The points are evaluated in parallel by max_workers processes (default: all
+    cores), and the results are appended to output_file as they complete. If the
+    study is interrupted, calling it again only evaluates the missing points.
+    The mesh is created once per length scale, and shared through the mesh cache.
     """
-    if not initial_guess:
+    if initial_guess is None:
         initial_guess = np.array([0.05, 6])
     ls_0, log_ss_0 = initial_guess
+    if output_file is None:
+        output_file = _results_path / "cond_numb.csv"
 
     length_scales = np.array((1 / 4, 1 / 2, 1, 2, 4)) * ls_0
     log_scalar_scales = np.array((-2, -1, 0, 1, 2)) + log_ss_0
 
-    results = pd.DataFrame(columns=["ls", "log_ss", "cond_pp", "cond_umfpack"])
-    for ls in length_scales:
-        for log_ss in log_scalar_scales:
-            A = assemble_isc_matrix(np.array([ls, log_ss]))
-            try:
-                cond_pp = condition_number_porepy(A)
-                cond_umfpack = condition_number_umfpack(A)
-            except ValueError as e:
-                cond_pp = np.nan
-                cond_umfpack = np.nan
-                print(e)
-            v = {
-                "ls": ls,
-                "log_ss": log_ss,
-                "cond_pp": cond_pp,
-                "cond_umfpack": cond_umfpack,
-            }
-            results = results.append(v, ignore_index=True)
-
-    return results
+    points = [
+        {"ls": float(ls), "log_ss": float(log_ss)}
+        for ls in length_scales
+        for log_ss in log_scalar_scales
+    ]
+    return run_sweep(
+        _cond_numb,
+        points,
+        output_file=output_file,
+        columns=["cond_1", "cond_pp", "cond_umfpack"],
+        max_workers=max_workers,
+        warmup=_create_grid,
+        warmup_by="ls",
+    )
+
+
+def _cond_numb(point: Dict[str, float]) -> Dict[str, float]:
+    """ Condition number estimates of the isc matrix at a sweep point
+
+    cond_1 is the estimated 1-norm condition number. cond_pp and cond_umfpack are
+    the row sum and diagonal ratios of the matrix.
+    """
+    A = assemble_isc_matrix(np.array([point["ls"], point["log_ss"]]))
+    return {
+        "cond_1": condition_number_1norm(A),
+        "cond_pp": row_sum_ratio(A),
+        "cond_umfpack": diagonal_ratio(A),
+    }
+
+
+def _create_grid(length_scale: float) -> None:
+    """ Populate the mesh cache for a length scale"""
+    setup = ISCBiotContactMechanics(isc_parameters(length_scale, scalar_scale=1))
+    setup.create_grid()
 
 
 def assemble_isc_matrix(values):
     """ Optimize the isc setup
 
     values = (length_scale, log10(scalar_scale))
-
-    if return_both is set, return both estimates for condition number.
     """
     length_scale, log_scalar_scale = values  # Component values of input
     scalar_scale = np.float_power(10, log_scalar_scale)
 
+    params = isc_parameters(length_scale, scalar_scale)
+    setup = ISCBiotContactMechanics(params)
+    setup.prepare_simulation()
+
+    A, _ = setup.assemble_matrix_rhs()
+    return A
+
+
+def isc_parameters(length_scale: float, scalar_scale: float) -> BiotParameters:
+    """ Parameters of the isc setup used in the scaling study"""
     _sz = 40
     mesh_args = {
         "mesh_size_frac": _sz,
         "mesh_size_min": 0.2 * _sz,
         "mesh_size_bound": 3 * _sz,
     }
-    here = (
-        Path(__file__).parent
-        / f"results/test_optimal_scaling/ls{length_scale:.2e}_ss{scalar_scale:.2e}"
-    )
-    params = BiotParameters(
+    here = _results_path / f"ls{length_scale:.2e}_ss{scalar_scale:.2e}"
+    return BiotParameters(
         # Base
         length_scale=length_scale,
         scalar_scale=scalar_scale,
@@ -77,28 +119,10 @@ def assemble_isc_matrix(values):
         # Geometry
         shearzone_names=["S1_2", "S3_1"],
         mesh_args=mesh_args,
+        mesh_cache_dir=_results_path / "mesh_cache",
         # Mechanics
         stress=stress_tensor(),
         dilation_angle=(np.pi / 180) * 5,
         # Flow
         frac_transmissivity=[1e-9, 3.7e-7],
     )
-    setup = ISCBiotContactMechanics(params)
-    setup.prepare_simulation()
-
-    A, _ = setup.assembler.assemble_matrix_rhs()
-    return A
-
-
-def condition_number_porepy(A):
-    row_sum = np.sum(np.abs(A), axis=1)
-    return np.max(row_sum) / np.min(row_sum)
-
-
-def condition_number_umfpack(A):
-    diag = np.abs(A.diagonal())
-    cond = np.min(diag) / np.max(diag)
-    if np.isclose(cond, 0):
-        return np.inf
-    else:
-        return 1 / cond
@@ -10,7 +10,8 @@ import pendulum
 from pydantic import BaseModel, validator
 
 import porepy as pp
-from GTS import ISCData
+from GTS import get_isc_data
+from GTS.isc_modelling.stimulation import StimulationProtocol, TimeStepController
 
 logger = logging.getLogger(__name__)
 
@@ -96,10 +97,30 @@ class BaseParameters(BaseModel):
         Determine the folder to store all results
     viz_file_name : Path
         base file name of all visualization files (.vtu, .pvd)
-    solver : str
+    linear_solver : str : {"direct", "iterative"}
         name of linear solver
+    krylov_tol, krylov_maxiter, krylov_restart : float, int, int
+        relative tolerance, max iterations and restart length of GMRES.
+        Only used by the iterative linear solver.
+    estimate_condition_number : bool
+        Estimate the 1-norm condition number after each direct solve.
+        The estimate reuses the factorization, but needs a few extra solves.
+    exporter : str : {"vtk", "hdf5"}
+        "vtk": One vtu file per grid and time step, and a pvd file.
+        "hdf5": Geometry once, and all time steps in compressed datasets of one
+        h5 file, described by an xdmf file. Also exports face stresses.
+    async_export, export_queue_size : bool, int
+        Write the exported steps in a background thread, with at most
+        export_queue_size steps waiting to be written.
     time, time_step, end_time : float
         time stepping
+    checkpoint_folder : Path, Optional
+        If set, store the grid and the state after each converged time step here.
+        Steps are appended to existing checkpoints in the folder.
+    restart_folder, restart_step : Path, int, Optional
+        If set, restart the simulation from the given step (default: the last step)
+        of a checkpoint folder, instead of creating a grid and initial conditions.
+        The time is set to the time of the step.
     """
 
     # Scaling
@@ -115,12 +136,27 @@ class BaseParameters(BaseModel):
 
     # Linear solver
     linear_solver: str = "direct"
+    # Options for linear_solver = "iterative"
+    krylov_tol: float = 1e-8
+    krylov_maxiter: int = 500
+    krylov_restart: int = 50
+    estimate_condition_number: bool = False
+
+    # Visualization
+    exporter: str = "vtk"
+    async_export: bool = False
+    export_queue_size: int = 2
 
     # Time-stepping
     time: float = 0
     time_step: float = 1
     end_time: float = 1
 
+    # Checkpointing and restart
+    checkpoint_folder: Optional[Path] = None
+    restart_folder: Optional[Path] = None
+    restart_step: Optional[int] = None
+
     # Fluid and temperature. Default is ISC temp (11 C).
     fluid: pp.UnitFluid = pp.Water(theta_ref=11)
 
@@ -181,6 +217,13 @@ class GeometryParameters(BaseParameters):
         "mesh_size_min": 0.2 * _sz,
         "mesh_size_bound": 3 * _sz,
     }
+    # Directory of the on-disk mesh cache. Set to None to always mesh from scratch.
+    mesh_cache_dir: Optional[Path] = None
+    # Monte Carlo sample of the shear-zone geometry. If geometry_seed is set, the
+    # borehole intersection depths are perturbed with standard deviation
+    # depth_uncertainty [m]. See GTS.ISC_data.geometry_sampling.
+    depth_uncertainty: float = 0
+    geometry_seed: Optional[int] = None
 
     @property
     def n_frac(self):
@@ -195,10 +238,11 @@ class MechanicsParameters(GeometryParameters):
     # for details on dilation angle
     dilation_angle: float = 0
 
-    # Parameters for Newton solver
+    # Parameters for Newton solver.
+    # The tolerance bounds the norms of the Newton updates (see ConvergenceMonitor)
     newton_options = {
         "max_iterations": 40,
-        "nl_convergence_tol": 1e-10,
+        "nl_convergence_tol": 1e-5,
         "nl_divergence_tol": 1e5,
     }
 
@@ -218,7 +262,14 @@ class FlowParameters(GeometryParameters):
         define the borehole and shearzone to inject into
     well_cells : method(FlowParameters, pp.GridBucket) -> None
         A method to tag non-zero injection cells
-    injection_rate
+    injection_mode : str : {"rate", "pressure"}
+        "rate": Inject injection_rate [l/s] as a source in the injection cells.
+        "pressure": Fix the pressure [Pa] in the injection cells to injection_pressure.
+    injection_rate, injection_pressure : float
+    pressure_elimination : str : {"row", "symmetric"}
+        How the fixed injection pressures are imposed on the linear system.
+        "row" replaces the rows of the injection cells. "symmetric" also moves
+        their columns to the right hand side.
     """
 
     source_scalar_borehole_shearzone: Optional[Dict[str, str]] = {
@@ -227,7 +278,10 @@ class FlowParameters(GeometryParameters):
     }
 
     well_cells: Callable[["FlowParameters", pp.GridBucket], None] = None
+    injection_mode: str = "rate"
     injection_rate: float = 0
+    injection_pressure: float = 0
+    pressure_elimination: str = "row"
 
     # Set transmissivity in fractures
     frac_transmissivity: Union[float, List[float]]
@@ -293,13 +347,36 @@ class FlowParameters(GeometryParameters):
             assert v["shearzone"] in values["shearzone_names"]
         return v
 
+    @validator("injection_mode")
+    def validate_injection_mode(cls, v):  # noqa
+        assert v in ("rate", "pressure"), f"Unknown injection mode {v}"
+        return v
+
+    @validator("pressure_elimination")
+    def validate_pressure_elimination(cls, v):  # noqa
+        assert v in ("row", "symmetric"), f"Unknown pressure elimination {v}"
+        return v
+
 
 class BiotParameters(FlowParameters, MechanicsParameters):
-    """ Parameters for the Biot problem with contact mechanics"""
+    """ Parameters for the Biot problem with contact mechanics
+
+    stimulation_protocol : StimulationProtocol, Optional
+        Injection schedule of the injection well (the borehole of
+        source_scalar_borehole_shearzone). If set, it replaces injection_mode,
+        injection_rate and injection_pressure.
+    time_step_controller : TimeStepController, Optional
+        If set, the time step adapts to the Newton iterations and to the changes
+        of the stimulation protocol. time_step is the first time step.
+    """
 
     # Selvadurai (2019): Biot aritcle --> Table 9., on Pahl et. al (1989), mean of aL, aU.
     alpha: float = 0.57
 
+    # Injection schedule and adaptive time stepping
+    stimulation_protocol: Optional[StimulationProtocol] = None
+    time_step_controller: Optional[TimeStepController] = None
+
 
 # --- Flow injection cell taggers ---
 
@@ -459,7 +536,7 @@ def _shearzone_borehole_intersection(
 ):
     """ Find the cell which is the intersection of a borehole and a shear zone"""
     # Compute the intersections between boreholes and shear zones
-    df = ISCData().borehole_plane_intersection()
+    df = get_isc_data().borehole_plane_intersection()
 
     # Get the UNSCALED coordinates of the borehole - shearzone intersection.
     _mask = (df.shearzone == shearzone) & (df.borehole == borehole)
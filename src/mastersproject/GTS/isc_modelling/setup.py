@@ -179,7 +179,10 @@ def run_abstract_model(
         Only tested for subclasses of ContactMechanicsISC
     run_model_method : Callable
         Which method to run model with
-        Typically pp.run_stationary_model or pp.run_time_dependent_model
+        Typically pp.run_stationary_model or pp.run_time_dependent_model.
+        The models of this module derive from porepy's models, and lack the hooks
+        of GTS.isc_modelling.newton.run_time_dependent_model, which is used for
+        models derived from CommonAbstractModel.
     params : dict (Default: None)
         Any non-default parameters to use
     newton_params : dict (Default: None)
@@ -198,7 +201,7 @@ def run_abstract_model(
     # -------------------------
     default_options = {  # Parameters for Newton solver.
         "max_iterations": 40,
-        "nl_convergence_tol": 1e-6,
+        "nl_convergence_tol": 1e-3,  # Bounds norms, not squared norms
         "nl_divergence_tol": 1e5,
     }
     if not newton_params:
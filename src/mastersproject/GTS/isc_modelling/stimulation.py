@@ -0,0 +1,217 @@
+""" Stimulation protocols and adaptive time stepping.
+
+A stimulation protocol is a piecewise constant injection schedule for one or more
+wells. Each phase of a schedule starts at a given time, and injects either at a
+given rate or at a given pressure until the next phase starts.
+
+The time step controller adapts the time step to the protocol and to the
+non-linear solver: steps are short when the injection changes (e.g. at a rate
+step or shut-in), grow during quasi-steady periods where Newton converges in few
+iterations, and shrink when Newton needs many iterations. Steps never cross a
+change of the protocol.
+"""
+import logging
+from typing import Dict, Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+
+import porepy as pp
+
+logger = logging.getLogger(__name__)
+
+
+class StimulationProtocol:
+    """ Piecewise constant injection schedules of one or more wells
+
+    Rates are given in [l/s] and pressures in [Pa], unscaled.
+
+    Example: Inject 10 l/min into INJ1 for 10 minutes, then shut in:
+        protocol = StimulationProtocol()
+        protocol.add_well(
+            "INJ1", start_times=[0, 10 * pp.MINUTE], values=[10 / pp.MINUTE, 0]
+        )
+    """
+
+    def __init__(self):
+        # Start times, values and modes of the phases of each well
+        self._schedules: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def add_well(
+        self,
+        well: str,
+        start_times: Sequence[float],
+        values: Sequence[float],
+        modes: Union[str, Sequence[str]] = "rate",
+    ) -> "StimulationProtocol":
+        """ Set the schedule of a well
+
+        Parameters
+        ----------
+        well : str
+            Name of the well (borehole)
+        start_times : Sequence[float]
+            Increasing start time of each phase [s]. The first phase also applies
+            before its start time.
+        values : Sequence[float]
+            Injection rate [l/s] or pressure [Pa] of each phase
+        modes : str or Sequence[str] : {"rate", "pressure"}
+            Whether each phase is rate or pressure controlled.
+
+        Returns
+        -------
+        self : StimulationProtocol
+        """
+        start_times = np.asarray(start_times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        modes = np.broadcast_to(np.asarray(modes, dtype=object), values.shape)
+        if start_times.shape != values.shape or start_times.ndim != 1:
+            raise ValueError("Give one start time and one value for each phase")
+        if np.any(np.diff(start_times) <= 0):
+            raise ValueError("The start times of the phases must increase")
+        unknown = set(modes) - {"rate", "pressure"}
+        if unknown:
+            raise ValueError(f"Unknown injection modes {unknown}")
+        self._schedules[well] = (start_times, values, modes.copy())
+        return self
+
+    @property
+    def wells(self) -> List[str]:
+        return list(self._schedules.keys())
+
+    def phase(self, well: str, time: float) -> int:
+        """ Index of the phase of a well at a given time"""
+        start_times = self._schedule(well)[0]
+        return max(int(np.searchsorted(start_times, time, side="right")) - 1, 0)
+
+    def value(self, well: str, time: float) -> float:
+        """ Injection rate [l/s] or pressure [Pa] of a well at a given time"""
+        return float(self._schedule(well)[1][self.phase(well, time)])
+
+    def mode(self, well: str, time: float) -> str:
+        """ Injection mode {"rate", "pressure"} of a well at a given time"""
+        return self._schedule(well)[2][self.phase(well, time)]
+
+    @property
+    def change_times(self) -> np.ndarray:
+        """ Sorted times where the injection of any well changes"""
+        times = [s[0][1:] for s in self._schedules.values()]
+        return np.unique(np.concatenate(times)) if times else np.array([])
+
+    @classmethod
+    def hydro_shearing_cycle_3(cls, well: str = "INJ1") -> "StimulationProtocol":
+        """ Injection cycle 3 of the hydro-shearing protocol
+
+        Doetsch et al (2018) [see e.g. p. 78/79 or App. J]:
+            - Four injection steps of 10, 15, 20 and 25 l/min
+            - Each step lasts 10 minutes.
+            - Then, the interval is shut-in and monitored for 40 minutes.
+        """
+        start_times = np.array([0, 10, 20, 30, 40]) * pp.MINUTE
+        rates = np.array([10, 15, 20, 25, 0]) / pp.MINUTE
+        return cls().add_well(well, start_times, rates)
+
+    def _schedule(self, well: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        try:
+            return self._schedules[well]
+        except KeyError:
+            raise KeyError(f"No schedule for well {well}. Wells: {self.wells}")
+
+
+class TimeStepController:
+    """ Adaptive time steps, driven by Newton iterations and stimulation changes
+
+    After each converged time step, the next step is
+        * multiplied by growth_factor if Newton used at most min_iterations,
+        * multiplied by reduction_factor if Newton used at least max_iterations,
+        * reset to (at most) initial_step if the injection changed,
+    and bounded by min_step and max_step. Finally, the step is shortened to end
+    at the next change of the injection (or the end time). If the step would leave
+    a short remainder before the change, the remainder is split in two.
+    """
+
+    def __init__(
+        self,
+        initial_step: float,
+        min_step: float,
+        max_step: float,
+        growth_factor: float = 2.0,
+        reduction_factor: float = 0.5,
+        min_iterations: int = 4,
+        max_iterations: int = 10,
+    ):
+        if not 0 < min_step <= initial_step <= max_step:
+            raise ValueError("Require 0 < min_step <= initial_step <= max_step")
+        self.initial_step = initial_step
+        self.min_step = min_step
+        self.max_step = max_step
+        self.growth_factor = growth_factor
+        self.reduction_factor = reduction_factor
+        self.min_iterations = min_iterations
+        self.max_iterations = max_iterations
+
+    def next_step(
+        self,
+        time: float,
+        time_step: float,
+        iterations: int,
+        change_times: Iterable[float] = (),
+        end_time: float = np.inf,
+    ) -> float:
+        """ Size of the next time step, after a converged step ending at time
+
+        Parameters
+        ----------
+        time : float
+            End time of the converged step
+        time_step : float
+            Size of the converged step
+        iterations : int
+            Number of Newton iterations of the converged step
+        change_times : Iterable[float]
+            Times where the injection changes. See StimulationProtocol.change_times
+        end_time : float
+            End time of the simulation
+
+        Returns
+        -------
+        time_step : float
+        """
+        change_times = np.asarray(list(change_times), dtype=float)
+        if iterations <= self.min_iterations:
+            step = time_step * self.growth_factor
+        elif iterations >= self.max_iterations:
+            step = time_step * self.reduction_factor
+        else:
+            step = time_step
+
+        # Resolve the transient after a change of the injection
+        if np.any(np.isclose(change_times, time, rtol=0, atol=self._tolerance(time))):
+            step = min(step, self.initial_step)
+
+        step = float(np.clip(step, self.min_step, self.max_step))
+        return self.limit(time, step, change_times, end_time)
+
+    def limit(
+        self,
+        time: float,
+        time_step: float,
+        change_times: Iterable[float] = (),
+        end_time: float = np.inf,
+    ) -> float:
+        """ Shorten a time step such that it does not cross the next change
+
+        Parameters: See next_step
+        """
+        change_times = np.asarray(list(change_times), dtype=float)
+        upcoming = change_times[change_times > time + self._tolerance(time)]
+        next_stop = min(upcoming.min(initial=np.inf), end_time)
+        remaining = next_stop - time
+        if time_step >= remaining - self.min_step:
+            return remaining
+        if time_step > remaining / 2:
+            return remaining / 2
+        return time_step
+
+    def _tolerance(self, time: float) -> float:
+        """ Times closer than this are considered equal"""
+        return 1e-6 * self.min_step + 1e-12 * abs(time)
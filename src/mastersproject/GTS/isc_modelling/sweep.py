@@ -0,0 +1,159 @@
+""" Parallel, resumable parameter sweeps.
+
+A sweep evaluates a function on a list of parameter points. The points are
+distributed over a process pool, and each result is appended to a csv file as
+soon as it is available. If the sweep is interrupted, running it again with the
+same output file only evaluates the points that are not already in the file.
+"""
+import csv
+import logging
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+def run_sweep(
+    evaluate: Callable[[Dict[str, Any]], Dict[str, Any]],
+    points: List[Dict[str, Any]],
+    output_file: Path,
+    columns: List[str],
+    max_workers: Optional[int] = None,
+    warmup: Optional[Callable[[Any], None]] = None,
+    warmup_by: Optional[str] = None,
+    load_results: bool = True,
+) -> Optional[pd.DataFrame]:
+    """ Evaluate a function on a list of parameter points in parallel
+
+    Each row of the output file holds the point, the result columns and an
+    'error' column, which is empty for successful evaluations.
+    Points that have a successful row in the output file are skipped.
+    Failed points are evaluated again.
+
+    Parameters
+    ----------
+    evaluate : Callable
+        Function of a point, returning a dictionary with (at least) the keys
+        in columns. Must be picklable, i.e. defined at module level.
+    points : List[Dict[str, Any]]
+        Parameter points. All points must have the same keys.
+    output_file : Path
+        csv file the results are appended to.
+    columns : List[str]
+        Names of the result values returned by evaluate.
+    max_workers : int, Optional
+        Number of worker processes. If 1, the points are evaluated in this process.
+        If None, use all available cores.
+    warmup : Callable, Optional
+        Function called once per distinct value of point[warmup_by] before the
+        points are evaluated. Use this to prepare expensive shared resources,
+        e.g. populating the mesh cache once per length scale.
+    warmup_by : str, Optional
+        Key of the points passed to warmup.
+    load_results : bool
+        Read and return the output file. Set to False for large sweeps whose
+        output file is processed in chunks.
+
+    Returns
+    -------
+    results : pd.DataFrame or None
+        All rows of the output file, if load_results.
+    """
+    if not points:
+        raise ValueError("No points to evaluate")
+    keys = list(points[0].keys())
+    fieldnames = keys + list(columns) + ["error"]
+    output_file = Path(output_file)
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+
+    completed = _completed_points(output_file, keys, fieldnames)
+    pending = [p for p in points if _point_key(p, keys) not in completed]
+    logger.info(
+        f"Sweep of {len(points)} points: {len(points) - len(pending)} already "
+        f"completed, {len(pending)} to evaluate."
+    )
+
+    if pending:
+        tic = time.time()
+        with open(output_file, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+            if f.tell() == 0:
+                writer.writeheader()
+
+            for i, (point, result, error) in enumerate(
+                _evaluate_all(evaluate, pending, max_workers, warmup, warmup_by)
+            ):
+                row = {**point, **result, "error": error}
+                writer.writerow(row)
+                f.flush()
+                logger.info(
+                    f"Sweep point {i + 1}/{len(pending)} done: {point}. "
+                    f"Elapsed time {time.time() - tic:.2e}"
+                )
+
+    if not load_results:
+        return None
+    return pd.read_csv(output_file)
+
+
+def _evaluate_all(
+    evaluate: Callable,
+    points: List[Dict],
+    max_workers: Optional[int],
+    warmup: Optional[Callable],
+    warmup_by: Optional[str],
+):
+    """ Yield (point, result, error) in order of completion"""
+    warmup_values = []
+    if warmup is not None:
+        for p in points:
+            if p[warmup_by] not in warmup_values:
+                warmup_values.append(p[warmup_by])
+
+    if max_workers == 1:
+        for value in warmup_values:
+            warmup(value)
+        for p in points:
+            yield _safe_evaluate(evaluate, p)
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        # Finish all warmups before evaluating points that depend on them.
+        for future in [executor.submit(warmup, v) for v in warmup_values]:
+            future.result()
+        futures = [executor.submit(_safe_evaluate, evaluate, p) for p in points]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def _safe_evaluate(evaluate: Callable, point: Dict) -> Tuple[Dict, Dict, str]:
+    """ Evaluate a point. Exceptions are returned as an error message."""
+    try:
+        return point, evaluate(point), ""
+    except Exception as e:
+        logger.error(f"Sweep point {point} failed:\n{traceback.format_exc()}")
+        return point, {}, f"{type(e).__name__}: {e}"
+
+
+def _completed_points(output_file: Path, keys: List[str], fieldnames: List[str]):
+    """ Keys of the successfully evaluated points in the output file"""
+    if not output_file.is_file() or output_file.stat().st_size == 0:
+        return set()
+    with open(output_file, newline="") as f:
+        reader = csv.DictReader(f)
+        if reader.fieldnames != fieldnames:
+            raise ValueError(
+                f"Columns of existing output file {output_file} ({reader.fieldnames}) "
+                f"do not match the sweep ({fieldnames})"
+            )
+        return {_point_key(row, keys) for row in reader if not row["error"]}
+
+
+def _point_key(point: Dict, keys: List[str]) -> Tuple[str, ...]:
+    """ Hashable key of a point, consistent with the csv representation"""
+    return tuple(str(point[k]) for k in keys)
@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+import scipy.sparse as sps
+
+from GTS.isc_modelling.assembly import PersistentMatrix, eliminate_dofs
+
+
+def _random_coo(n, density, seed):
+    A = sps.random(n, n, density=density, random_state=seed) + sps.eye(n)
+    return A.tocoo()
+
+
+class TestPersistentMatrix:
+    def test_values_are_updated_in_place(self):
+        rng = np.random.default_rng(0)
+        pattern = _random_coo(50, 0.1, seed=1)
+        persistent = PersistentMatrix()
+
+        A = persistent.update(pattern)
+        indices, data = A.indices, A.data
+        for _ in range(3):
+            B = pattern.copy()
+            B.data = rng.normal(size=B.nnz)
+            A = persistent.update(B)
+            assert np.allclose(A.toarray(), B.toarray())
+            # Same matrix and arrays; no new slot map
+            assert A.indices is indices and A.data is data
+        assert persistent.num_pattern_updates == 1
+        assert persistent.num_slot_maps == 1
+
+    def test_pattern_grows_to_union(self):
+        pattern = _random_coo(50, 0.1, seed=1)
+        persistent = PersistentMatrix()
+        nnz = persistent.update(pattern).nnz
+
+        # A subset of the pattern is mapped into the existing pattern
+        keep = np.arange(pattern.nnz) % 2 == 0
+        subset = sps.coo_matrix(
+            (pattern.data[keep], (pattern.row[keep], pattern.col[keep])),
+            shape=pattern.shape,
+        )
+        A = persistent.update(subset)
+        assert A.nnz == nnz
+        assert np.allclose(A.toarray(), subset.toarray())
+        assert persistent.num_pattern_updates == 1
+
+        # New entries grow the pattern. Duplicates are summed.
+        extra = sps.coo_matrix(([1.0, 2.0], ([0, 0], [49, 49])), shape=(50, 50))
+        A = persistent.update(extra)
+        assert persistent.num_pattern_updates == 2
+        assert A[0, 49] == 3.0
+        assert A.has_sorted_indices
+
+    def test_pattern_contains_diagonal(self):
+        """ Constraints can be imposed in place also on rows without a diagonal"""
+        A = sps.coo_matrix(([1.0, 2.0], ([0, 1], [1, 0])), shape=(3, 3))
+        persistent = PersistentMatrix()
+        A = persistent.update(A)
+        assert np.all(A.indices[A.indptr[:-1]] <= np.arange(3))
+        assert A.nnz == 5
+
+        data = A.data
+        A, b = eliminate_dofs(A, np.ones(3), [0, 2], [4.0, 5.0])
+        assert A is persistent.matrix and A.data is data
+        assert np.allclose(A.toarray(), [[1, 0, 0], [2, 0, 0], [0, 0, 1]])
+        assert np.allclose(b, [4, 1, 5])
+
+
+@pytest.mark.parametrize("symmetric", [False, True])
+def test_eliminate_dofs(symmetric):
+    """ The constrained system equals the system reduced to the free dofs"""
+    n = 40
+    A = (sps.random(n, n, density=0.2, random_state=2) + 5 * sps.eye(n)).tocsr()
+    A.sort_indices()
+    b = np.random.default_rng(0).normal(size=n)
+    dofs = np.array([3, 17, 30])
+    values = np.array([1.0, 2.0, 3.0])
+
+    free = np.setdiff1d(np.arange(n), dofs)
+    dense = A.toarray()
+    known = np.zeros(n)
+    known[dofs] = values
+    known[free] = np.linalg.solve(
+        dense[np.ix_(free, free)], b[free] - dense[np.ix_(free, dofs)] @ values
+    )
+
+    nnz = A.nnz
+    A, b = eliminate_dofs(A, b, dofs, values, symmetric=symmetric)
+    assert A.nnz == nnz
+    assert np.allclose(np.linalg.solve(A.toarray(), b), known)
+    if symmetric:
+        assert np.allclose(A.toarray()[np.ix_(free, dofs)], 0)
+
+
+def test_eliminate_dofs_requires_diagonal():
+    A = sps.csr_matrix(([1.0, 2.0], ([0, 1], [1, 0])), shape=(2, 2))
+    with pytest.raises(ValueError):
+        eliminate_dofs(A, np.ones(2), [0], [1.0])
@@ -0,0 +1,102 @@
+import numpy as np
+
+import porepy as pp
+from GTS.isc_modelling.checkpoint import Checkpoint
+
+
+def _fractured_gb():
+    """ 2d grid bucket with one fracture, and nested states on grids and edges"""
+    gb = pp.meshing.cart_grid([np.array([[1, 3], [2, 2]])], [4, 4], physdims=[4, 4])
+    gb.assign_node_ordering()
+    for g, d in gb:
+        d[pp.PARAMETERS] = {"flow": {"source": np.ones(g.num_cells)}}
+        d[pp.STATE] = {
+            "p": np.zeros(g.num_cells),
+            "p_exp": np.zeros(g.num_cells),
+            "previous_iterate": {"p": np.zeros(g.num_cells)},
+        }
+    for e, d in gb.edges():
+        mg = d["mortar_grid"]
+        d[pp.STATE] = {
+            "mortar_p": np.zeros(mg.num_cells),
+            "previous_iterate": {"mortar_p": np.zeros(mg.num_cells)},
+        }
+    return gb
+
+
+def _set_state(gb, value):
+    for _, d in gb:
+        d[pp.STATE]["p"][:] = value
+        d[pp.STATE]["previous_iterate"]["p"][:] = value - 1
+    for _, d in gb.edges():
+        d[pp.STATE]["mortar_p"][:] = 2 * value
+
+
+class TestCheckpoint:
+    def test_grid_is_stored_without_state(self, tmp_path):
+        gb = _fractured_gb()
+        checkpoint = Checkpoint(tmp_path)
+        checkpoint.save_grid(gb)
+
+        # The original grid bucket is left intact
+        for _, d in gb:
+            assert pp.STATE in d
+            assert pp.PARAMETERS in d
+
+        loaded = checkpoint.load_grid()
+        assert loaded.num_graph_nodes() == gb.num_graph_nodes()
+        assert loaded.num_graph_edges() == gb.num_graph_edges()
+        for _, d in loaded:
+            assert pp.STATE not in d
+            assert pp.PARAMETERS not in d
+
+    def test_restore_steps(self, tmp_path):
+        gb = _fractured_gb()
+        checkpoint = Checkpoint(tmp_path)
+        checkpoint.save_grid(gb)
+        for step, value in enumerate([1.0, 2.0, 3.0]):
+            _set_state(gb, value)
+            stored = checkpoint.save_step(
+                gb, time=10 * value, time_step=value, exclude=["p_exp"]
+            )
+            assert stored == step
+        assert [s["time"] for s in checkpoint.steps] == [10.0, 20.0, 30.0]
+
+        checkpoint.set_time_step(5.0)
+        assert [s["time_step"] for s in checkpoint.steps] == [1.0, 2.0, 5.0]
+
+        # Restore to a fresh grid bucket. The last step is the default.
+        loaded = checkpoint.load_grid()
+        entry = checkpoint.load_step(loaded)
+        assert entry["step"] == 2
+        for _, d in loaded:
+            assert np.allclose(d[pp.STATE]["p"], 3)
+            assert np.allclose(d[pp.STATE]["previous_iterate"]["p"], 2)
+            assert "p_exp" not in d[pp.STATE]
+        for _, d in loaded.edges():
+            assert np.allclose(d[pp.STATE]["mortar_p"], 6)
+
+        # Restore an earlier step
+        entry = checkpoint.load_step(loaded, step=0)
+        assert entry["time"] == 10.0
+        assert entry["time_step"] == 1.0
+        for _, d in loaded:
+            assert np.allclose(d[pp.STATE]["p"], 1)
+
+    def test_truncate(self, tmp_path):
+        """ Steps after the restored one are replaced by new steps"""
+        gb = _fractured_gb()
+        checkpoint = Checkpoint(tmp_path)
+        for value in [1.0, 2.0, 3.0]:
+            _set_state(gb, value)
+            checkpoint.save_step(gb, time=10 * value)
+
+        checkpoint.load_step(gb, step=0)
+        checkpoint.truncate(0)
+        assert [s["step"] for s in checkpoint.steps] == [0]
+        assert not (tmp_path / "step_00002.npz").exists()
+
+        _set_state(gb, 5.0)
+        assert checkpoint.save_step(gb, time=15.0) == 1
+        assert [s["time"] for s in checkpoint.steps] == [10.0, 15.0]
+        assert checkpoint.steps[-1]["time_step"] is None
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from GTS.isc_modelling.convergence import ConvergenceMonitor
+
+
+class TestConvergenceMonitor:
+    @staticmethod
+    def monitor():
+        # dofs 0, 1 are pressures (scale 10), dofs 2, 3, 4 displacements (scale 2).
+        # dof 5 is not monitored.
+        blocks = [("pressure", np.array([0, 1]), 10.0), ("u", np.array([2, 3, 4]), 2.0)]
+        return ConvergenceMonitor(blocks, num_dofs=6)
+
+    def test_block_norms(self):
+        monitor = self.monitor()
+        init = np.zeros(6)
+        prev = np.array([1, 0, 0, 0, 1, 7.0])
+        solution = np.array([1, 1, 0, 3, 4, 9.0])
+        residual = np.array([3, 4, 0, 0, 1, 100.0])
+        norms = monitor.evaluate(solution, prev, init, residual=residual, time=1.0)
+
+        assert np.isclose(norms.loc["pressure", "update"], 10)
+        assert np.isclose(norms.loc["pressure", "increment"], 10 * np.sqrt(2))
+        assert np.isclose(norms.loc["u", "update"], 2 * np.sqrt(9 + 9))
+        assert np.isclose(norms.loc["u", "solution"], 2 * 5)
+        assert np.allclose(norms.residual, [5, 1])
+
+    def test_check(self):
+        monitor = self.monitor()
+        init = np.zeros(6)
+        prev = np.array([1, 1, 0, 0, 1, 0.0])
+        solution = np.array([1, 1 + 1e-8, 0, 0, 2, 0.0])
+        error, converged, diverged = monitor.check(
+            "pressure", solution, prev, init, 1e-6
+        )
+        assert converged and not diverged
+        assert np.isclose(error, 1e-8 / np.sqrt(2 + 2e-8))
+
+        error, converged, _ = monitor.check("u", solution, prev, init, 1e-6)
+        assert not converged and np.isclose(error, 0.5)
+
+        # Both checks used the same evaluation
+        assert len(monitor.history) == 2
+
+        # Nothing changed: no division by zero
+        error, converged, _ = monitor.check("u", init, init, init, 1e-6)
+        assert converged and error == 0
+
+        solution = solution.copy()
+        solution[3] = np.nan
+        _, converged, diverged = monitor.check("u", solution, prev, init, 1e-6)
+        assert diverged and not converged
+
+    def test_history(self):
+        monitor = self.monitor()
+        init = np.zeros(6)
+        for time in [1.0, 2.0]:
+            prev = init
+            for _ in range(3):
+                solution = prev + 1
+                monitor.evaluate(solution, prev, init, time=time)
+                prev = solution
+
+        history = monitor.to_dataframe()
+        assert len(history) == 2 * 3 * 2
+        assert history.iteration.tolist() == [1, 1, 2, 2, 3, 3] * 2
+        assert history.residual.isna().all()
+        u = history[history.block == "u"]
+        assert np.allclose(u.error, [1, 1 / 2, 1 / 3] * 2)
+
+    def test_overlapping_blocks(self):
+        with pytest.raises(ValueError):
+            ConvergenceMonitor([("a", [0, 1], 1.0), ("b", [1, 2], 1.0)], num_dofs=3)
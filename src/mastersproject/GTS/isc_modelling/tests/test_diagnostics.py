@@ -0,0 +1,68 @@
+import numpy as np
+import scipy.sparse as sps
+
+from GTS.isc_modelling.diagnostics import (
+    block_statistics,
+    condition_number_1norm,
+    diagonal_ratio,
+    row_sum_ratio,
+)
+from GTS.isc_modelling.linear_solver import DirectSolverSession
+
+
+def _badly_scaled_system(n: int = 60, seed: int = 0):
+    """ Sparse system with diagonal entries spanning six orders of magnitude"""
+    rng = np.random.RandomState(seed)
+    A = sps.random(n, n, density=0.05, random_state=rng)
+    A = A + sps.diags(10 ** rng.uniform(-3, 3, n))
+    return sps.csr_matrix(A)
+
+
+class TestConditionNumber:
+    def test_estimate(self):
+        A = _badly_scaled_system()
+        exact = np.linalg.cond(A.toarray(), 1)
+        estimate = condition_number_1norm(A)
+        # The estimate is a lower bound, and usually within a factor 3
+        assert exact / 3 <= estimate <= exact * (1 + 1e-10)
+
+    def test_reuse_factorization(self):
+        """ The estimate reuses the factorization of the solver session"""
+        A = _badly_scaled_system()
+        session = DirectSolverSession()
+        session.solve(A, np.ones(A.shape[0]))
+
+        estimate = condition_number_1norm(A, session=session)
+        assert session.num_factorizations == 1
+        assert np.isclose(estimate, condition_number_1norm(A))
+
+    def test_singular(self):
+        A = sps.csr_matrix(np.array([[1.0, 1.0], [1.0, 1.0]]))
+        assert condition_number_1norm(A) == np.inf
+
+    def test_singular_session(self):
+        """ PARDISO errors of the solver session give an infinite estimate"""
+        A = sps.csr_matrix(np.array([[1.0, 0.0], [0.0, 0.0]]))
+        A.eliminate_zeros()
+        assert condition_number_1norm(A, session=DirectSolverSession()) == np.inf
+
+
+def test_scaling_ratios():
+    A = sps.csr_matrix(np.array([[4.0, -1.0], [0.0, 0.5]]))
+    assert np.isclose(row_sum_ratio(A), 10)
+    assert np.isclose(diagonal_ratio(A), 8)
+
+
+def test_block_statistics():
+    A = sps.csr_matrix(
+        np.array([[2.0, 1.0, 0.0], [1.0, 4.0, 0.5], [0.0, 0.5, 1e-6]])
+    )
+    stats = block_statistics(
+        A, {"u": np.array([0, 1]), "p": np.array([2]), "empty": np.array([])}
+    )
+    assert list(stats.index) == ["u", "p"]
+    assert stats.loc["u", "dofs"] == 2
+    assert stats.loc["u", "max_abs_diag"] == 4
+    assert stats.loc["u", "max_row_sum"] == 5
+    assert stats.loc["p", "max_abs"] == 1e-6
+    assert stats.loc["p", "max_abs_coupling"] == 0.5
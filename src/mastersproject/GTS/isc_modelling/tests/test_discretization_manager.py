@@ -0,0 +1,119 @@
+import numpy as np
+
+import porepy as pp
+from GTS.isc_modelling.discretization_manager import (
+    DiscretizationManager,
+    parameter_fingerprint,
+)
+
+
+def _fractured_gb():
+    """ 2d grid bucket with one fracture, Mpfa on nodes and Robin coupling on edges"""
+    gb = pp.meshing.cart_grid([np.array([[1, 3], [2, 2]])], [4, 4], physdims=[4, 4])
+    key, var, mortar_var = "flow", "p", "mortar_p"
+    mpfa = pp.Mpfa(key)
+
+    for g, d in gb:
+        pp.initialize_data(g, d, key, {})
+        d[pp.PRIMARY_VARIABLES] = {var: {"cells": 1}}
+        d[pp.DISCRETIZATION] = {var: {"diffusion": mpfa}}
+
+    for e, d in gb.edges():
+        g_l, g_h = gb.nodes_of_edge(e)
+        mg = d["mortar_grid"]
+        pp.initialize_data(
+            mg, d, key, {"normal_diffusivity": np.ones(mg.num_cells)},
+        )
+        d[pp.PRIMARY_VARIABLES] = {mortar_var: {"cells": 1}}
+        d[pp.COUPLING_DISCRETIZATION] = {
+            "robin_p": {
+                g_h: (var, "diffusion"),
+                g_l: (var, "diffusion"),
+                e: (mortar_var, pp.RobinCoupling(key, mpfa)),
+            }
+        }
+
+    pp.Assembler(gb).discretize()
+    manager = DiscretizationManager(
+        gb,
+        node_dependencies={(var, "diffusion"): ["second_order_tensor", "bc"]},
+        edge_dependencies={"robin_p": ["normal_diffusivity"]},
+    )
+    manager.update_fingerprints()
+    return gb, manager
+
+
+class TestDiscretizationManager:
+    def test_unchanged_parameters(self):
+        """ Re-setting identical parameters should not trigger re-discretization"""
+        gb, manager = _fractured_gb()
+        for g, d in gb:
+            d[pp.PARAMETERS]["flow"]["second_order_tensor"] = pp.SecondOrderTensor(
+                np.ones(g.num_cells)
+            )
+        changed_nodes, changed_edges = manager.discretize()
+        assert not changed_nodes
+        assert not changed_edges
+
+    def test_changed_fracture_permeability(self):
+        """ Only the fracture and its mortar grid are re-discretized"""
+        gb, manager = _fractured_gb()
+        g_frac = gb.grids_of_dimension(1)[0]
+        d = gb.node_props(g_frac)
+        d[pp.PARAMETERS]["flow"]["second_order_tensor"] = pp.SecondOrderTensor(
+            2 * np.ones(g_frac.num_cells)
+        )
+        for e, d_e in gb.edges():
+            d_e[pp.PARAMETERS]["flow"]["normal_diffusivity"] *= 2
+
+        changed_nodes, changed_edges = manager.discretize()
+        assert changed_nodes == [(g_frac, "p", "diffusion")]
+        assert len(changed_edges) == 1
+
+        # A second call does nothing
+        changed_nodes, changed_edges = manager.discretize()
+        assert not changed_nodes
+        assert not changed_edges
+
+
+def test_parameter_fingerprint():
+    params = {
+        "a": np.arange(3, dtype=float),
+        "b": 1.0,
+        "tensor": pp.SecondOrderTensor(np.ones(3)),
+    }
+    fp = parameter_fingerprint(params, ["a", "tensor"])
+
+    # Unrelated parameters do not matter
+    params["b"] = 2.0
+    assert parameter_fingerprint(params, ["a", "tensor"]) == fp
+
+    # Values, not identity, determine the fingerprint
+    params["a"] = np.arange(3, dtype=float)
+    assert parameter_fingerprint(params, ["a", "tensor"]) == fp
+    params["tensor"] = pp.SecondOrderTensor(np.ones(3))
+    assert parameter_fingerprint(params, ["a", "tensor"]) == fp
+
+    params["a"][0] = 1
+    assert parameter_fingerprint(params, ["a", "tensor"]) != fp
+
+
+def test_unchanged_objects_are_not_rehashed():
+    manager = DiscretizationManager(None, {}, {})
+    params = {
+        "a": np.arange(3, dtype=float),
+        "tensor": pp.SecondOrderTensor(np.ones(3)),
+    }
+    fp = manager.fingerprint("term", params, ["a", "tensor"])
+    assert fp == manager.fingerprint("other term", params, ["a", "tensor"])
+
+    # Objects are only hashed by value when they are replaced
+    params["tensor"].values *= 2
+    assert manager.fingerprint("term", params, ["a", "tensor"]) == fp
+    params["tensor"] = pp.SecondOrderTensor(2 * np.ones(3))
+    fp_2 = manager.fingerprint("term", params, ["a", "tensor"])
+    assert fp_2 != fp
+
+    # Arrays are always hashed by value
+    params["a"][0] = 1
+    assert manager.fingerprint("term", params, ["a", "tensor"]) != fp_2
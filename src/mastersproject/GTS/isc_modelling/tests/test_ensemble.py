@@ -0,0 +1,22 @@
+import numpy as np
+
+from GTS.isc_modelling.ensemble import RunningStatistics
+
+
+class TestRunningStatistics:
+    def test_chunks_equal_numpy(self):
+        values = np.random.default_rng(0).normal(1e3, 2.0, size=(103, 3))
+        values[[5, 50, 77], 1] = np.nan
+        values[:, 2] = np.nan
+
+        stats = RunningStatistics(["a", "b", "c"])
+        for chunk in np.array_split(values, 7):
+            stats.update(chunk)
+        df = stats.to_dataframe()
+
+        assert df["count"].tolist() == [103, 100, 0]
+        assert np.allclose(df["mean"][:2], np.nanmean(values[:, :2], axis=0))
+        assert np.allclose(df["std"][:2], np.nanstd(values[:, :2], axis=0, ddof=1))
+        assert np.allclose(df["min"][:2], np.nanmin(values[:, :2], axis=0))
+        assert np.allclose(df["max"][:2], np.nanmax(values[:, :2], axis=0))
+        assert df.loc["c"].drop("count").isna().all()
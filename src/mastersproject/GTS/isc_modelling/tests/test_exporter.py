@@ -0,0 +1,106 @@
+from xml.etree import ElementTree
+
+import h5py
+import numpy as np
+import pytest
+
+import porepy as pp
+from GTS.isc_modelling.exporter import HDF5Exporter, create_exporter
+
+
+def _triangle_gb():
+    """ Grid bucket of a single 2d simplex grid"""
+    g = pp.StructuredTriangleGrid([2, 2])
+    g.compute_geometry()
+    gb = pp.GridBucket()
+    gb.add_nodes([g])
+    gb.assign_node_ordering()
+    return gb, g
+
+
+class TestHDF5Exporter:
+    def test_time_series(self, tmp_path):
+        gb, g = _triangle_gb()
+        d = gb.node_props(g)
+        viz = create_exporter(gb, "run", tmp_path, exporter="hdf5")
+        assert isinstance(viz, HDF5Exporter)
+
+        for step in range(3):
+            d[pp.STATE] = {
+                "p_exp": np.full(g.num_cells, step, dtype=float),
+                "u_exp": np.full((3, g.num_cells), step, dtype=float),
+                "stress_exp": np.ones((3, g.num_faces)),
+            }
+            viz.write_vtk(data=["p_exp", "u_exp", "stress_exp"], time_step=2.0 * step)
+        # The xdmf file is only written on request
+        assert not (tmp_path / "run.xdmf").exists()
+        viz.write_pvd(np.array(viz.times))
+
+        with h5py.File(tmp_path / "run.h5", "r") as f:
+            assert np.allclose(f["time"][:], [0, 2, 4])
+            group = f["grid_0"]
+            assert group["geometry"].shape == (g.num_nodes, 3)
+            assert group["topology"].shape == (g.num_cells, 3)
+            assert group["fields/u_exp"].shape == (3, g.num_cells, 3)
+            assert np.allclose(group["fields/p_exp"][1], 1)
+            assert group["fields/stress_exp"].shape == (3, g.num_faces, 3)
+
+        # Face fields are not described in the xdmf file
+        root = ElementTree.parse(tmp_path / "run.xdmf").getroot()
+        steps = root.find("Domain/Grid").findall("Grid")
+        assert len(steps) == 3
+        names = {a.get("Name") for a in steps[-1].iter("Attribute")}
+        assert names == {"p_exp", "u_exp"}
+
+    def test_single_grid(self, tmp_path):
+        """ With grid given, only the fields of that grid are written"""
+        grids = [pp.StructuredTriangleGrid([2, 2]) for _ in range(2)]
+        gb = pp.GridBucket()
+        gb.add_nodes(grids)
+        gb.assign_node_ordering()
+        for g, d in gb:
+            g.compute_geometry()
+            d[pp.STATE] = {"p_exp": np.ones(g.num_cells)}
+        viz = create_exporter(gb, "run", tmp_path, exporter="hdf5")
+        viz.write_vtk(data=["p_exp"], time_step=0)
+        viz.write_vtk(data=["p_exp"], time_step=1, grid=grids[0])
+        viz.write_pvd()
+
+        with h5py.File(tmp_path / "run.h5", "r") as f:
+            shapes = {
+                g: f[f"grid_{d['node_number']}/fields/p_exp"].shape[0] for g, d in gb
+            }
+        assert shapes == {grids[0]: 2, grids[1]: 1}
+
+        with pytest.raises(ValueError):
+            viz.write_vtk(data=["p_exp"], grid=pp.StructuredTriangleGrid([1, 1]))
+        viz = create_exporter(gb, "run", tmp_path, asynchronous=True)
+        with pytest.raises(ValueError):
+            viz.write_vtk(data=["p_exp"], grid=grids[0])
+        viz.close()
+
+    def test_asynchronous(self, tmp_path):
+        """ The written steps are snapshots, unaffected by later changes of state"""
+        gb, g = _triangle_gb()
+        d = gb.node_props(g)
+        viz = create_exporter(gb, "run", tmp_path, exporter="hdf5", asynchronous=True)
+
+        for step in range(4):
+            d[pp.STATE] = {"p_exp": np.full(g.num_cells, step, dtype=float)}
+            viz.write_vtk(data=["p_exp"], time_step=step)
+            d[pp.STATE]["p_exp"][:] = -1
+        viz.write_pvd()
+        thread = viz._thread
+        viz.close()
+        assert not thread.is_alive()
+
+        with h5py.File(tmp_path / "run.h5", "r") as f:
+            p = f["grid_0/fields/p_exp"][:]
+        assert np.allclose(p, np.arange(4)[:, None])
+
+        # A closed exporter restarts the writer thread on the next write
+        viz.write_vtk(data=["p_exp"], time_step=4)
+        viz.close()
+        viz.close()
+        with h5py.File(tmp_path / "run.h5", "r") as f:
+            assert f["grid_0/fields/p_exp"].shape[0] == 5
@@ -22,7 +22,7 @@ class TestFlow:
 
         Goal: No negative pressure cells
         """
-        _run_flow_models_helper(
+        setup = _run_flow_models_helper(
             sz=0.1,
             incompressible=False,
             head="test_1_frac_unit_domain",
@@ -30,6 +30,13 @@ class TestFlow:
             time_step=pp.HOUR,
         )
 
+        # The pattern is fixed, so the entries of every assembled matrix are
+        # scattered into the global matrix through the first slot map.
+        global_matrix = setup.global_matrix
+        assert global_matrix.num_updates >= 4
+        assert global_matrix.num_pattern_updates == 1
+        assert global_matrix.num_slot_maps == 1
+
     def test_2_fracs_unit_domain(self):
         """ Test that we a basic 2-fracture setup runs as
         expected with easy parameters.
@@ -97,7 +104,7 @@ def _run_flow_models_helper(
     head: str,
     shearzone_names: Optional[List[str]],
     time_step: float = None,
-) -> None:
+) -> FlowISC:
     """ Helper method for the test_flow setups
 
     sz is related to mesh_args
@@ -146,6 +153,7 @@ def _run_flow_models_helper(
     pp.run_time_dependent_model(setup, {})
 
     assert setup.neg_ind.size == 0
+    return setup
 
 
 def network_n_fractures(n_frac: int) -> pp.FractureNetwork3d:
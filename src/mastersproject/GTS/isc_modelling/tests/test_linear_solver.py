@@ -0,0 +1,163 @@
+import numpy as np
+import pytest
+import scipy.sparse as sps
+
+from GTS.isc_modelling.linear_solver import (
+    BlockPreconditionedSolver,
+    DirectSolverSession,
+)
+
+
+def _random_system(n: int = 50, seed: int = 0):
+    """ Diagonally dominant, non-symmetric sparse test system"""
+    rng = np.random.RandomState(seed)
+    A = sps.random(n, n, density=0.1, random_state=rng, format="csr")
+    A = A + sps.diags(np.abs(A).sum(axis=1).A.ravel() + 1.0)
+    b = rng.rand(n)
+    return sps.csr_matrix(A), b
+
+
+def _coupled_system(n: int = 20):
+    """ Poroelastic-like 3x3 block test system
+
+    Two Laplacians on a n x n grid (displacement and pressure), coupled by a weak
+    off-diagonal term, and a small diagonal block for the contact variables.
+    """
+    lap_1d = sps.diags([-1.0, 2.0, -1.0], [-1, 0, 1], shape=(n, n))
+    eye = sps.identity(n)
+    lap = sps.kron(lap_1d, eye) + sps.kron(eye, lap_1d)
+    m = lap.shape[0]
+    coupling = 0.1 * sps.identity(m)
+    n_c = 10
+    contact = sps.diags(np.arange(1, n_c + 1, dtype=float))
+    c_u = sps.random(n_c, m, density=0.01, random_state=1)
+    A = sps.bmat(
+        [
+            [lap, None, -coupling],
+            [c_u, contact, None],
+            [coupling, None, lap + 0.1 * sps.identity(m)],
+        ],
+        format="csr",
+    )
+    b = np.random.RandomState(0).rand(A.shape[0])
+    blocks = [
+        ("mechanics", np.arange(m), "amg"),
+        ("contact", np.arange(m, m + n_c), "lu"),
+        ("flow", np.arange(m + n_c, 2 * m + n_c), "fixed_stress"),
+    ]
+    return A, b, blocks
+
+
+class TestDirectSolverSession:
+    def test_solve(self):
+        A, b = _random_system()
+        session = DirectSolverSession()
+        x = session.solve(A, b)
+        assert np.allclose(A * x, b)
+
+    def test_reuse_factorization_for_new_rhs(self):
+        """ Only the right hand side changes: no refactorization."""
+        A, b = _random_system()
+        session = DirectSolverSession()
+        session.solve(A, b)
+        x = session.solve(A, 2 * b)
+
+        assert np.allclose(A * x, 2 * b)
+        assert session.num_analysis == 1
+        assert session.num_factorizations == 1
+        assert session.num_solves == 2
+
+    def test_reuse_analysis_for_new_values(self):
+        """ Values change, pattern is fixed: refactorize, but no new analysis."""
+        A, b = _random_system()
+        session = DirectSolverSession()
+        session.solve(A, b)
+
+        A2 = A.copy()
+        A2.data *= 3.0
+        x = session.solve(A2, b)
+
+        assert np.allclose(A2 * x, b)
+        assert session.num_analysis == 1
+        assert session.num_factorizations == 2
+
+    def test_reanalyse_on_pattern_change(self):
+        A, b = _random_system()
+        session = DirectSolverSession()
+        session.solve(A, b)
+
+        A2, _ = _random_system(seed=1)
+        x = session.solve(A2, b)
+
+        assert np.allclose(A2 * x, b)
+        assert session.num_analysis == 2
+
+    def test_solve_factorized(self):
+        """ Solves with A and A^T reuse the factorization"""
+        A, b = _random_system()
+        session = DirectSolverSession()
+        session.solve(A, b)
+
+        x = session.solve_factorized(b, transpose=True)
+        assert np.allclose(A.T * x, b)
+        x = session.solve_factorized(b)
+        assert np.allclose(A * x, b)
+        assert session.num_factorizations == 1
+
+    def test_reset(self):
+        A, b = _random_system()
+        session = DirectSolverSession()
+        session.solve(A, b)
+        session.reset()
+        x = session.solve(A, b)
+
+        assert np.allclose(A * x, b)
+        assert session.num_analysis == 2
+
+    def test_fallback_to_spsolve(self):
+        """ Without the private pypardiso methods, every solve factorizes"""
+        A, b = _random_system()
+        session = DirectSolverSession()
+        session.solver.reuse_factorization = False
+        x = session.solve(A, b)
+        assert np.allclose(A * x, b)
+
+        x = session.solve_factorized(b, transpose=True)
+        assert np.allclose(A.T * x, b)
+
+
+class TestBlockPreconditionedSolver:
+    def test_solve(self):
+        A, b, blocks = _coupled_system()
+        solver = BlockPreconditionedSolver(blocks, tol=1e-10)
+        x = solver.solve(A, b)
+
+        assert np.linalg.norm(b - A * x) / np.linalg.norm(b) < 1e-8
+        assert solver.iterations[-1] == len(solver.residual_history)
+        # The block preconditioner should be far better than plain GMRES
+        assert solver.iterations[-1] < 50
+
+    def test_reuse_preconditioner(self):
+        A, b, blocks = _coupled_system()
+        solver = BlockPreconditionedSolver(blocks)
+        solver.solve(A, b)
+        solver.solve(A, 2 * b)
+        assert solver.num_setups == 1
+        assert len(solver.iterations) == 2
+
+        A2 = A.copy()
+        A2.data *= 2
+        solver.solve(A2, b)
+        assert solver.num_setups == 2
+
+    def test_uncovered_dofs(self):
+        """ Dofs not in any block are solved by a remainder block"""
+        A, b, blocks = _coupled_system()
+        solver = BlockPreconditionedSolver(blocks[:1], tol=1e-10)
+        x = solver.solve(A, b)
+        assert np.linalg.norm(b - A * x) / np.linalg.norm(b) < 1e-8
+
+    def test_unknown_method(self):
+        A, b, blocks = _coupled_system()
+        with pytest.raises(ValueError):
+            BlockPreconditionedSolver([("u", blocks[0][1], "ilu")])
@@ -0,0 +1,147 @@
+import numpy as np
+import pytest
+import scipy.sparse as sps
+
+from GTS.isc_modelling.convergence import ConvergenceMonitor
+from GTS.isc_modelling.newton import NewtonSolver, run_time_dependent_model
+
+
+class ArctanModel:
+    """ Toy model with the hooks used by NewtonSolver
+
+    Solves arctan(x - c * t) = 0 for each component of x. The system is assembled
+    in the full-value form of the porepy models: A = J(x_k), b = J(x_k) x_k - F(x_k).
+    Plain Newton diverges if the initial guess is more than ~1.39 from the root.
+    If max_time_step is set, the linear solver fails (NaN) for longer time steps.
+    """
+
+    def __init__(self, c, end_time=1.0, time_step=1.0, max_time_step=None):
+        self.c = np.asarray(c, dtype=float)
+        self.time = 0.0
+        self.end_time = end_time
+        self.time_step = time_step
+        self.max_time_step = max_time_step
+        self.state = np.zeros(self.c.size)
+        self.iterate = self.state.copy()
+        self.converged_steps = []
+        self.failed = False
+        self.convergence_monitor = ConvergenceMonitor(
+            [("x", np.arange(self.c.size), 1.0)], self.c.size
+        )
+
+    def prepare_simulation(self):
+        pass
+
+    def before_newton_loop(self):
+        pass
+
+    def before_newton_iteration(self):
+        pass
+
+    def get_state_vector(self):
+        return self.state.copy()
+
+    def assemble_matrix_rhs(self):
+        x = self.iterate
+        jacobian = 1 / (1 + (x - self.c * self.time) ** 2)
+        rhs = jacobian * x - np.arctan(x - self.c * self.time)
+        return sps.diags(jacobian, format="csr"), rhs
+
+    def solve_linear_system(self, A, b):
+        if self.max_time_step is not None and self.time_step > self.max_time_step:
+            return np.full(b.size, np.nan)
+        return b / A.diagonal()
+
+    def after_newton_iteration(self, solution_vector):
+        self.iterate = solution_vector.copy()
+
+    def cut_time_step(self, init_solution, factor):
+        self.time -= self.time_step
+        self.time_step *= factor
+        self.time += self.time_step
+        self.iterate = init_solution.copy()
+
+    def restore_time_step(self, time_step):
+        self.time_step = time_step
+
+    def check_convergence(self, solution, prev_solution, init_solution, nl_params):
+        error = np.linalg.norm(solution - prev_solution)
+        return error, error < nl_params["nl_convergence_tol"], False
+
+    def after_newton_convergence(self, solution, errors, iteration_counter):
+        self.state = solution.copy()
+        self.converged_steps.append((self.time, self.time_step, iteration_counter))
+
+    def after_newton_failure(self, solution, errors, iteration_counter):
+        self.failed = True
+
+    def after_simulation(self):
+        pass
+
+
+class TestNewtonSolver:
+    def test_line_search_globalizes_newton(self):
+        """ Plain Newton diverges from x0 = 0 for roots at 3; the line search not"""
+        setup = ArctanModel(c=[3.0, -3.0, 0.5])
+        setup.time = 1.0
+        solver = NewtonSolver({"line_search": False, "max_cutbacks": 0})
+        _, converged, _ = solver.solve(setup)
+        assert not converged and setup.failed
+
+        setup = ArctanModel(c=[3.0, -3.0, 0.5])
+        setup.time = 1.0
+        solver = NewtonSolver({"max_cutbacks": 0})
+        solution, converged, iterations = solver.solve(setup)
+        assert converged
+        assert np.allclose(solution, [3.0, -3.0, 0.5])
+        assert solver.num_line_search_steps > 0
+        assert iterations < 20
+
+        history = setup.convergence_monitor.to_dataframe()
+        assert history.iteration.max() == iterations
+        assert np.allclose(history.residual.iloc[-1], 0, atol=1e-8)
+
+    def test_undamped_newton_converges_quadratically(self):
+        setup = ArctanModel(c=[0.5])
+        setup.time = 1.0
+        solution, converged, iterations = NewtonSolver().solve(setup)
+        assert converged and np.allclose(solution, 0.5)
+        assert iterations <= 5
+
+    def test_increment_criterion(self):
+        setup = ArctanModel(c=[3.0])
+        setup.time = 1.0
+        params = {"convergence_criterion": "increment", "nl_convergence_tol": 1e-10}
+        solution, converged, _ = NewtonSolver(params).solve(setup)
+        assert converged and np.allclose(solution, 3.0)
+
+        with pytest.raises(ValueError):
+            NewtonSolver({"convergence_criterion": "unknown"})
+
+    def test_time_step_cut_back(self):
+        """ Failed time steps are retried with a shorter time step"""
+        setup = ArctanModel(c=[1.0], end_time=2.0, time_step=1.0, max_time_step=0.6)
+        solver = run_time_dependent_model(setup, {"cutback_factor": 0.5})
+
+        assert not setup.failed
+        times, time_steps, _ = map(np.array, zip(*setup.converged_steps))
+        # Each step is cut once, and the next step starts from the uncut step.
+        # The last step is shortened to end at the end time, and is not cut.
+        assert solver.num_cutbacks == 3
+        assert np.allclose(time_steps, 0.5)
+        assert np.isclose(times[-1], 2.0)
+        assert np.allclose(setup.state, times[-1])
+
+    def test_last_step_ends_at_end_time(self):
+        setup = ArctanModel(c=[1.0], end_time=1.0, time_step=0.4)
+        run_time_dependent_model(setup)
+        times, time_steps, _ = map(np.array, zip(*setup.converged_steps))
+        assert np.allclose(times, [0.4, 0.8, 1.0])
+        assert np.allclose(time_steps, [0.4, 0.4, 0.2])
+
+    def test_failure_after_max_cutbacks(self):
+        setup = ArctanModel(c=[1.0], time_step=1.0, max_time_step=0.1)
+        setup.time = 1.0
+        _, converged, _ = NewtonSolver({"max_cutbacks": 2}).solve(setup)
+        assert not converged and setup.failed
+        assert np.isclose(setup.time_step, 0.25)
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import porepy as pp
+from GTS.isc_modelling.stimulation import StimulationProtocol, TimeStepController
+
+
+class TestStimulationProtocol:
+    def test_phases(self):
+        protocol = StimulationProtocol().add_well(
+            "INJ1",
+            start_times=[0, 10, 20],
+            values=[1.0, 5e6, 0.0],
+            modes=["rate", "pressure", "rate"],
+        )
+        # A phase starts at its start time. The first phase also applies before.
+        phases = [protocol.phase("INJ1", t) for t in [-1, 0, 9.9, 10, 25]]
+        assert phases == [0, 0, 0, 1, 2]
+        assert protocol.mode("INJ1", 15) == "pressure"
+        assert protocol.value("INJ1", 15) == 5e6
+        assert np.allclose(protocol.change_times, [10, 20])
+
+        with pytest.raises(KeyError):
+            protocol.value("INJ2", 0)
+        with pytest.raises(ValueError):
+            protocol.add_well("INJ2", [0, 0], [1, 2])
+
+    def test_hydro_shearing_cycle_3(self):
+        protocol = StimulationProtocol.hydro_shearing_cycle_3()
+        rates = [protocol.value("INJ1", t * pp.MINUTE) for t in [5, 15, 25, 35, 60]]
+        assert np.allclose(np.array(rates) * pp.MINUTE, [10, 15, 20, 25, 0])
+
+
+class TestTimeStepController:
+    def test_steps_follow_the_protocol(self):
+        """ Steps grow in quasi-steady periods and restart at each change"""
+        change_times = np.array([100.0, 400.0])
+        controller = TimeStepController(initial_step=5, min_step=1, max_step=50)
+
+        time, time_step, steps = 0.0, 5.0, []
+        while time < 1000:
+            time += time_step
+            steps.append((time, time_step))
+            time_step = controller.next_step(
+                time, time_step, iterations=2, change_times=change_times, end_time=1000
+            )
+
+        times = np.array([t for t, _ in steps])
+        assert np.isclose(times[-1], 1000)
+        # Every change is hit exactly, and followed by the initial step
+        for change in change_times:
+            i = np.argmin(np.abs(times - change))
+            assert np.isclose(times[i], change)
+            assert np.isclose(steps[i + 1][1], 5)
+        assert max(dt for _, dt in steps) == 50
+        assert len(steps) < 1000 / 5
+
+    def test_iterations(self):
+        controller = TimeStepController(initial_step=5, min_step=1, max_step=50)
+        assert controller.next_step(0, 10, iterations=2) == 20
+        assert controller.next_step(0, 10, iterations=6) == 10
+        assert controller.next_step(0, 10, iterations=12) == 5
+        assert controller.next_step(0, 1.5, iterations=12) == 1
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from GTS.isc_modelling.sweep import run_sweep
+
+
+def _square(point):
+    if point["x"] < 0:
+        raise ValueError("negative x")
+    return {"y": point["x"] ** 2}
+
+
+def _points(values):
+    return [{"x": float(x), "label": "a"} for x in values]
+
+
+class TestRunSweep:
+    @pytest.mark.parametrize("max_workers", [1, 2])
+    def test_run_sweep(self, tmp_path, max_workers):
+        output = tmp_path / "sweep.csv"
+        results = run_sweep(
+            _square, _points([1, 2, 3]), output, ["y"], max_workers=max_workers
+        )
+        results = results.sort_values("x")
+        assert np.allclose(results["y"], [1, 4, 9])
+        assert results["error"].isna().all()
+
+    def test_resume(self, tmp_path):
+        """ Completed points are not evaluated again"""
+        output = tmp_path / "sweep.csv"
+        run_sweep(_square, _points([1, 2]), output, ["y"], max_workers=1)
+        results = run_sweep(_square, _points([1, 2, 3]), output, ["y"], max_workers=1)
+        assert len(results) == 3
+        assert np.allclose(np.sort(results["y"]), [1, 4, 9])
+
+    def test_failed_points_are_retried(self, tmp_path):
+        output = tmp_path / "sweep.csv"
+        results = run_sweep(_square, _points([-1, 2]), output, ["y"], max_workers=1)
+        assert results["error"].notna().sum() == 1
+
+        # The failed point is evaluated (and fails) again, the other is skipped
+        results = run_sweep(_square, _points([-1, 2]), output, ["y"], max_workers=1)
+        assert len(results) == 3
+        assert (results["x"] == 2).sum() == 1
+
+    def test_warmup(self, tmp_path):
+        """ The warmup is called once per distinct value"""
+        warmed = []
+        run_sweep(
+            _square,
+            _points([1, 1, 2]),
+            tmp_path / "sweep.csv",
+            ["y"],
+            max_workers=1,
+            warmup=warmed.append,
+            warmup_by="x",
+        )
+        assert warmed == [1.0, 2.0]
+
+    def test_mismatched_columns(self, tmp_path):
+        output = tmp_path / "sweep.csv"
+        pd.DataFrame({"x": [1.0], "z": [1.0], "error": [""]}).to_csv(
+            output, index=False
+        )
+        with pytest.raises(ValueError):
+            run_sweep(_square, _points([1]), output, ["y"], max_workers=1)
@@ -47,3 +47,44 @@ def test_create_grid():
     cm = gts.isc_modelling.ContactMechanicsISCWithGrid(params, gb)
 
     return cm
+
+
+def test_mesh_cache(tmp_path):
+    """ The second call to create_grid loads the grid bucket from the mesh cache"""
+    from GTS.isc_modelling.ISCGrid import create_grid, mesh_cache_key
+
+    params = {
+        "mesh_args": {"mesh_size_frac": 20, "mesh_size_min": 20, "mesh_size_bound": 40},
+        "length_scale": 10,
+        "bounding_box": {
+            "xmin": -6,
+            "xmax": 80,
+            "ymin": 55,
+            "ymax": 150,
+            "zmin": 0,
+            "zmax": 50,
+        },
+        "shearzone_names": ["S1_1", "S1_2"],
+    }
+    cache_dir = tmp_path / "mesh_cache"
+    gb, _ = create_grid(**params, folder_name=str(tmp_path), mesh_cache_dir=cache_dir)
+    cache_file = cache_dir / f"gb_{mesh_cache_key(**params)}.pkl"
+    assert cache_file.is_file()
+
+    # Remove meshing output to verify that gmsh is not run again
+    for f in tmp_path.glob("gmsh_frac_file*"):
+        os.remove(f)
+    gb_cached, _ = create_grid(
+        **params, folder_name=str(tmp_path), mesh_cache_dir=cache_dir
+    )
+    assert not list(tmp_path.glob("gmsh_frac_file*"))
+
+    assert gb_cached.num_cells() == gb.num_cells()
+    names = [d["name"] for _, d in gb]
+    assert [d["name"] for _, d in gb_cached] == names
+    for g in gb_cached.grids_of_dimension(gb_cached.dim_max() - 1):
+        assert "tangential_normal_projection" in gb_cached.node_props(g)
+
+    # A different geometry gives a different key
+    params["length_scale"] = 20
+    assert f"gb_{mesh_cache_key(**params)}.pkl" != cache_file.name
@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+
+from GTS.ISC_data.isc import (
+    ISCData,
+    borehole_to_global_coords,
+    get_isc_data,
+    swiss_to_gts,
+)
+from GTS.ISC_data.fracture import convex_plane
+from GTS.ISC_data.geometry_sampling import (
+    member_seed,
+    sample_convex_plane,
+    sample_shearzone_planes,
+)
+from GTS.fit_plane import (
+    convex_hull,
+    fit_normal_to_points,
+    fit_planes,
+    plane_from_points,
+)
+
+
+def test_borehole_to_global_coords():
+    """ Compare the vectorized transform to a row-wise computation"""
+    data = pd.DataFrame(
+        {
+            "x": [667466.424, 667470.633],
+            "y": [158888.882, 158905.016],
+            "z": [1732.782, 1732.725],
+            "depth": [0.0, 10.0],
+            "upward_gradient": [-31.92, -40.46],
+            "azimuth": [317.05, 253.07],
+        }
+    )
+    borehole_to_global_coords(
+        data,
+        x="x",
+        y="y",
+        z="z",
+        depth="depth",
+        upward_gradient="upward_gradient",
+        azimuth="azimuth",
+    )
+
+    rad = np.pi / 180
+    for _, row in data.iterrows():
+        grad, azim = row.upward_gradient * rad, row.azimuth * rad
+        direction = np.array(
+            [np.cos(grad) * np.sin(azim), np.cos(grad) * np.cos(azim), np.sin(grad)]
+        )
+        swiss = np.array([row.x, row.y, row.z]) + row.depth * direction
+        assert np.allclose(row[["x_swiss", "y_swiss", "z_swiss"]], swiss)
+        assert np.allclose(row[["x_gts", "y_gts", "z_gts"]], swiss_to_gts(swiss))
+
+
+def test_isc_data_cache():
+    """ Data loaded from the binary cache equals data loaded from file"""
+    isc = ISCData(cache=False)
+    ISCData(cache=True)  # Make sure the cache exists
+    isc_cached = ISCData(cache=True)
+
+    for name in ISCData._cached_frames:
+        pd.testing.assert_frame_equal(getattr(isc, name), getattr(isc_cached, name))
+
+
+def test_get_isc_data_is_shared():
+    isc = get_isc_data()
+    assert get_isc_data(isc.data_path) is isc
+
+    get_isc_data.cache_clear()
+    assert get_isc_data() is not isc
+
+
+def test_memoized_queries():
+    """ Memoized queries return equal copies of the computed values"""
+    isc = get_isc_data()
+
+    planes = isc.planes()
+    planes.loc[:, "n_x"] = 0
+    pd.testing.assert_frame_equal(isc.planes(), ISCData().planes())
+
+    intersections = isc.borehole_plane_intersection()
+    pd.testing.assert_frame_equal(
+        intersections, ISCData().borehole_plane_intersection()
+    )
+
+    hull = isc.convex_hull("S1_1")
+    known_hull = convex_hull(plane_from_points(isc.get_shearzone("S1_1")))
+    assert np.allclose(hull, known_hull)
+    hull[:] = 0
+    assert np.allclose(isc.convex_hull("S1_1"), known_hull)
+
+
+def test_batched_plane_fit():
+    """ Planes fitted to all shear-zones at once equal the planes fitted one by one"""
+    isc = get_isc_data()
+    planes = isc.planes()
+    for sz in isc.shearzones:
+        point_cloud = isc.get_shearzone(sz)
+        plane = planes[planes.shearzone == sz]
+        normal = fit_normal_to_points(point_cloud)
+        assert np.allclose(plane[["n_x", "n_y", "n_z"]], normal)
+        assert np.allclose(plane[["x_c", "y_c", "z_c"]], point_cloud.mean(axis=1))
+
+    # Bootstrap samples of one shear-zone, as a (k, 3, n) array
+    point_cloud = isc.get_shearzone("S1_2")
+    n = point_cloud.shape[1]
+    samples = np.random.default_rng(0).integers(n, size=(50, n))
+    bootstrap = point_cloud[:, samples].transpose(1, 0, 2)
+    _, normals = fit_planes(bootstrap)
+    for sample, normal in zip(bootstrap, normals):
+        known_normal = fit_normal_to_points(sample)
+        if known_normal is None:
+            assert np.isnan(normal).all()
+        else:
+            assert np.allclose(normal, known_normal)
+
+
+def test_convex_plane():
+    """ Shear-zones are returned in the given order"""
+    isc = get_isc_data()
+    df = convex_plane(["S3_1", "S1_2"])
+    assert df.shearzone.unique().tolist() == ["S3_1", "S1_2"]
+    known_hull = convex_hull(plane_from_points(isc.get_shearzone("S3_1")))
+    assert np.allclose(
+        df.loc[df.shearzone == "S3_1", ["x_proj", "y_proj", "z_proj"]].to_numpy().T,
+        known_hull,
+    )
+
+
+def test_sample_shearzone_planes():
+    """ Samples are reproducible by seed, and unperturbed without depth uncertainty"""
+    isc = get_isc_data()
+    shearzones = ["S1_2", "S3_1"]
+    planes = isc.planes().set_index("shearzone").loc[shearzones]
+    _, normals, _, _ = sample_shearzone_planes(shearzones, 0, [1, 2])
+    assert np.allclose(normals, planes[["n_x", "n_y", "n_z"]].to_numpy())
+
+    seeds = [member_seed(0, i) for i in range(10)]
+    _, normals, vertices, offsets = sample_shearzone_planes(shearzones, 0.5, seeds)
+    assert offsets.size == 10 * 2 + 1
+    assert not np.allclose(normals[0], normals[1])
+
+    # A single sample equals the same member of the batch
+    df = sample_convex_plane(shearzones, 0.5, seeds[3])
+    assert df.shearzone.unique().tolist() == shearzones
+    known = vertices[:, offsets[3 * 2] : offsets[3 * 2 + 2]]
+    assert np.allclose(df[["x_proj", "y_proj", "z_proj"]].to_numpy().T, known)
@@ -7,6 +7,8 @@ import numpy as np
 
 import porepy as pp
 from GTS.isc_modelling.isc_model import ISCBiotContactMechanics
+from GTS.isc_modelling.mechanics import local_displacement_jump_operator
+from GTS.isc_modelling.newton import run_time_dependent_model
 from GTS.isc_modelling.parameter import (
     BiotParameters,
     stress_tensor,
@@ -164,8 +166,84 @@ class TestISCBiotContactMechanics:
         aperture_frac_iter = setup.mechanical_aperture(frac, from_iterate=True)
         assert np.allclose(aperture_frac_iter, 2 * np.ones(nc))
 
-    def test_aperture(self):
-        pass
+    def test_aperture(self, biot_params_small):
+        """ Test that the aperture is cached per iterate"""
+        biot_params_small["shearzone_names"] = ["F1"]
+        biot_params_small["length_scale"] = 1
+        params = BiotParameters(**biot_params_small)
+        setup = ISCBiotContactMechanics(params)
+
+        # fmt: off
+        frac_pts = np.array(
+            [[0, 10, 10, 0],
+             [5, 5, 5, 5],
+             [0, 0, 5, 5]])
+        # fmt: on
+        gb = pp.meshing.cart_grid([frac_pts], nx=[2, 2, 2], physdims=[10, 10, 10])
+        setup.gb = gb
+        setup.assign_biot_variables()
+
+        nd_grid = setup.grids_by_name(params.intact_name)[0]
+        frac = setup.grids_by_name(params.shearzone_names[0])[0]
+        data_edge = setup.gb.edge_props((frac, nd_grid))
+        nd, nc = setup.Nd, frac.num_cells
+        var_mortar = setup.mortar_displacement_variable
+
+        # Jump of 2 in all directions on the previous iterate
+        mortar_u = np.hstack((np.ones((nd, nc)), 3 * np.ones((nd, nc)))).ravel("F")
+        pp.set_state(data_edge, {"previous_iterate": {var_mortar: mortar_u}})
+        a_init = setup.compute_initial_aperture(frac, scaled=False)
+
+        a = setup.aperture(frac, scaled=False, from_iterate=True)
+        assert np.allclose(a, a_init + 2)
+
+        # Cached values are returned as copies
+        a *= 0
+        assert np.allclose(setup.aperture(frac, scaled=False), a_init + 2)
+
+        # New iterate: cached value is kept until the cache is invalidated
+        mortar_u = np.hstack((np.ones((nd, nc)), 5 * np.ones((nd, nc)))).ravel("F")
+        data_edge[pp.STATE]["previous_iterate"][var_mortar] = mortar_u
+        assert np.allclose(setup.aperture(frac, scaled=False), a_init + 2)
+        setup.invalidate_aperture_cache()
+        assert np.allclose(setup.aperture(frac, scaled=False), a_init + 4)
+
+    def test_displacement_jump_operator(self, biot_params_small):
+        """ Test that the mortar to local jump operator is cached on the edge"""
+        biot_params_small["shearzone_names"] = ["F1"]
+        biot_params_small["length_scale"] = 1
+        params = BiotParameters(**biot_params_small)
+        setup = ISCBiotContactMechanics(params)
+
+        # fmt: off
+        frac_pts = np.array(
+            [[0, 10, 10, 0],
+             [5, 5, 5, 5],
+             [0, 0, 5, 5]])
+        # fmt: on
+        gb = pp.meshing.cart_grid([frac_pts], nx=[2, 2, 2], physdims=[10, 10, 10])
+        setup.gb = gb
+
+        nd = setup.Nd
+        data_edge = [d for _, d in gb.edges()][0]
+        mg: pp.MortarGrid = data_edge["mortar_grid"]
+
+        # Built when the grid bucket is set
+        assert "mortar_to_local_jump" in data_edge
+        op = local_displacement_jump_operator(data_edge, nd)
+        assert op is local_displacement_jump_operator(data_edge, nd)
+
+        projection = data_edge["tangential_normal_projection"]
+        known_op = (
+            projection.project_tangential_normal(int(mg.num_cells / 2))
+            * mg.mortar_to_slave_avg(nd=nd)
+            * mg.sign_of_mortar_sides(nd=nd)
+        )
+        assert np.allclose(op.toarray(), known_op.toarray())
+
+        # New projections trigger a rebuild
+        pp.contact_conditions.set_projections(gb)
+        assert op is not local_displacement_jump_operator(data_edge, nd)
 
     def test_permeability(self):
         assert False
@@ -200,6 +278,37 @@ class TestISCBiotContactMechanics:
         setup.prepare_simulation()
         pp.run_time_dependent_model(setup, {})
 
+    def test_restart_after_cut_back(self, biot_params_small, tmp_path):
+        """ The checkpoint of a cut step stores the time step the run continues with
+        """
+        checkpoint_folder = tmp_path / "checkpoint"
+        params = BiotParameters(
+            **biot_params_small,
+            time_step=2,
+            end_time=4,
+            checkpoint_folder=checkpoint_folder,
+        )
+        setup = CutBackBiotCM(params)
+        solver = run_time_dependent_model(setup, {"cutback_factor": 0.5})
+        # Every step is cut once, to time step 1, and continues with time step 2
+        assert solver.num_cutbacks == 4
+        assert setup.time_step == 2
+        steps = setup.checkpoint.steps
+        assert np.allclose([s["time"] for s in steps], [1, 2, 3, 4])
+        assert np.allclose([s["time_step"] for s in steps], 2)
+
+        params = BiotParameters(
+            **biot_params_small,
+            time_step=2,
+            end_time=4,
+            restart_folder=checkpoint_folder,
+            restart_step=0,
+        )
+        restarted = ISCBiotContactMechanics(params)
+        restarted.prepare_simulation()
+        assert restarted.time == 1
+        assert restarted.time_step == 2
+
     def test_realistic_setup(self):
         """ For a 50 000 cell setup, test Contact mechanics Biot model on 5 shear zones.
         Parameters are close to the ISC setup. Model is run for 10 minutes,
@@ -228,7 +337,7 @@ class TestISCBiotContactMechanics:
             dilation_angle=(np.pi / 180) * 5,  # 5 degrees dilation angle.
             newton_options={
                 "max_iterations": 40,
-                "nl_convergence_tol": 1e-10,
+                "nl_convergence_tol": 1e-5,
                 "nl_divergence_tol": 1e5,
             },
             # Flow parameters
@@ -273,7 +382,7 @@ class TestISCBiotContactMechanics:
             stress=stress_tensor(),
             newton_options={
                 "max_iterations": 30,
-                "nl_convergence_tol": 1e-10,
+                "nl_convergence_tol": 1e-5,
                 "nl_divergence_tol": 1e5,
             },
             # Flow parameters
@@ -289,6 +398,17 @@ class TestISCBiotContactMechanics:
         pp.run_time_dependent_model(setup, newton_params)
 
 
+class CutBackBiotCM(ISCBiotContactMechanics):
+    """ The linear solver fails for time steps longer than max_time_step"""
+
+    max_time_step = 1.5
+
+    def solve_linear_system(self, A, b):
+        if self.time_step > self.max_time_step:
+            return np.full(b.size, np.nan)
+        return super().solve_linear_system(A, b)
+
+
 class NeverFailtBiotCM(ISCBiotContactMechanics):
     def after_newton_failure(self, solution, errors, iteration_counter):
         """ Instead of raising error on failure, simply continue.
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+import porepy as pp
+from GTS.isc_modelling.mechanics import Mechanics
+from GTS.isc_modelling.parameter import BaseParameters
+from GTS.test.standard_grids import two_intersecting_blocking_fractures
+
+
+@pytest.fixture
+def setup() -> Mechanics:
+    """ Mechanics setup on a simple fractured grid, with two time steps"""
+    here = Path(__file__).parent
+    params = BaseParameters(folder_name=here, time_step=1, end_time=2)
+    _setup = Mechanics(params)
+
+    # create grid
+    _setup.gb = two_intersecting_blocking_fractures(_setup.params.folder_name)
+    _setup.bounding_box = _setup.gb.bounding_box(as_dict=True)
+    pp.contact_conditions.set_projections(_setup.gb)
+    return _setup
+
+
+class TestMechanics:
+    def test_convergence_history(self, setup):
+        """ The history of the convergence checks is recorded per time step"""
+        newton_params = {
+            "max_iterations": 40,
+            "nl_convergence_tol": 1e-5,
+            "nl_divergence_tol": 1e5,
+        }
+        pp.run_time_dependent_model(setup, newton_params)
+
+        history = setup.convergence_monitor.to_dataframe()
+        assert not history.time.isna().any()
+        assert np.allclose(history.time.unique(), [1, 2])
+        for _, step in history.groupby("time"):
+            iterations = step.iteration.unique()
+            assert np.all(iterations == np.arange(1, iterations.size + 1))
+        assert set(history.block) == {"displacement", "contact"}
@@ -1,12 +1,20 @@
 # Refinement methods
 from refinement.grid_refinement import (
     coarse_fine_cell_mapping,
+    compose_parent_maps,
     gb_coarse_fine_cell_mapping,
+    gb_set_coarse_fine_cell_mapping,
+    gb_splitting_parent_maps,
     refine_mesh_by_splitting,
+    splitting_parent_map,
 )
 
 __all__ = [
     "refine_mesh_by_splitting",
     "coarse_fine_cell_mapping",
     "gb_coarse_fine_cell_mapping",
+    "splitting_parent_map",
+    "gb_splitting_parent_maps",
+    "compose_parent_maps",
+    "gb_set_coarse_fine_cell_mapping",
 ]
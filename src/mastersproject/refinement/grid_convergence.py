@@ -1,7 +1,9 @@
 import logging
-from typing import List
+from pathlib import Path
+from typing import Dict, List, Tuple
 
 import numpy as np
+import pandas as pd
 
 import porepy as pp
 from mastersproject.util.logging_util import trace
@@ -122,3 +124,272 @@ def grid_error(
             }
 
     return errors
+
+
+def save_level_solution(gb: pp.GridBucket, folder: Path, variable: List[str]) -> None:
+    """ Persist the solution of a grid bucket to .npy files
+
+    For each grid, the state of each variable in 'variable' (if present),
+    the cell volumes and the cell connectivity are stored as
+        <folder>/grid_<node_number>_<variable>.npy
+        <folder>/grid_<node_number>_cell_volumes.npy
+        <folder>/grid_<node_number>_face_cells.npy
+        <folder>/grid_<node_number>_face_weights.npy
+    See cell_connectivity for the latter two.
+
+    Parameters
+    ----------
+    gb : pp.GridBucket
+        Grid bucket with a solution in pp.STATE
+    folder : Path
+        Folder to store the solution in
+    variable : List[str]
+        Variables to store
+    """
+    folder = Path(folder)
+    folder.mkdir(parents=True, exist_ok=True)
+    gb.assign_node_ordering(overwrite_existing=False)
+    for g, d in gb:
+        node_number = d["node_number"]
+        np.save(_level_file(folder, node_number, "cell_volumes"), g.cell_volumes)
+        face_cells, face_weights = cell_connectivity(g)
+        np.save(_level_file(folder, node_number, "face_cells"), face_cells)
+        np.save(_level_file(folder, node_number, "face_weights"), face_weights)
+        for var in variable:
+            if var in d[pp.STATE]:
+                np.save(_level_file(folder, node_number, var), d[pp.STATE][var])
+
+
+def cell_connectivity(g: pp.Grid) -> Tuple[np.ndarray, np.ndarray]:
+    """ Neighbouring cells and two-point weights of the interior faces of a grid
+
+    Returns
+    -------
+    face_cells : np.ndarray (2, num_interior_faces)
+        The two cells of each interior face
+    face_weights : np.ndarray (num_interior_faces,)
+        Face area divided by the distance between the cell centers. The sum
+        sum_f w_f (e_i - e_j)^2 is a discrete H1-seminorm (squared).
+    """
+    if g.dim == 0:
+        return np.zeros((2, 0), dtype=int), np.zeros(0)
+    cell_faces = g.cell_faces.tocsr()
+    faces, cells = cell_faces.nonzero()
+    num_cells_of_face = np.bincount(faces, minlength=g.num_faces)
+    interior = num_cells_of_face[faces] == 2
+    faces, cells = faces[interior], cells[interior]
+    order = np.lexsort((cells, faces))
+    face_cells = cells[order].reshape((-1, 2)).T
+    interior_faces = faces[order][::2]
+    dist = np.linalg.norm(
+        g.cell_centers[:, face_cells[0]] - g.cell_centers[:, face_cells[1]], axis=0
+    )
+    return face_cells, g.face_areas[interior_faces] / dist
+
+
+def load_level_array(
+    folder: Path, node_number: int, name: str, mmap: bool = True
+) -> np.ndarray:
+    """ Load an array stored by save_level_solution, or None if not stored
+
+    If mmap, the array is memory-mapped rather than read into memory.
+    """
+    path = _level_file(Path(folder), node_number, name)
+    if not path.is_file():
+        return None
+    return np.load(path, mmap_mode="r" if mmap else None)
+
+
+def _level_file(folder: Path, node_number: int, name: str) -> Path:
+    return folder / f"grid_{node_number}_{name}.npy"
+
+
+@trace(logger=logger)
+def grid_error_from_files(
+    folder: Path,
+    folder_ref: Path,
+    parents: Dict[int, np.ndarray],
+    variable: List[str],
+    variable_dof: List[int],
+    chunk_size: int = 2 ** 20,
+) -> dict:
+    """ Compute grid errors from solutions stored by save_level_solution
+
+    The reference solution is memory-mapped, and the errors are accumulated over
+    chunks of fine cells (and faces), so that memory use is bounded by the
+    coarse solution, the parent map and one chunk.
+
+    For each variable component, the following norms of the error e = Pu - u_ref
+    are computed, where P maps the coarse solution to the fine cells:
+        l2 : sqrt(sum_c V_c e_c^2), cell-volume weighted L2-norm
+        linf : max_c |e_c|
+        energy : sqrt(sum_f w_f (e_i - e_j)^2), discrete H1-seminorm
+            (see cell_connectivity)
+    Each norm is divided by the same norm of u_ref, unless that is zero
+    for some component.
+
+    Parameters
+    ----------
+    folder, folder_ref : Path
+        Folders of the coarse and reference (fine) solutions, respectively
+    parents : Dict[int, np.ndarray]
+        For each grid (by node_number), the coarse cell of each fine cell.
+        See refinement.grid_refinement.compose_parent_maps.
+    variable : List[str]
+        which variables to compute error over
+    variable_dof : List[int]
+        Degrees of freedom for each variable in the list 'variable'.
+    chunk_size : int
+        Number of fine cells (faces) per chunk
+
+    Returns
+    -------
+    errors : dict
+        Dictionary with top level keys as node_number, within which for each
+        variable, the errors 'l2', 'linf' and 'energy' (one entry per component)
+        and 'is_relative' are reported. 'error' is the l2 error.
+    """
+    if not isinstance(variable, list):
+        variable = [variable]
+    if not isinstance(variable_dof, list):
+        variable_dof = [variable_dof]
+    assert len(variable) == len(variable_dof), (
+        "Each variable must have associated " "with it a number of degrees of freedom."
+    )
+
+    errors = {}
+    for node_number, parent in parents.items():
+        errors[node_number] = {}
+        volumes = load_level_array(folder_ref, node_number, "cell_volumes")
+        face_cells = load_level_array(folder_ref, node_number, "face_cells")
+        face_weights = load_level_array(folder_ref, node_number, "face_weights")
+        for var, var_dof in zip(variable, variable_dof):
+            state = load_level_array(folder, node_number, var, mmap=False)
+            state_ref = load_level_array(folder_ref, node_number, var)
+            if state is None or state_ref is None:
+                logger.info(f"{var} not present on grid number {node_number}.")
+                continue
+
+            # Cell-major layout: row c holds the components of cell c.
+            sol = state.reshape((-1, var_dof))
+            sol_ref = state_ref.reshape((-1, var_dof))
+            error_norms, ref_norms = _stream_norms(
+                sol, sol_ref, parent, volumes, face_cells, face_weights, chunk_size
+            )
+
+            is_relative = not any(np.any(n < 1e-10) for n in ref_norms.values())
+            if not is_relative:
+                logger.info(
+                    f"Relative error not reportable. "
+                    f"Norm of reference solution is {ref_norms}. "
+                    f"Reporting absolute error"
+                )
+            else:
+                error_norms = {k: error_norms[k] / ref_norms[k] for k in error_norms}
+
+            errors[node_number][var] = {
+                **error_norms,
+                "error": error_norms["l2"],
+                "is_relative": is_relative,
+            }
+    return errors
+
+
+def _stream_norms(
+    sol: np.ndarray,
+    sol_ref: np.ndarray,
+    parent: np.ndarray,
+    volumes: np.ndarray,
+    face_cells: np.ndarray,
+    face_weights: np.ndarray,
+    chunk_size: int,
+) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+    """ Norms of the error sol[parent] - sol_ref, and of sol_ref, by chunks
+
+    sol and sol_ref are (num_cells, num_components). Returns the norms
+    {"l2", "linf", "energy"} of the error and of the reference, respectively.
+    """
+    num_cells, num_dof = sol_ref.shape
+    sums = {
+        k: np.zeros(num_dof) for k in ("l2_err", "l2_ref", "en_err", "en_ref")
+    }
+    linf_err, linf_ref = np.zeros(num_dof), np.zeros(num_dof)
+
+    for start in range(0, num_cells, chunk_size):
+        cells = slice(start, min(start + chunk_size, num_cells))
+        ref = np.asarray(sol_ref[cells])
+        err = sol[parent[cells]] - ref
+        vol = np.asarray(volumes[cells])[:, None]
+        sums["l2_err"] += np.sum(vol * err ** 2, axis=0)
+        sums["l2_ref"] += np.sum(vol * ref ** 2, axis=0)
+        linf_err = np.maximum(linf_err, np.abs(err).max(axis=0, initial=0))
+        linf_ref = np.maximum(linf_ref, np.abs(ref).max(axis=0, initial=0))
+
+    num_faces = face_weights.size
+    for start in range(0, num_faces, chunk_size):
+        faces = slice(start, min(start + chunk_size, num_faces))
+        i, j = np.asarray(face_cells[0, faces]), np.asarray(face_cells[1, faces])
+        w = np.asarray(face_weights[faces])[:, None]
+        ref_i, ref_j = sol_ref[i], sol_ref[j]
+        jump_err = (sol[parent[i]] - ref_i) - (sol[parent[j]] - ref_j)
+        sums["en_err"] += np.sum(w * jump_err ** 2, axis=0)
+        sums["en_ref"] += np.sum(w * (ref_i - ref_j) ** 2, axis=0)
+
+    error_norms = {
+        "l2": np.sqrt(sums["l2_err"]),
+        "linf": linf_err,
+        "energy": np.sqrt(sums["en_err"]),
+    }
+    ref_norms = {
+        "l2": np.sqrt(sums["l2_ref"]),
+        "linf": linf_ref,
+        "energy": np.sqrt(sums["en_ref"]),
+    }
+    return error_norms, ref_norms
+
+
+def convergence_rates(errors: List[dict], refinement_ratio: float = 2) -> pd.DataFrame:
+    """ Observed convergence rates of a refinement hierarchy
+
+    Parameters
+    ----------
+    errors : List[dict]
+        Errors of each level relative to the finest (reference) level, in
+        increasing order of refinement. See grid_error_from_files.
+    refinement_ratio : float
+        Ratio of the cell sizes of consecutive levels. 2 for uniform splitting.
+
+    Returns
+    -------
+    rates : pd.DataFrame
+        One row per level, grid (node_number), variable, norm and component,
+        with the error and the observed rate
+            log(e_{i-1} / e_i) / log(refinement_ratio)
+        between the level and the next coarser level (NaN for the coarsest).
+    """
+    rows = []
+    for level, level_errors in enumerate(errors):
+        for node_number, var_errors in level_errors.items():
+            for var, norms in var_errors.items():
+                for norm in ("l2", "linf", "energy"):
+                    if norm not in norms:
+                        continue
+                    for component, e in enumerate(np.atleast_1d(norms[norm])):
+                        rows.append(
+                            {
+                                "level": level,
+                                "node_number": node_number,
+                                "variable": var,
+                                "norm": norm,
+                                "component": component,
+                                "error": e,
+                            }
+                        )
+    columns = ["level", "node_number", "variable", "norm", "component", "error"]
+    rates = pd.DataFrame(rows, columns=columns)
+    keys = ["node_number", "variable", "norm", "component"]
+    rates = rates.sort_values(keys + ["level"]).reset_index(drop=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = rates.groupby(keys)["error"].shift(1) / rates["error"]
+        rates["rate"] = np.log(ratio) / np.log(refinement_ratio)
+    return rates
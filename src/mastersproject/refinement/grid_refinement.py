@@ -1,9 +1,10 @@
 import logging
 from pathlib import Path
-from typing import Generator, Union
+from typing import Dict, Generator, List, Optional, Tuple, Union
 
 import numpy as np
 import scipy.sparse as sps
+from scipy.spatial import cKDTree
 
 import porepy as pp
 from porepy.fracs.meshing import grid_list_to_grid_bucket
@@ -19,12 +20,21 @@ def refine_mesh_by_splitting(
     out_file: Union[str, Path],
     dim: int,
     gb_set_projections: bool = True,
-) -> Generator[pp.GridBucket, None, None]:
+    parent_maps: bool = False,
+) -> Generator[
+    Union[pp.GridBucket, Tuple[pp.GridBucket, Optional[Dict[int, np.ndarray]]]],
+    None,
+    None,
+]:
     """ Refine a mesh by splitting using gmsh
 
     The method generates refinements on the fly
     by yielding GridBuckets as desired.
 
+    If parent_maps is True, each grid bucket is yielded together with the
+    parent of each of its cells in the previous (coarser) grid bucket.
+    See gb_splitting_parent_maps. The coarsest grid bucket has no parents (None).
+
     Note:
     When the desired number of refinements is reached,
     you should call
@@ -43,9 +53,11 @@ def refine_mesh_by_splitting(
     gb_set_projections : bool (Default: True)
         Call pp.contact_conditions.set_projections(gb)
         before yielding result
+    parent_maps : bool (Default: False)
+        Yield (gb, parents) instead of gb.
     Returns
     -------
-    Generator[gb]
+    Generator[gb] or Generator[Tuple[gb, parents]]
         A generator for the refined grid buckets, starting with the coarsest.
     """
     # Ensure that in- and out paths are formatted correctly.
@@ -73,6 +85,7 @@ def refine_mesh_by_splitting(
         gmsh.model.mesh.generate(dim=dim)
 
         num_refinements = 0
+        gb_prev = None
 
         # Enter an infinite loop
         while True:
@@ -94,7 +107,14 @@ def refine_mesh_by_splitting(
                 pp.contact_conditions.set_projections(gb)
 
             # yield the resulting grid bucket
-            yield gb
+            if parent_maps:
+                parents = None
+                if gb_prev is not None:
+                    parents = gb_splitting_parent_maps(gb_prev, gb)
+                gb_prev = gb
+                yield gb, parents
+            else:
+                yield gb
 
             # finally, prepare the next iteration
             num_refinements += 1
@@ -103,6 +123,124 @@ def refine_mesh_by_splitting(
         gmsh.finalize()
 
 
+def gb_splitting_parent_maps(
+    gb: pp.GridBucket, gb_ref: pp.GridBucket
+) -> Dict[int, np.ndarray]:
+    """ Parent cells of a grid bucket refined once by splitting
+
+    Parameters
+    ----------
+    gb : pp.GridBucket
+        Coarse grid bucket
+    gb_ref : pp.GridBucket
+        gb refined once by splitting
+
+    Returns
+    -------
+    parents : Dict[int, np.ndarray]
+        For each grid (by node_number), the coarse cell of each fine cell.
+    """
+    gb.assign_node_ordering(overwrite_existing=False)
+    gb_ref.assign_node_ordering(overwrite_existing=False)
+
+    parents = {}
+    for g, g_ref in zip(gb.get_grids(), gb_ref.get_grids()):
+        node_num = gb.node_props(g, "node_number")
+        node_num_ref = gb_ref.node_props(g_ref, "node_number")
+        assert node_num == node_num_ref, "Weakly check that grids refer to same domain."
+        parents[node_num] = splitting_parent_map(g, g_ref)
+    return parents
+
+
+def splitting_parent_map(g: pp.Grid, g_ref: pp.Grid) -> np.ndarray:
+    """ Parent cells of a simplex grid refined once by splitting
+
+    Uniform splitting divides each simplex into 2**dim children, with vertices at
+    the vertices and edge midpoints of the parent (1:2 segments, 1:4 triangles,
+    1:8 tetrahedra). The center of each child then has barycentric coordinates
+    of at least 1 / (2 * (dim + 1)) in its parent, and lies far from the boundary
+    of any other coarse cell. The parent is therefore identified without a
+    tolerance, and the splitting pattern is verified.
+
+    Parameters
+    ----------
+    g : pp.Grid
+        Coarse grid
+    g_ref : pp.Grid
+        g refined once by splitting
+
+    Returns
+    -------
+    parent : np.ndarray (g_ref.num_cells,)
+        The coarse cell of each fine cell
+
+    Raises
+    ------
+    ValueError
+        If g_ref is not a refinement of g by splitting
+    """
+    assert g.dim == g_ref.dim, "Grids must be of same dimension"
+    if g.dim == 0:
+        return np.zeros(g_ref.num_cells, dtype=int)
+
+    margin = 1 / (2 * (g.dim + 1))
+    parent, min_coord = _locate_fine_cells(g, g_ref, tol=0)
+    children = np.bincount(parent[parent >= 0], minlength=g.num_cells)
+    if not (
+        np.all(parent >= 0)
+        and np.all(min_coord > margin / 2)
+        and np.all(children == 2 ** g.dim)
+    ):
+        raise ValueError(
+            f"The {g.dim}D grid with {g_ref.num_cells} cells is not a refinement by "
+            f"splitting of the grid with {g.num_cells} cells"
+        )
+    return parent
+
+
+def compose_parent_maps(
+    parent_maps: List[Dict[int, np.ndarray]]
+) -> Dict[int, np.ndarray]:
+    """ Parents of the cells of the finest grid bucket in the coarsest
+
+    Parameters
+    ----------
+    parent_maps : List[Dict[int, np.ndarray]]
+        Parent maps of consecutive refinements, ordered from coarse to fine.
+        parent_maps[i] maps cells of level i + 1 to cells of level i.
+
+    Returns
+    -------
+    parents : Dict[int, np.ndarray]
+        For each grid (by node_number), the coarsest cell of each finest cell.
+    """
+    parents = dict(parent_maps[-1])
+    for level in reversed(parent_maps[:-1]):
+        parents = {n: level[n][p] for n, p in parents.items()}
+    return parents
+
+
+def gb_set_coarse_fine_cell_mapping(
+    gb: pp.GridBucket, parents: Dict[int, np.ndarray]
+) -> None:
+    """ Set the node prop 'coarse_fine_cell_mapping' from known parent cells
+
+    This is an exact alternative to gb_coarse_fine_cell_mapping, for refinements
+    where the parents are known, see refine_mesh_by_splitting.
+
+    Parameters
+    ----------
+    gb : pp.GridBucket
+        Coarse grid bucket
+    parents : Dict[int, np.ndarray]
+        For each grid (by node_number), the coarse cell of each fine cell.
+    """
+    gb.add_node_props(keys="coarse_fine_cell_mapping")
+    for g, d in gb:
+        mapping = _parent_to_mapping(parents[d["node_number"]], g.num_cells)
+        gb.set_node_prop(g, key="coarse_fine_cell_mapping", val=mapping)
+
+
 @trace(logger)
 def gb_coarse_fine_cell_mapping(
     gb: pp.GridBucket, gb_ref: pp.GridBucket, tol=1e-8
@@ -174,7 +312,8 @@ def coarse_fine_cell_mapping(
     g_ref : pp.Grid
         Refined grid
     point_in_poly_tol : float, Optional
-        Tolerance for pp.geometry_property_checks.point_in_polyhedron()
+        Tolerance for the barycentric coordinates of a fine cell center in
+        its coarse cell. The center is inside if all coordinates are >= -tol.
 
     Returns
     -------
@@ -193,127 +332,158 @@ def coarse_fine_cell_mapping(
 
     The procedure for creating this mapping relies on two main assumptions.
         1. Each fine cell is fully contained inside exactly one coarse cell.
-        2. Each cell can be characterised as a simplex.
-            - i.e. Every node except one defines every face of the object.
+        2. Each cell is a simplex.
 
     The first assumption implies that the problem of assessing if a fine
     cell is contained within a coarse cell is reduced to assessing if
     the center of a fine cell is contained within the coarse cell.
 
-    The second assumption implies that a cell in any dimension (1D, 2D, 3D)
-    will be a convex object. This way, we can use existing algorithms in
-    PorePy to find if a point is inside a polygon (2D) or polyhedron (3D).
-    (The 1D case is trivial)
-
-    The general algorithm is as follows (refer to start of for-loop in
-    the code):
-    1. Make a list of (pointers to) untested cell centers called
-        'test_cells_ptr'.
-    2. Iterate through all coarse cells. Now, consider one of these:
-    3. For all untested cell centers (defined by 'test_cells_ptr'),
-        check if they are inside the coarse cell.
-    4. Those that pass (is inside the coarse cell) add to the mapping,
-        then remove those point from the list of untested cell centers.
-    5. Assemble the mapping.
+    The second assumption implies that containment can be tested by the
+    barycentric coordinates of the point with respect to the simplex.
 
+    The general algorithm is as follows:
+    1. Rotate 1D and 2D grids to local coordinates.
+    2. Compute the barycentric transformation of every coarse cell.
+    3. For each fine cell center, find the k nearest coarse cell centers by a
+        KD-tree, and test containment in these candidates (vectorized).
+        Points not contained in any candidate are searched again with
+        twice as many candidates.
+    4. Assemble the mapping.
+
+    The cost is O(N_fine log N_coarse).
     """
 
     assert g.num_cells < g_ref.num_cells, "Wrong order of input grids"
     assert g.dim == g_ref.dim, "Grids must be of same dimension"
 
-    # 1. Step: Create a list of tuples pointing to the (start, end)
-    # index of the nodes of each cell on the coarse grid.
-    cell_nodes = g.cell_nodes()
-    # start/end row pointers for each column
-    nodes_of_cell_ptr = zip(cell_nodes.indptr[:-1], cell_nodes.indptr[1:])
+    parent, _ = _locate_fine_cells(g, g_ref, tol=point_in_poly_tol)
+    assert np.all(
+        parent >= 0
+    ), "Every fine cell should be inside exactly one coarse cell"
+
+    # 4. Step: assemble the sparse matrix with the mapping.
+    return _parent_to_mapping(parent, g.num_cells)
 
-    # 2. Step: Initialize a sps.csc_matrix mapping fine cells to
-    # coarse cells.
-    indptr = np.array([0])
-    indices = np.empty(0)
 
-    cells_ref = g_ref.cell_centers.copy()  # Cell centers in fine grid
-    test_cells_ptr = np.arange(g_ref.num_cells)  # Pointer to cell centers
-    nodes = g.nodes.copy()
+def _locate_fine_cells(
+    g: pp.Grid, g_ref: pp.Grid, tol: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """ Find the coarse cell containing each fine cell center
 
-    # 3. Step: If the grids are in 1D or 2D, we can simplify the
-    # calculation by rotating the coordinate system to local
-    # coordinates. For example, a 2D grid embedded in 3D
-    # would be "rotated" so that each coordinate
-    #           is of the form (x, y, 0).
+    See coarse_fine_cell_mapping for the algorithm (steps 1-3).
+
+    Returns
+    -------
+    parent : np.ndarray (g_ref.num_cells,)
+        Index of the coarse cell containing each fine cell center, or -1 if none.
+    min_coord : np.ndarray (g_ref.num_cells,)
+        Smallest barycentric coordinate of each fine cell center in its coarse cell.
+        This measures how far inside the coarse cell the center is.
+    """
+    if g.dim == 0:
+        # Point grids have one cell each
+        return np.zeros(g_ref.num_cells, dtype=int), np.ones(g_ref.num_cells)
+
+    # 1. Step: If the grids are in 1D or 2D, we simplify the calculation by
+    # rotating the coordinate system to local coordinates. For example, a 2D grid
+    # embedded in 3D would be "rotated" so that each coordinate is of the form
+    # (x, y, 0).
+    nodes = g.nodes.copy()
+    cells_ref = g_ref.cell_centers.copy()  # Cell centers in fine grid
     if g.dim == 1:
         # Rotate coarse nodes and fine cell centers to align with the x-axis
         tangent = pp.map_geometry.compute_tangent(nodes)
         reference = [1, 0, 0]
         R = pp.map_geometry.project_line_matrix(nodes, tangent, reference=reference,)
-        nodes = R.dot(nodes)[0, :]
-        cells_ref = R.dot(cells_ref)[0, :]
+        nodes = R.dot(nodes)[:1, :]
+        cells_ref = R.dot(cells_ref)[:1, :]
 
-    elif g.dim == 2:  # Pre-processing for efficiency
+    elif g.dim == 2:
         # Rotate coarse nodes and fine cell centers to the xy-plane.
         R = pp.map_geometry.project_plane_matrix(nodes, check_planar=False)
         nodes = np.dot(R, nodes)[:2, :]
         cells_ref = np.dot(R, cells_ref)[:2, :]
 
-    # 4. Step: Loop through every coarse cell
-    for st, nd in nodes_of_cell_ptr:
-
-        nodes_idx = cell_nodes.indices[st:nd]
-        num_nodes = nodes_idx.size
-
-        # 5. Step: for the appropriate grid dimension, test all cell centers not already
-        # found to be inside some other coarse cell.
-        # 'in_poly' is a boolean array that is True for the points inside and False for
-        # the points not inside.
-        if g.dim == 1:
-            # In 1D, we use a numpy method to check which coarse cell the fine points
-            # are inside.
-            assert num_nodes == 2, "We assume a 'cell' in 1D is defined by two points."
-            line = np.sort(nodes[nodes_idx])
-            test_points = cells_ref[test_cells_ptr]
-            in_poly = np.searchsorted(line, test_points, side="left") == 1
-
-        elif g.dim == 2:
-            assert num_nodes == 3, "We assume simplexes in 2D (i.e. 3 nodes)"
-            polygon = nodes[:, nodes_idx]
-            test_points = cells_ref[:, test_cells_ptr]
-            in_poly = pp.geometry_property_checks.point_in_polygon(
-                poly=polygon, p=test_points, tol=point_in_poly_tol
-            )
-
-        elif g.dim == 3:
-            # Make polyhedron from node coordinates.
-            # Polyhedron defined as a list of nodes defining its (convex) faces.
-            # Assumes simplexes: Every node except one defines every face.
-            assert num_nodes == 4, "We assume simplexes in 3D (i.e. 4 nodes)"
-            node_coords = nodes[:, nodes_idx]
-
-            ids = np.arange(num_nodes)
-            polyhedron = [node_coords[:, ids != i] for i in np.arange(num_nodes)]
-            # Test only points not inside another polyhedron.
-            test_points = cells_ref[:, test_cells_ptr]
-            in_poly = pp.geometry_property_checks.point_in_polyhedron(
-                polyhedron=polyhedron, test_points=test_points, tol=point_in_poly_tol
-            )
-
-        else:
-            logger.warning(f"A grid of dimension {g.dim} encountered. Skip!")
-            continue
-
-        # 6. Step: Update pointer to which cell centers to use as test points
-        in_poly_ids = test_cells_ptr[in_poly]  # id of cells inside this polyhedron
-        # Keep only cells not inside this polyhedron
-        test_cells_ptr = test_cells_ptr[~in_poly]
-
-        # Update mapping
-        indices = np.append(indices, in_poly_ids)
-        indptr = np.append(indptr, indptr[-1] + in_poly_ids.size)
-
-    # 7. Step: assemble the sparse matrix with the mapping.
-    data = np.ones(indices.size)
-    coarse_fine = sps.csc_matrix((data, indices, indptr))
-
-    assert (
-        indices.size == g_ref.num_cells
-    ), "Every fine cell should be inside exactly one coarse cell"
-    return coarse_fine
+    # 2. Step: Vertices of the coarse simplices, and the inverse of the
+    # transformation from barycentric to local coordinates.
+    cell_nodes = g.cell_nodes().tocsc()
+    num_nodes = np.diff(cell_nodes.indptr)
+    assert np.all(
+        num_nodes == g.dim + 1
+    ), f"We assume simplexes in {g.dim}D (i.e. {g.dim + 1} nodes)"
+    cell_nodes.sort_indices()
+    simplices = nodes.T[cell_nodes.indices.reshape((g.num_cells, g.dim + 1))]
+    origin = simplices[:, 0, :]  # (num_cells, dim)
+    # Columns are the edge vectors from the first vertex
+    T = np.transpose(simplices[:, 1:, :] - origin[:, None, :], (0, 2, 1))
+    T_inv = np.linalg.inv(T)  # (num_cells, dim, dim)
+    centers = simplices.mean(axis=1)
+
+    # 3. Step: Candidate search and containment test
+    points = cells_ref.T  # (num_fine, dim)
+    parent = np.full(g_ref.num_cells, -1, dtype=int)
+    min_coord = np.full(g_ref.num_cells, -np.inf)
+    tree = cKDTree(centers)
+    remaining = np.arange(g_ref.num_cells)
+    k = min(2 ** g.dim + 1, g.num_cells)
+    while remaining.size > 0:
+        _, candidates = tree.query(points[remaining], k=k)
+        candidates = candidates.reshape((remaining.size, k))
+        inside = _min_barycentric_coordinate(
+            points[remaining], candidates, origin, T_inv
+        )
+        # Choose the candidate where the point is most interior
+        best = np.argmax(inside, axis=1)
+        best_coord = inside[np.arange(remaining.size), best]
+        found = best_coord >= -tol
+        parent[remaining[found]] = candidates[found, best[found]]
+        min_coord[remaining[found]] = best_coord[found]
+        remaining = remaining[~found]
+
+        if k == g.num_cells:
+            break
+        k = min(2 * k, g.num_cells)
+
+    return parent, min_coord
+
+
+def _min_barycentric_coordinate(
+    points: np.ndarray, candidates: np.ndarray, origin: np.ndarray, T_inv: np.ndarray
+) -> np.ndarray:
+    """ Smallest barycentric coordinate of each point in each candidate simplex
+
+    Parameters
+    ----------
+    points : np.ndarray (num_points, dim)
+    candidates : np.ndarray (num_points, k)
+        Candidate simplices of each point
+    origin : np.ndarray (num_simplices, dim)
+        First vertex of each simplex
+    T_inv : np.ndarray (num_simplices, dim, dim)
+        Inverse of the matrices of edge vectors of each simplex
+
+    Returns
+    -------
+    min_coord : np.ndarray (num_points, k)
+        Non-negative if and only if the point is inside the candidate
+    """
+    diff = points[:, None, :] - origin[candidates]  # (num_points, k, dim)
+    coords = np.einsum("pkij,pkj->pki", T_inv[candidates], diff)
+    first = 1 - coords.sum(axis=2)
+    return np.minimum(first, coords.min(axis=2))
+
+
+def _parent_to_mapping(parent: np.ndarray, num_coarse: int) -> sps.csc_matrix:
+    """ Coarse-fine mapping from the coarse cell (parent) of each fine cell
+
+    The matrix is built directly in csc format: the fine cells sorted by their
+    coarse cell are the row indices, and the column pointers are the cumulative
+    number of fine cells per coarse cell.
+    """
+    indices = np.argsort(parent, kind="stable")
+    counts = np.bincount(parent, minlength=num_coarse)
+    indptr = np.hstack((0, np.cumsum(counts)))
+    data = np.ones(parent.size)
+    return sps.csc_matrix(
+        (data, indices, indptr), shape=(parent.size, num_coarse)
+    )
@@ -1,15 +1,26 @@
 import logging
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
-from typing import Callable, Generator, List, Tuple, Type, Union
+from typing import Callable, Dict, Generator, List, Optional, Tuple, Type, Union
+
+import numpy as np
 
 import porepy as pp
 from GTS.isc_modelling.flow import Flow
 from GTS.isc_modelling.parameter import GeometryParameters
 from porepy.models.contact_mechanics_model import ContactMechanics
-from refinement.grid_convergence import grid_error
+from refinement.grid_convergence import (
+    convergence_rates,
+    grid_error,
+    grid_error_from_files,
+    save_level_solution,
+)
 from refinement.grid_refinement import (
-    gb_coarse_fine_cell_mapping,
+    compose_parent_maps,
+    gb_set_coarse_fine_cell_mapping,
     refine_mesh_by_splitting,
 )
 
@@ -20,6 +31,7 @@ def gb_refinements(
     network: Union[pp.FractureNetwork3d, pp.FractureNetwork2d],
     gmsh_folder_path: Union[str, Path],
     mesh_args: dict,
+    parent_maps: bool = False,
 ) -> Generator[pp.GridBucket, None, None]:
     """ Create n refinements of a fracture network.
 
@@ -35,6 +47,8 @@ def gb_refinements(
         Absolute path to folder to store results in
     mesh_args : dict
         Arguments for meshing (of coarsest grid)
+    parent_maps : bool (Default: False)
+        Yield (gb, parents). See refine_mesh_by_splitting.
 
     Returns
     -------
@@ -65,7 +79,7 @@ def gb_refinements(
     network.to_gmsh(in_file, in_3d=True)
 
     yield from refine_mesh_by_splitting(
-        in_file=in_file, out_file=out_file, dim=dim,
+        in_file=in_file, out_file=out_file, dim=dim, parent_maps=parent_maps,
     )
 
 
@@ -117,6 +131,9 @@ def run_model_for_convergence_study(
         the error for each variable on each grid.
         Each list entry corresponds index-wise to an
         entry in gb_list.
+
+    See also run_model_for_convergence_study_parallel, which solves the
+    refinement levels in parallel and keeps the solutions on disk.
     """
 
     # 1. Step: Create n grids by uniform refinement.
@@ -138,9 +155,13 @@ def run_model_for_convergence_study(
         network=network,
         gmsh_folder_path=params.folder_name,
         mesh_args=params.mesh_args,
+        parent_maps=True,
     )
-    gb_list = [next(gb_generator) for _ in range(0, n_refinements + 1)]
+    levels = [next(gb_generator) for _ in range(0, n_refinements + 1)]
     gb_generator.close()
+    gb_list = [gb for gb, _ in levels]
+    # parent_maps[i] maps cells of grid i + 1 to cells of grid i
+    parent_maps = [parents for _, parents in levels[1:]]
 
     # -----------------------
     # --- SETUP AND SOLVE ---
@@ -166,7 +187,8 @@ def run_model_for_convergence_study(
     errors = []
     for i in range(0, n_refinements):
         gb_i = gb_list[i]
-        gb_coarse_fine_cell_mapping(gb=gb_i, gb_ref=gb_ref)
+        # Exact mapping from the splitting pattern, composed to the finest grid
+        gb_set_coarse_fine_cell_mapping(gb_i, compose_parent_maps(parent_maps[i:]))
 
         _error = grid_error(
             gb=gb_i, gb_ref=gb_ref, variable=variable, variable_dof=variable_dof,
@@ -176,6 +198,154 @@ def run_model_for_convergence_study(
     return gb_list, errors
 
 
+def run_model_for_convergence_study_parallel(
+    model: Union[Type[Flow], Type[ContactMechanics]],
+    run_model_method: Callable,
+    network: Union[pp.FractureNetwork3d, pp.FractureNetwork2d],
+    params: GeometryParameters,
+    n_refinements: int = 1,
+    newton_params: dict = None,
+    variable: List[str] = None,
+    variable_dof: List[int] = None,
+    max_workers: Optional[int] = None,
+) -> Tuple[List[Path], List[dict]]:
+    """ Run a model on a grid, refined n times, solving each level in parallel.
+
+    This is an alternative to run_model_for_convergence_study for large grids.
+    Each refinement level is pickled to disk as soon as it is generated, and
+    solved in a separate worker process, starting with the finest (and most
+    expensive) level. The solution of each level is stored by
+    save_level_solution, and the error of a coarse level is computed from the
+    stored solutions as soon as both it and the reference level are done.
+    The main process thus never holds more than two consecutive levels.
+
+    The model class and run_model_method must be picklable,
+    i.e. defined at module level. Each level is run with its level folder as
+    params.folder_name, such that the outputs of the levels are kept apart.
+
+    Parameters
+    ----------
+    model, run_model_method, network, params, n_refinements, newton_params,
+    variable, variable_dof
+        See run_model_for_convergence_study
+    max_workers : int, Optional
+        Number of worker processes. Default: one per refinement level,
+        limited by the number of cores.
+
+    Returns
+    -------
+    level_folders : List[Path]
+        list of (n+1) folders with the stored solution of each level,
+        in increasing order of refinement (reference last).
+    errors : List[dict]
+        List of (n) dictionaries, each containing
+        the error norms for each variable on each grid.
+        See grid_error_from_files. Each list entry corresponds index-wise to an
+        entry in level_folders. The observed convergence rates are written to
+        refinement_levels/convergence_rates.csv.
+    """
+    logger.info(
+        f"Preparing parallel setup for convergence study "
+        f"on {datetime.now().isoformat()}"
+    )
+    newton_params = newton_params if newton_params else {}
+    root = Path(params.folder_name) / "refinement_levels"
+
+    # 1. Step: Create the grids, and store each of them to disk
+    gb_generator = gb_refinements(
+        network=network,
+        gmsh_folder_path=params.folder_name,
+        mesh_args=params.mesh_args,
+        parent_maps=True,
+    )
+    level_folders: List[Path] = []
+    parent_maps: List[Dict[int, np.ndarray]] = []
+    for level in range(n_refinements + 1):
+        gb, parents = next(gb_generator)
+        if parents is not None:
+            parent_maps.append(parents)
+        folder = root / f"level_{level}"
+        folder.mkdir(parents=True, exist_ok=True)
+        gb.assign_node_ordering(overwrite_existing=False)
+        with open(folder / "gb.pkl", "wb") as f:
+            pickle.dump(gb, f, protocol=pickle.HIGHEST_PROTOCOL)
+        level_folders.append(folder)
+        del gb
+    gb_generator.close()
+
+    # 2. Step: Solve all levels, finest first, and compute the errors of the coarse
+    # levels as soon as they, and the reference level, are done.
+    ref = n_refinements
+    errors: List[Optional[dict]] = [None] * n_refinements
+    done: List[int] = []
+
+    def _compute_error(i: int) -> None:
+        errors[i] = grid_error_from_files(
+            folder=level_folders[i],
+            folder_ref=level_folders[ref],
+            parents=compose_parent_maps(parent_maps[i:]),
+            variable=variable,
+            variable_dof=variable_dof,
+        )
+        logger.info(f"Errors of refinement level {i}: {errors[i]}")
+
+    if max_workers is None:
+        max_workers = min(n_refinements + 1, os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                _solve_level,
+                model,
+                run_model_method,
+                params,
+                newton_params,
+                level_folders[i],
+                variable,
+            ): i
+            for i in reversed(range(n_refinements + 1))
+        }
+        for future in as_completed(futures):
+            i = futures[future]
+            future.result()  # Raise exceptions from the workers
+            logger.info(f"Refinement level {i} solved.")
+            done.append(i)
+            if i == ref:
+                for j in done[:-1]:
+                    _compute_error(j)
+            elif ref in done:
+                _compute_error(i)
+
+    # 3. Step: Observed convergence rates
+    rates = convergence_rates(errors)
+    rates.to_csv(root / "convergence_rates.csv", index=False)
+    logger.info(f"Convergence rates:\n{rates}")
+
+    return level_folders, errors
+
+
+def _solve_level(
+    model: Union[Type[Flow], Type[ContactMechanics]],
+    run_model_method: Callable,
+    params: GeometryParameters,
+    newton_params: dict,
+    folder: Path,
+    variable: List[str],
+) -> None:
+    """ Solve the model on a pickled grid bucket, and store the solution
+
+    The model writes its output (exported fields, logs) to the level folder.
+    """
+    with open(folder / "gb.pkl", "rb") as f:
+        gb = pickle.load(f)
+
+    setup = model(params=params.copy(update={"folder_name": folder}))
+    setup.gb = gb
+    pp.contact_conditions.set_projections(setup.gb)
+    run_model_method(setup, params=newton_params)
+
+    save_level_solution(setup.gb, folder, variable)
+
+
 def _impose_network_parameters(network: pp.FractureNetwork3d, mesh_args: dict):
     """ TODO: Consider separating the start FractureNetwork3d.mesh,
             to avoid us copying its contents here
@@ -9,7 +9,11 @@ from GTS.isc_modelling.flow import FlowISC
 from GTS.isc_modelling.parameter import FlowParameters, nd_injection_cell_center
 from GTS.isc_modelling.setup import SetupParams
 from refinement import gb_coarse_fine_cell_mapping
-from refinement.grid_convergence import grid_error
+from refinement.grid_convergence import (
+    convergence_rates,
+    grid_error,
+    grid_error_from_files,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -68,6 +72,65 @@ class TestGridError:
         logger.info(errors)
 
 
+def _save_1d_level(folder: Path, num_cells: int, **states) -> None:
+    """ Store states on a unit interval with num_cells cells, see save_level_solution"""
+    folder.mkdir()
+    h = 1 / num_cells
+    np.save(folder / "grid_0_cell_volumes.npy", np.full(num_cells, h))
+    face_cells = np.vstack((np.arange(num_cells - 1), np.arange(1, num_cells)))
+    np.save(folder / "grid_0_face_cells.npy", face_cells)
+    np.save(folder / "grid_0_face_weights.npy", np.full(num_cells - 1, 1 / h))
+    for var, state in states.items():
+        np.save(folder / f"grid_0_{var}.npy", state)
+
+
+def test_grid_error_from_files(tmp_path):
+    """ Errors from stored solutions on a 1d grid refined once"""
+    # Coarse: 2 cells, fine: 4 cells. Vector variable with 2 dofs per cell.
+    parent = np.array([0, 0, 1, 1])
+    p_fine = np.array([1.0, 1.0, 2.0, 4.0])
+    u_fine = np.tile([1.0, 0.0], 4)
+    _save_1d_level(
+        tmp_path / "coarse", 2, p=np.array([1.0, 2.0]), u=np.array([1.0, 0, 1, 0])
+    )
+    _save_1d_level(tmp_path / "fine", 4, p=p_fine, u=u_fine)
+
+    errors = grid_error_from_files(
+        tmp_path / "coarse",
+        tmp_path / "fine",
+        {0: parent},
+        variable=["p", "u"],
+        variable_dof=[1, 2],
+        chunk_size=3,
+    )
+    p_error = errors[0]["p"]
+    assert p_error["is_relative"]
+    # Error is 2 in the last cell
+    assert np.allclose(p_error["l2"], np.sqrt(0.25 * 4 / np.sum(0.25 * p_fine ** 2)))
+    assert np.allclose(p_error["linf"], 2 / 4)
+    assert np.allclose(p_error["energy"], np.sqrt(4 * 4 / (4 * (1 + 4))))
+    assert np.allclose(p_error["error"], p_error["l2"])
+
+    # The second component of u is zero: absolute error
+    u_error = errors[0]["u"]
+    assert not u_error["is_relative"]
+    assert np.allclose(u_error["l2"], 0)
+
+
+def test_convergence_rates():
+    """ Second order convergence in one norm"""
+    errors = [
+        {0: {"p": {"l2": np.array([0.16]), "linf": np.array([0.5])}}},
+        {0: {"p": {"l2": np.array([0.04]), "linf": np.array([0.5])}}},
+        {0: {"p": {"l2": np.array([0.01]), "linf": np.array([0.5])}}},
+    ]
+    rates = convergence_rates(errors)
+    l2 = rates[rates["norm"] == "l2"]
+    assert np.isnan(l2["rate"].iloc[0])
+    assert np.allclose(l2["rate"].iloc[1:], 2)
+    assert np.allclose(rates[rates["norm"] == "linf"]["rate"].iloc[1:], 0)
+
+
 def create_grid_with_two_fractures(
     path_head: str,
 ) -> Tuple[pp.GridBucket, SetupParams, pp.FractureNetwork3d]:
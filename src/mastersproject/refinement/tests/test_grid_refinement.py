@@ -2,13 +2,17 @@ from pathlib import Path
 from typing import List, Tuple
 
 import numpy as np
+import pytest
 from scipy.sparse import csc_matrix
 
 import porepy as pp
 from refinement.grid_refinement import (
     coarse_fine_cell_mapping,
+    compose_parent_maps,
     gb_coarse_fine_cell_mapping,
+    gb_set_coarse_fine_cell_mapping,
     refine_mesh_by_splitting,
+    splitting_parent_map,
 )
 
 
@@ -52,6 +56,50 @@ class TestGridRefinement:
             coarse_fine.indices.size == g_ref.num_cells
         ), "Every fine cell should be inside exactly one coarse cell"
 
+    def test_coarse_fine_cell_mapping_structured(self):
+        """ Exact mapping on nested structured triangle grids"""
+        g = pp.StructuredTriangleGrid([4, 4], physdims=[1, 1])
+        g_ref = pp.StructuredTriangleGrid([8, 8], physdims=[1, 1])
+        g.compute_geometry()
+        g_ref.compute_geometry()
+        coarse_fine = coarse_fine_cell_mapping(g, g_ref)
+
+        assert coarse_fine.shape == (g_ref.num_cells, g.num_cells)
+        assert np.all(coarse_fine.sum(axis=1) == 1), "One coarse cell per fine cell"
+        assert np.allclose(coarse_fine.T * g_ref.cell_volumes, g.cell_volumes)
+
+    def test_refine_mesh_by_splitting_parent_maps(self):
+        """ The exact parent maps agree with the geometric mapping"""
+        path_head = "TestGridRefinement/test_refine_mesh_by_splitting_parent_maps"
+        _, file_name, _ = create_gb_with_simple_fracture(path_head=path_head)
+        gb_generator = refine_mesh_by_splitting(
+            f"{file_name}.geo", file_name, dim=3, parent_maps=True
+        )
+        levels = [next(gb_generator) for _ in range(0, 3)]
+        gb_generator.close()
+
+        assert levels[0][1] is None, "The coarsest grid has no parents"
+        gb, gb_ref = levels[0][0], levels[2][0]
+        parents = compose_parent_maps([levels[1][1], levels[2][1]])
+        gb_set_coarse_fine_cell_mapping(gb, parents)
+
+        for (g, d), (g_ref, _) in zip(gb, gb_ref):
+            exact = d["coarse_fine_cell_mapping"]
+            assert exact.shape == (g_ref.num_cells, g.num_cells)
+            assert np.all(exact.sum(axis=0) == 4 ** g.dim)
+            if g.dim > 0:
+                geometric = coarse_fine_cell_mapping(g, g_ref)
+                assert (exact != geometric).nnz == 0
+
+    def test_splitting_parent_map_not_a_refinement(self):
+        """ Grids that are not refined by splitting are rejected"""
+        g = pp.StructuredTriangleGrid([4, 4], physdims=[1, 1])
+        g_ref = pp.StructuredTriangleGrid([12, 12], physdims=[1, 1])
+        g.compute_geometry()
+        g_ref.compute_geometry()
+        with pytest.raises(ValueError):
+            splitting_parent_map(g, g_ref)
+
     def test_gb_coarse_fine_cell_mapping(self):
         # Create 2 grid buckets
         path_head = "TestGridRefinement/test_gb_coarse_fine_cell_mapping"